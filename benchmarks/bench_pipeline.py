@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import click
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(PROJECT_ROOT, "src")
+for path in (SRC_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from extractors.filters import apply_filters  # type: ignore  # noqa: E402
+from extractors.property_parser import parse_property_listings, projection_for  # type: ignore  # noqa: E402
+from extractors.sources import load_inputs  # type: ignore  # noqa: E402
+from extractors.utils import get_logger, load_json_file, save_json_file, write_json_records  # type: ignore  # noqa: E402
+from pipeline.incremental import IncrementalState, run_incremental_pipeline  # type: ignore  # noqa: E402
+from synthetic import generate_listings  # type: ignore  # noqa: E402
+from transformers.data_cleanser import clean_records  # type: ignore  # noqa: E402
+from transformers.field_mapper import map_fields  # type: ignore  # noqa: E402
+
+logger = get_logger("bench_pipeline")
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+
+SETTINGS_PATH = os.path.join(SRC_DIR, "config", "settings.json")
+
+# Timings this close to zero are dominated by noise; never flag them
+_MIN_SECONDS = 0.05
+
+# Time spent on each stage at least, across runs
+_MIN_TOTAL_SECONDS = 0.5
+
+# Listings the reference workload and the warm-up pass run on
+_REFERENCE_SIZE = 10_000
+_WARMUP_SIZE = 1_000
+
+Stage = Callable[[Any], Any]
+
+def _read_paths(settings: Dict[str, Any]) -> List[str]:
+    # Sections the filters and sort key read, as main._read_paths
+    filters_cfg = settings.get("filters", {})
+    paths = ["price.value", "bedrooms", filters_cfg.get("sort_by") or ""]
+    paths.extend(clause.get("field") or "" for clause in filters_cfg.get("where") or [])
+    return paths
+
+def _stages(settings: Dict[str, Any], output_path: str) -> List[Tuple[str, Stage]]:
+    filters_cfg = dict(settings.get("filters", {}))
+    # The benchmark measures a full sort over everything that passes
+    filters_cfg["limit"] = None
+    transform_cfg = settings.get("transform", {})
+    include_fields = transform_cfg.get("include_fields") or []
+    # Parse the way the pipeline does: projected to the sections it reads,
+    # into compact listings
+    fields = projection_for(include_fields + _read_paths(settings)) if include_fields else None
+    return [
+        ("parse", lambda raw: parse_property_listings(raw, fields=fields, compact=True)),
+        ("filter", lambda listings: apply_filters(listings, **filters_cfg)),
+        (
+            "map",
+            lambda listings: map_fields(
+                listings,
+                field_mapping=transform_cfg.get("field_mapping") or {},
+                include_fields=transform_cfg.get("include_fields") or [],
+            ),
+        ),
+        ("clean", lambda mapped: clean_records(mapped, strip_empty=transform_cfg.get("strip_empty", True))),
+        ("save", lambda cleaned: save_json_file(output_path, cleaned, pretty=True) or cleaned),
+    ]
+
+def _reference_seconds(raw: List[Any], repeat: int) -> float:
+    """
+    Best time of a fixed JSON round trip, the yardstick stage times are
+    divided by so baselines carry over between machines.
+    """
+    sample = raw[:_REFERENCE_SIZE]
+    sample = (sample * (_REFERENCE_SIZE // len(sample) + 1))[:_REFERENCE_SIZE]
+    return _time_stage(lambda data: json.loads(json.dumps(data)), sample, max(repeat, 3))[0]
+
+def _time_stage(stage: Stage, data: Any, repeat: int) -> Tuple[float, Any]:
+    # Short stages run until _MIN_TOTAL_SECONDS were spent, whatever
+    # ``repeat`` says, since one run of a few milliseconds is mostly noise
+    best = float("inf")
+    result = None
+    runs = 0
+    spent = 0.0
+    while runs < repeat or spent < _MIN_TOTAL_SECONDS:
+        gc.collect()
+        started = time.perf_counter()
+        result = stage(data)
+        elapsed = time.perf_counter() - started
+        best = min(best, elapsed)
+        runs += 1
+        spent += elapsed
+    return best, result
+
+def _peak_memory(stage: Stage, data: Any) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+def run_benchmark(size: int, repeat: int = 3, memory: bool = True, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Time (best of ``repeat``) and optionally memory-profile each pipeline
+    stage on ``size`` synthetic listings. Each stage's input is the
+    previous stage's output.
+
+    Every stage first runs untimed on a small slice, so caches built on
+    first use (such as the parser's shape cache) are warm with any
+    ``repeat``. ``relative`` is a stage's time over that of a fixed JSON
+    round trip timed in the same run, which is what compare_to_baseline
+    checks.
+    """
+    raw = list(generate_listings(size, seed=seed))
+    settings = load_json_file(SETTINGS_PATH)
+    reference = _reference_seconds(raw, repeat)
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data: Any = raw
+        for name, stage in _stages(settings, os.path.join(tmp_dir, "output.json")):
+            stage(data[:_WARMUP_SIZE])
+            seconds, output = _time_stage(stage, data, repeat)
+            metrics = {
+                "seconds": round(seconds, 4),
+                "relative": round(seconds / reference, 3),
+                "records_in": len(data),
+                "records_per_sec": round(len(data) / seconds) if seconds else 0.0,
+            }
+            if memory:
+                metrics["peak_mib"] = round(_peak_memory(stage, data), 2)
+            results[name] = metrics
+            data = output
+    return results
+
+def run_incremental_benchmark(size: int, repeat: int = 3, seed: int = 0) -> Dict[str, float]:
+    """
+    Time (best of ``repeat``) a full run from reading ``size`` synthetic
+    listings to cleaned records, the first incremental run that builds the
+    state, and an incremental rerun over the unchanged input.
+    """
+    settings = load_json_file(SETTINGS_PATH)
+    filters_cfg = settings.get("filters", {})
+    transform_cfg = settings.get("transform", {})
+    read_paths = _read_paths(settings)
+    include_fields = transform_cfg.get("include_fields") or []
+    fields = projection_for(include_fields + read_paths) if include_fields else None
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "input.json")
+        state_path = os.path.join(tmp_dir, "state.db")
+        write_json_records(input_path, generate_listings(size, seed=seed))
+
+        def full() -> Any:
+            listings = parse_property_listings(load_inputs([input_path]), fields=fields, compact=True)
+            filtered = apply_filters(listings, **filters_cfg)
+            mapped = map_fields(
+                filtered,
+                field_mapping=transform_cfg.get("field_mapping") or {},
+                include_fields=transform_cfg.get("include_fields") or [],
+            )
+            return clean_records(mapped, strip_empty=transform_cfg.get("strip_empty", True))
+
+        def incremental() -> Any:
+            with IncrementalState(state_path) as state:
+                records, digests = state.read([input_path])
+                return run_incremental_pipeline(
+                    records,
+                    filters_cfg,
+                    transform_cfg,
+                    state,
+                    digests=digests,
+                    eager=projection_for(read_paths),
+                )[0]
+
+        def first() -> Any:
+            if os.path.exists(state_path):
+                os.remove(state_path)
+            return incremental()
+
+        results = {}
+        for name, run in (("full", full), ("incremental", first), ("rerun", incremental)):
+            results[name] = round(_time_stage(lambda _: run(), None, repeat)[0], 4)
+    return results
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Dict[str, Dict[str, Dict[str, float]]],
+    tolerance: float,
+) -> List[str]:
+    """
+    Return a message for every stage whose relative time or peak memory grew
+    by more than ``tolerance`` (a fraction) over the baseline at the same
+    size. Absolute seconds depend on the machine and are not compared.
+    """
+    regressions: List[str] = []
+    for size, stages in results.items():
+        for stage, metrics in stages.items():
+            reference = baseline.get(size, {}).get(stage)
+            if not reference:
+                continue
+            for metric, floor_metric, floor in (("relative", "seconds", _MIN_SECONDS), ("peak_mib", "peak_mib", 1.0)):
+                current, before = metrics.get(metric), reference.get(metric)
+                if current is None or before is None:
+                    continue
+                if max(metrics.get(floor_metric) or 0, reference.get(floor_metric) or 0) < floor:
+                    continue
+                if current > before * (1 + tolerance):
+                    regressions.append(
+                        f"{stage} @ {size}: {metric} {current} vs baseline {before} (+{(current / before - 1) * 100:.0f}%)"
+                    )
+    return regressions
+
+def _print_results(size: str, stages: Dict[str, Dict[str, float]]) -> None:
+    click.echo(f"\n{int(size):,} listings")
+    click.echo(f"  {'stage':<8}{'seconds':>10}{'relative':>10}{'rec/s':>12}{'peak MiB':>10}")
+    for stage, metrics in stages.items():
+        peak = metrics.get("peak_mib")
+        click.echo(
+            f"  {stage:<8}{metrics['seconds']:>10.4f}{metrics['relative']:>10.3f}{metrics['records_per_sec']:>12,.0f}"
+            f"{'' if peak is None else f'{peak:.2f}':>10}"
+        )
+
+def _run_incremental(sizes: Tuple[int, ...], repeat: int, output_file: Optional[str]) -> None:
+    results: Dict[str, Dict[str, float]] = {}
+    slower = []
+    for size in sizes:
+        click.echo(f"Benchmarking incremental runs over {size:,} synthetic listings")
+        timings = results[str(size)] = run_incremental_benchmark(size, repeat=repeat)
+        click.echo(f"  {'run':<12}{'seconds':>10}")
+        for name, seconds in timings.items():
+            click.echo(f"  {name:<12}{seconds:>10.4f}")
+        if timings["rerun"] >= timings["full"]:
+            slower.append(size)
+
+    if output_file:
+        save_json_file(output_file, results, pretty=True)
+    if slower:
+        click.echo(f"\nUnchanged reruns were not faster than full runs at {', '.join(f'{size:,}' for size in slower)} listings")
+        raise SystemExit(1)
+    click.echo("\nUnchanged reruns are faster than full runs")
+
+@click.command()
+@click.option(
+    "--size",
+    "-n",
+    "sizes",
+    type=click.IntRange(min=1),
+    multiple=True,
+    help=(
+        "Number of synthetic listings (repeatable, e.g. 10000, 100000, 1000000, 10000000). Default: 10000. "
+        "The listings are held in memory, about 6 GB per million."
+    ),
+)
+@click.option("--repeat", type=click.IntRange(min=1), default=3, show_default=True, help="Timed runs per stage (best is kept).")
+@click.option("--no-memory", is_flag=True, default=False, help="Skip the tracemalloc pass (much faster at large sizes).")
+@click.option("--baseline", "baseline_path", default=DEFAULT_BASELINE, show_default=True, help="Baseline JSON file.")
+@click.option(
+    "--tolerance",
+    type=float,
+    default=0.5,
+    show_default=True,
+    help="Allowed growth of relative time and peak memory over the baseline.",
+)
+@click.option("--update-baseline", is_flag=True, default=False, help="Store these results as the new baseline.")
+@click.option("--output-file", "-o", default=None, help="Also write the results as JSON.")
+@click.option(
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help="Instead compare a full run with an unchanged --incremental rerun; fails unless the rerun is faster.",
+)
+@click.option(
+    "--log-level",
+    type=click.Choice(["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]),
+    default="CRITICAL",
+    show_default=True,
+    help="Pipeline log level; the skipped-record summary is hidden by default.",
+)
+def main(
+    sizes: Tuple[int, ...],
+    repeat: int,
+    no_memory: bool,
+    baseline_path: str,
+    tolerance: float,
+    update_baseline: bool,
+    output_file: Optional[str],
+    incremental: bool,
+    log_level: str,
+) -> None:
+    """
+    Benchmark each pipeline stage and fail on regressions against a baseline.
+    """
+    logging.getLogger().setLevel(log_level)
+    if incremental:
+        _run_incremental(sizes or (10_000,), repeat, output_file)
+        return
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for size in sizes or (10_000,):
+        click.echo(f"Benchmarking {size:,} synthetic listings")
+        results[str(size)] = run_benchmark(size, repeat=repeat, memory=not no_memory)
+        _print_results(str(size), results[str(size)])
+
+    if output_file:
+        save_json_file(output_file, results, pretty=True)
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(baseline_path):
+        baseline = load_json_file(baseline_path)  # type: ignore[assignment]
+
+    if update_baseline:
+        baseline.update(results)
+        save_json_file(baseline_path, baseline, pretty=True)
+        click.echo(f"\nUpdated baseline {baseline_path}")
+        return
+
+    regressions = compare_to_baseline(results, baseline, tolerance)
+    if regressions:
+        click.echo("\nRegressions against baseline:")
+        for message in regressions:
+            click.echo(f"  {message}")
+        raise SystemExit(1)
+    click.echo("\nNo regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import os
+import random
+import sys
+from typing import Any, Dict, Iterator, List
+
+import click
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(PROJECT_ROOT, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from extractors.utils import get_logger, write_json_records  # type: ignore  # noqa: E402
+
+logger = get_logger("synthetic")
+
+_PLACES = [
+    ("Syracuse", "NY", "132"),
+    ("Albany", "NY", "122"),
+    ("Buffalo", "NY", "142"),
+    ("Austin", "TX", "787"),
+    ("Dallas", "TX", "752"),
+    ("Denver", "CO", "802"),
+    ("Phoenix", "AZ", "850"),
+    ("Seattle", "WA", "981"),
+    ("Tampa", "FL", "336"),
+    ("Columbus", "OH", "432"),
+]
+
+_STREETS = ["James St", "Main St", "Oak Ave", "Maple Dr", "Park Pl", "Lake Rd", "Hill St", "Cedar Ln"]
+
+_PROPERTY_TYPES = ["singleFamily", "condo", "townhouse", "multiFamily", "manufactured", "lot"]
+
+_WALK_DESCRIPTIONS = ["Car-Dependent", "Somewhat Walkable", "Very Walkable", "Walker's Paradise"]
+
+_EVENTS = ["Listed for sale", "Price change", "Pending sale", "Sold", "Listing removed"]
+
+def _pick(rng: random.Random, *options: str) -> str:
+    return options[rng.randrange(len(options))]
+
+def _address(rng: random.Random, record: Dict[str, Any], city: str, state: str, zipcode: str) -> None:
+    street = f"{rng.randint(1, 9999)} {rng.choice(_STREETS)}"
+    style = rng.random()
+    if style < 0.6:
+        record["address"] = {"street": street, "city": city, "state": state, "zipcode": zipcode}
+    elif style < 0.9:
+        record["address"] = {"streetAddress": street, "city": city, "state": state, "zip": zipcode}
+    else:
+        # Flat address keys on the listing itself
+        record.update({"streetAddress": street, "city": city, "state": state, "zipcode": zipcode})
+
+def _price(rng: random.Random, record: Dict[str, Any]) -> int:
+    value = rng.randrange(60000, 2500000, 100)
+    key = _pick(rng, "price", "price", "listPrice", "priceValue", "nested")
+    if key == "nested":
+        record["price"] = {"value": value}
+    elif rng.random() < 0.1:
+        record[key] = str(value)
+    else:
+        record[key] = value
+    return value
+
+def _walkscore(rng: random.Random, record: Dict[str, Any]) -> None:
+    score = rng.randint(0, 100)
+    style = rng.random()
+    if style < 0.4:
+        record["walkscore"] = {"score": score, "description": rng.choice(_WALK_DESCRIPTIONS)}
+    elif style < 0.7:
+        record["walkScore"] = {"walkscore": score, "description": rng.choice(_WALK_DESCRIPTIONS)}
+    elif style < 0.9:
+        record["walkscore"] = score
+
+def _schools(rng: random.Random) -> List[Dict[str, Any]]:
+    schools = []
+    for _ in range(rng.randint(0, 4)):
+        name_key, rating_key = ("name", "rating") if rng.random() < 0.7 else ("schoolName", "score")
+        schools.append(
+            {
+                name_key: f"{rng.choice(_STREETS).split()[0]} {_pick(rng, 'Elementary', 'Middle', 'High')} School",
+                rating_key: rng.randint(1, 10),
+                "distance": round(rng.uniform(0.1, 5.0), 1),
+            }
+        )
+    return schools
+
+def _history(rng: random.Random, price: int, heavy: bool) -> Dict[str, List[Dict[str, Any]]]:
+    events = rng.randint(10, 40) if heavy else rng.randint(0, 3)
+    price_history = [
+        {
+            "date": f"{rng.randint(2000, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "event": rng.choice(_EVENTS),
+            "price": int(price * rng.uniform(0.6, 1.1)),
+            "source": "MLS",
+        }
+        for _ in range(events)
+    ]
+    tax_history = [
+        {"year": 2024 - i, "taxPaid": int(price * 0.02 * rng.uniform(0.8, 1.0))} for i in range(rng.randint(0, events or 2))
+    ]
+    return {"priceHistory": price_history, "taxHistory": tax_history}
+
+def _photos(rng: random.Random, zpid: int, heavy: bool) -> List[Dict[str, Any]]:
+    count = rng.randint(20, 60) if heavy else rng.randint(0, 5)
+    return [
+        {
+            "url": f"https://photos.example.com/{zpid}/{i}_{_pick(rng, 'a', 'b', 'c')}.jpg",
+            "width": 1024,
+            "height": 768,
+            "caption": "" if rng.random() < 0.5 else None,
+        }
+        for i in range(count)
+    ]
+
+def _malformed(rng: random.Random, zpid: int) -> Any:
+    kind = rng.randrange(6)
+    if kind == 0:
+        return None
+    if kind == 1:
+        return f"listing {zpid}"
+    if kind == 2:
+        return [zpid]
+    if kind == 3:
+        # No usable zpid
+        return {"price": rng.randrange(60000, 900000), "beds": 3}
+    if kind == 4:
+        return {"id": zpid, "price": "n/a", "beds": "three", "schools": "none", "photos": {"url": "x"}}
+    return {"zpid": f"zpid-{zpid}", "address": "unknown"}
+
+def synthetic_listing(rng: random.Random, zpid: int, heavy_rate: float = 0.1) -> Dict[str, Any]:
+    """
+    One raw listing in any of the shapes the parser accepts (see
+    data/inputs.sample.json), with key aliases mixed at random.
+    """
+    city, state, zip_prefix = rng.choice(_PLACES)
+    zipcode = f"{zip_prefix}{rng.randint(0, 99):02d}"
+    heavy = rng.random() < heavy_rate
+    record: Dict[str, Any] = {}
+
+    id_key = _pick(rng, "id", "id", "zpid", "zpid_raw")
+    record[id_key] = str(zpid) if rng.random() < 0.05 else zpid
+    _address(rng, record, city, state, zipcode)
+    price = _price(rng, record)
+    record[_pick(rng, "beds", "bedrooms")] = rng.randint(1, 7)
+    record[_pick(rng, "baths", "bathrooms")] = rng.choice([1, 1.5, 2, 2.5, 3, 4])
+    record[_pick(rng, "area", "livingArea", "sqft", "living_area")] = rng.randint(400, 6000)
+    record[_pick(rng, "year_built", "yearBuilt")] = rng.randint(1880, 2024)
+    record[_pick(rng, "property_type", "propertyType")] = rng.choice(_PROPERTY_TYPES)
+    if rng.random() < 0.5:
+        record["lotSizeWithUnit"] = {_pick(rng, "lotSize", "value"): rng.randint(1000, 40000), "lotSizeUnit": "sqft"}
+
+    assessed = int(price * rng.uniform(0.5, 0.95))
+    year = rng.randint(2018, 2024)
+    if rng.random() < 0.5:
+        record["tax_assessed_value"] = assessed
+        record["tax_assessment_year"] = str(year)
+    else:
+        record["taxAssessment"] = {"taxAssessedValue": assessed, "taxAssessmentYear": year}
+
+    _walkscore(rng, record)
+    record["schools"] = _schools(rng)
+    record.update(_history(rng, price, heavy))
+    record[_pick(rng, "features", "resoFacts")] = {
+        "hasGarage": rng.random() < 0.6,
+        "hasBasement": rng.random() < 0.4,
+        "heating": ["Forced air"] if rng.random() < 0.5 else [],
+    }
+    record["attributionInfo"] = {"agentName": "Jane Doe", "brokerageName": "Example Realty", "mlsId": None}
+    record["photos"] = _photos(rng, zpid, heavy)
+    record["url"] = f"https://www.zillow.com/homedetails/{zpid}_zpid/"
+    return record
+
+def generate_listings(
+    count: int,
+    seed: int = 0,
+    malformed_rate: float = 0.01,
+    heavy_rate: float = 0.1,
+) -> Iterator[Any]:
+    """
+    Lazily generate ``count`` raw listings; the same seed always yields the
+    same data. About ``malformed_rate`` of them are unparseable and
+    ``heavy_rate`` carry large photo and priceHistory payloads.
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        zpid = 10_000_000 + i
+        if rng.random() < malformed_rate:
+            yield _malformed(rng, zpid)
+        else:
+            yield synthetic_listing(rng, zpid, heavy_rate)
+
+@click.command()
+@click.option("--count", "-n", type=click.IntRange(min=1), default=10_000, show_default=True, help="Number of listings.")
+@click.option("--output-file", "-o", required=True, help="Output path; .ndjson/.jsonl writes one listing per line.")
+@click.option("--seed", type=int, default=0, show_default=True, help="Random seed.")
+@click.option("--malformed-rate", type=float, default=0.01, show_default=True, help="Share of malformed records.")
+@click.option("--heavy-rate", type=float, default=0.1, show_default=True, help="Share of listings with heavy payloads.")
+def main(
+    count: int,
+    output_file: str,
+    seed: int,
+    malformed_rate: float,
+    heavy_rate: float,
+) -> None:
+    """
+    Write synthetic Zillow-like raw listings for benchmarks and load tests.
+    """
+    written = write_json_records(
+        output_file,
+        generate_listings(count, seed, malformed_rate, heavy_rate),
+        pretty=False,
+        ndjson=output_file.endswith((".ndjson", ".jsonl")),
+    )
+    click.echo(f"Wrote {written} synthetic listings to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .expressions import compile_filter
+from .utils import compile_path, get_logger, get_path_value
+
+try:  # numpy is optional; without it apply_filters stays on the row path
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None  # type: ignore[assignment]
+
+logger = get_logger("columnar")
+
+NUMERIC_COLUMNS = (
+    "zpid",
+    "price.value",
+    "bedrooms",
+    "bathrooms",
+    "livingArea",
+    "yearBuilt",
+    "taxAssessment.taxAssessedValue",
+    "walkScore.walkscore",
+)
+
+CATEGORICAL_COLUMNS = (
+    "address.zipcode",
+    "address.state",
+    "propertyType",
+)
+
+# Largest integer a float64 column can hold without losing precision
+_MAX_EXACT_INT = 2**53
+
+_NUMERIC_OPS = {"eq", "ne", "in", "not_in", "gt", "gte", "lt", "lte", "exists"}
+_CATEGORICAL_OPS = {"eq", "ne", "in", "not_in", "exists"}
+
+def columnar_available() -> bool:
+    return np is not None
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+class ListingTable:
+    """
+    Column-oriented view over normalized listings.
+
+    Numeric fields are float64 arrays with NaN for missing values, and
+    zipcode/state/propertyType are dictionary-encoded with sorted categories
+    (code -1 means missing), so code order matches string order. A column is
+    only used when it represents the source values exactly; anything else
+    falls back to the row predicate. The original records are kept so rows
+    that survive a query can be returned without rebuilding them.
+
+    Building the table costs several row-filter passes, so it only pays off
+    when one table serves many queries (see filters.filter_table).
+    """
+
+    def __init__(self, records: Sequence[Dict[str, Any]]) -> None:
+        if np is None:
+            raise RuntimeError("numpy is required for columnar filtering")
+        self.records = records
+        self.numeric: Dict[str, Any] = {}
+        self.codes: Dict[str, Any] = {}
+        self.categories: Dict[str, List[str]] = {}
+
+        for path in NUMERIC_COLUMNS:
+            self._add_numeric(path)
+        for path in CATEGORICAL_COLUMNS:
+            self._add_categorical(path)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _column_values(self, path: str) -> List[Any]:
+        parts = compile_path(path)
+        return [get_path_value(record, parts) for record in self.records]
+
+    def _add_numeric(self, path: str) -> None:
+        values = self._column_values(path)
+        for value in values:
+            if value is None:
+                continue
+            if (
+                not _is_number(value)
+                or value != value  # NaN would be mistaken for a missing value
+                or (isinstance(value, int) and abs(value) > _MAX_EXACT_INT)
+            ):
+                logger.debug("Column %s is not numeric, leaving it to the row path", path)
+                return
+        self.numeric[path] = np.array(
+            [np.nan if value is None else value for value in values],
+            dtype=np.float64,
+        )
+
+    def _add_categorical(self, path: str) -> None:
+        values = self._column_values(path)
+        if any(value is not None and not isinstance(value, str) for value in values):
+            logger.debug("Column %s is not categorical, leaving it to the row path", path)
+            return
+        categories = sorted({value for value in values if value is not None})
+        lookup = {value: code for code, value in enumerate(categories)}
+        self.categories[path] = categories
+        self.codes[path] = np.array(
+            [-1 if value is None else lookup[value] for value in values],
+            dtype=np.int32,
+        )
+
+    def _numeric_mask(self, column: Any, ops: Mapping[str, Any]) -> Optional[Any]:
+        present = ~np.isnan(column)
+        if not ops.get("exists", True):
+            return ~present
+        mask = present
+        for op, operand in ops.items():
+            if op == "exists":
+                continue
+            if op in ("in", "not_in"):
+                if not isinstance(operand, (list, tuple, set)) or not all(_is_number(v) for v in operand):
+                    return None
+                members = np.isin(column, np.array(list(operand), dtype=np.float64))
+                mask = mask & (members if op == "in" else ~members)
+                continue
+            if not _is_number(operand):
+                return None
+            if op == "eq":
+                mask = mask & (column == operand)
+            elif op == "ne":
+                mask = mask & (column != operand)
+            elif op == "gt":
+                mask = mask & (column > operand)
+            elif op == "gte":
+                mask = mask & (column >= operand)
+            elif op == "lt":
+                mask = mask & (column < operand)
+            elif op == "lte":
+                mask = mask & (column <= operand)
+        return mask
+
+    def _categorical_mask(self, path: str, ops: Mapping[str, Any]) -> Optional[Any]:
+        codes = self.codes[path]
+        lookup = {value: code for code, value in enumerate(self.categories[path])}
+        present = codes >= 0
+        if not ops.get("exists", True):
+            return ~present
+        mask = present
+        for op, operand in ops.items():
+            if op == "exists":
+                continue
+            members = [operand] if op in ("eq", "ne") else operand
+            if not isinstance(members, (list, tuple, set)) or not all(isinstance(v, str) for v in members):
+                return None
+            member_codes = [lookup[v] for v in members if v in lookup]
+            matches = np.isin(codes, np.array(member_codes, dtype=np.int32))
+            mask = mask & (matches if op in ("eq", "in") else ~matches)
+        return mask
+
+    def _clause_mask(self, clause: Mapping[str, Any]) -> Optional[Any]:
+        field = clause.get("field")
+        ops = {k: v for k, v in clause.items() if k != "field"}
+        if field in self.numeric and set(ops) <= _NUMERIC_OPS:
+            return self._numeric_mask(self.numeric[field], ops)
+        if field in self.codes and set(ops) <= _CATEGORICAL_OPS:
+            return self._categorical_mask(field, ops)
+        return None
+
+    def filter_indices(self, conditions: Sequence[Mapping[str, Any]]) -> Any:
+        """
+        Return the row indices (ascending) that satisfy every clause.
+        """
+        mask = np.ones(len(self.records), dtype=bool)
+        residual: List[Mapping[str, Any]] = []
+        for clause in conditions:
+            clause_mask = self._clause_mask(clause)
+            if clause_mask is None:
+                residual.append(clause)
+            else:
+                mask &= clause_mask
+
+        indices = np.flatnonzero(mask)
+        if residual:
+            # Clauses without a usable column only run on the surviving rows
+            predicate = compile_filter(residual)
+            indices = np.array([i for i in indices if predicate(self.records[i])], dtype=np.intp)
+        return indices
+
+    def _sort_values(self, path: str) -> Optional[Tuple[Any, Any]]:
+        if path in self.numeric:
+            column = self.numeric[path]
+            return column, np.isnan(column)
+        if path in self.codes:
+            codes = self.codes[path]
+            return codes.astype(np.float64), codes < 0
+        return None
+
+    def sort_indices(
+        self,
+        indices: Any,
+        sort_by: str,
+        order: str,
+        limit: Optional[int],
+    ) -> Optional[Any]:
+        """
+        Order ``indices`` exactly like sorted() on make_sort_key does: stable,
+        missing values last for asc and first for desc. Returns None when the
+        sort column is not available.
+        """
+        sort_values = self._sort_values(sort_by)
+        if sort_values is None:
+            return None
+        column, missing = sort_values
+        missing_idx = indices[missing[indices]]
+        present_idx = indices[~missing[indices]]
+        descending = order.lower() == "desc"
+        # Negating keeps argsort's stable tie order for descending sorts
+        values = -column[present_idx] if descending else column[present_idx]
+
+        want = len(indices) if limit is None or limit <= 0 else min(limit, len(indices))
+        want_present = want - len(missing_idx) if descending else want
+        want_present = max(0, min(want_present, len(present_idx)))
+
+        if want_present < len(present_idx):
+            # argpartition is not stable, so keep every row tied with the
+            # k-th value and let the stable argsort below break ties.
+            kth = np.partition(values, want_present - 1)[want_present - 1] if want_present else None
+            candidates = np.flatnonzero(values <= kth) if want_present else np.array([], dtype=np.intp)
+        else:
+            candidates = np.arange(len(present_idx))
+        ordered = candidates[np.argsort(values[candidates], kind="stable")][:want_present]
+        present_sorted = present_idx[ordered]
+
+        if descending:
+            return np.concatenate([missing_idx, present_sorted])[:want]
+        return np.concatenate([present_sorted, missing_idx])[:want]
+
+    def materialize(self, indices: Any) -> List[Dict[str, Any]]:
+        return [self.records[i] for i in indices]
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import IO, Any, List, Optional, Tuple
+
+from .utils import get_logger
+
+logger = get_logger("dead_letter")
+
+Reject = Tuple[str, int, Any, Optional[str]]
+
+class RejectSink(ABC):
+    """Destination for records the pipeline skips."""
+
+    @abstractmethod
+    def write(self, reason: str, index: int, record: Any, error: Optional[str] = None) -> None:
+        """Record that the input at ``index`` was skipped for ``reason``."""
+
+class RejectBuffer(RejectSink):
+    """
+    In-memory rejects, e.g. collected in a worker process and replayed into
+    the run's DeadLetterWriter in input order.
+    """
+
+    def __init__(self) -> None:
+        self.entries: List[Reject] = []
+
+    def write(self, reason: str, index: int, record: Any, error: Optional[str] = None) -> None:
+        self.entries.append((reason, index, record, error))
+
+def replay_rejects(entries: List[Reject], sink: RejectSink) -> None:
+    for reason, index, record, error in entries:
+        sink.write(reason, index, record, error)
+
+class DeadLetterWriter(RejectSink):
+    """
+    Quarantine file for raw records the pipeline could not use.
+
+    Each line is a JSON object with the reason code (see
+    property_parser.SKIP_REASONS), the record's input index, the error
+    message if there was one, and the raw record itself, so the file can be
+    inspected, fixed and fed back in.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.counts: Counter[str] = Counter()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file: Optional[IO[str]] = open(path, "w", encoding="utf-8")
+
+    def __enter__(self) -> "DeadLetterWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def write(self, reason: str, index: int, record: Any, error: Optional[str] = None) -> None:
+        if self._file is None:
+            raise ValueError(f"Dead-letter file {self.path} is closed")
+        entry = {"reason": reason, "index": index, "error": error, "record": record}
+        # Raw records came from JSON, but fetched or hand-built ones might not
+        self._file.write(json.dumps(entry, ensure_ascii=False, default=repr))
+        self._file.write("\n")
+        self.counts[reason] += 1
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        total = sum(self.counts.values())
+        if total:
+            logger.info("Quarantined %d records in %s", total, self.path)
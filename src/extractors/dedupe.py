@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import datetime
+import json
+import math
+from array import array
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Set, Tuple, Union
+
+from .listing import Listing, as_dict
+from .utils import get_logger
+
+logger = get_logger("dedupe")
+
+KEEP_POLICIES = ("freshest", "complete")
+
+MEMBERSHIP_MODES = ("exact", "bloom")
+
+# History sections whose entries are unioned across duplicates
+MERGED_HISTORIES = ("priceHistory", "taxHistory")
+
+_INT64_MIN = -(2**63)
+_INT64_MAX = 2**63 - 1
+_MASK64 = 2**64 - 1
+
+def _mix64(value: int) -> int:
+    # splitmix64 finalizer: spreads sequential zpids over the whole table
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+class ZpidSet:
+    """
+    Exact set of 64-bit integers in one open-addressing array.
+
+    Each slot is 8 bytes and the table stays at most 2/3 full, so a zpid
+    costs about 12-24 bytes instead of the ~60 of a Python set entry plus
+    its int object. Values outside int64 go to a small overflow set.
+    """
+
+    _EMPTY = _INT64_MIN
+
+    def __init__(self, capacity: int = 1024) -> None:
+        size = 16
+        while size * 2 < capacity * 3:
+            size *= 2
+        self._slots = array("q", [self._EMPTY]) * size
+        self._mask = size - 1
+        self._count = 0
+        self._overflow: Set[int] = set()
+
+    def __len__(self) -> int:
+        return self._count + len(self._overflow)
+
+    @property
+    def nbytes(self) -> int:
+        return self._slots.itemsize * len(self._slots)
+
+    def _find(self, value: int) -> int:
+        slots, mask = self._slots, self._mask
+        index = _mix64(value) & mask
+        while True:
+            current = slots[index]
+            if current == value or current == self._EMPTY:
+                return index
+            index = (index + 1) & mask
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, int):
+            return False
+        if not _INT64_MIN < value <= _INT64_MAX:
+            return value in self._overflow
+        return self._slots[self._find(value)] == value
+
+    def add(self, value: int) -> bool:
+        """
+        Add ``value``; returns True when it was not in the set yet.
+        """
+        if not _INT64_MIN < value <= _INT64_MAX:
+            if value in self._overflow:
+                return False
+            self._overflow.add(value)
+            return True
+        index = self._find(value)
+        if self._slots[index] == value:
+            return False
+        self._slots[index] = value
+        self._count += 1
+        if self._count * 3 > len(self._slots) * 2:
+            self._grow()
+        return True
+
+    def _grow(self) -> None:
+        old = self._slots
+        self._slots = array("q", [self._EMPTY]) * (len(old) * 2)
+        self._mask = len(self._slots) - 1
+        for value in old:
+            if value != self._EMPTY:
+                self._slots[self._find(value)] = value
+
+class BloomFilter:
+    """
+    Bloom filter over integers sized for ``capacity`` items at
+    ``error_rate`` false positives; about 1.2 bytes per item at 0.1%.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be in (0, 1), got {error_rate!r}")
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def _positions(self, value: int) -> Iterable[int]:
+        # Double hashing: k probes from two independent 64-bit hashes
+        first = _mix64(value & _MASK64)
+        second = _mix64(first) | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, int):
+            return False
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+    def add(self, value: int) -> bool:
+        """
+        Add ``value``; returns True when it was definitely not present.
+        """
+        bits = self._bits
+        new = False
+        for pos in self._positions(value):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not bits[byte] & bit:
+                bits[byte] |= bit
+                new = True
+        return new
+
+Membership = Union[ZpidSet, BloomFilter]
+
+def _event_time(entry: Any) -> str:
+    """
+    Sortable timestamp of a history entry: ISO date strings as given,
+    epoch seconds/milliseconds converted, tax years as ``YYYY``.
+    """
+    if not isinstance(entry, dict):
+        return ""
+    value = entry.get("date") or entry.get("time") or entry.get("year")
+    if isinstance(value, bool) or value is None:
+        return ""
+    if isinstance(value, (int, float)) and value > 9999:
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).date().isoformat()
+        except (OverflowError, OSError, ValueError):
+            return ""
+    return str(value)
+
+def _freshness(record: Mapping[str, Any]) -> str:
+    history = record.get("priceHistory")
+    if not isinstance(history, list):
+        return ""
+    return max((_event_time(entry) for entry in history), default="")
+
+def _completeness(record: Mapping[str, Any]) -> int:
+    return sum(1 for value in record.values() if value not in (None, "", [], {}))
+
+def _rank(record: Mapping[str, Any], keep: str) -> Tuple[Any, ...]:
+    if keep == "complete":
+        return (_completeness(record), _freshness(record))
+    return (_freshness(record), _completeness(record))
+
+def _merge_history(histories: Sequence[Any]) -> List[Any]:
+    merged: List[Any] = []
+    seen: Set[str] = set()
+    for history in histories:
+        if not isinstance(history, list):
+            continue
+        for entry in history:
+            key = json.dumps(entry, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                merged.append(entry)
+    # Newest first, as Zillow returns them; undated entries keep their place at the end
+    merged.sort(key=lambda entry: _event_time(entry) or "", reverse=True)
+    return merged
+
+def merge_duplicates(records: Sequence[Mapping[str, Any]], keep: str = "freshest") -> Mapping[str, Any]:
+    """
+    Merge listings sharing a zpid: keep the freshest (latest priceHistory
+    event) or most complete (most non-empty sections) record, the later
+    one on ties, with the priceHistory/taxHistory entries of all of them.
+    """
+    if keep not in KEEP_POLICIES:
+        raise ValueError(f"Unknown keep policy {keep!r}; expected one of {', '.join(KEEP_POLICIES)}")
+    best = max(range(len(records)), key=lambda i: (_rank(records[i], keep), i))
+    merged = dict(as_dict(records[best]))
+    ordered = [records[best]] + [record for i, record in enumerate(records) if i != best]
+    for section in MERGED_HISTORIES:
+        if any(section in record for record in records):
+            merged[section] = _merge_history([record.get(section) for record in ordered])
+    return Listing.from_dict(merged) if isinstance(records[best], Listing) else merged
+
+def dedupe_listings(
+    listings: Sequence[Mapping[str, Any]],
+    keep: str = "freshest",
+    membership: str = "exact",
+    error_rate: float = 0.001,
+) -> List[Mapping[str, Any]]:
+    """
+    Collapse normalized listings that share a zpid into one merged listing
+    at the position of the first occurrence (see merge_duplicates).
+
+    A first pass records every zpid in a compact ZpidSet, or with
+    ``membership="bloom"`` a Bloom filter, and remembers only the zpids
+    seen again. A Bloom false positive just makes a unique zpid a
+    candidate, which the second pass finds has a single record, so the
+    output is exact either way. Only duplicated zpids are ever held in a
+    dict, and only as record positions.
+    """
+    if keep not in KEEP_POLICIES:
+        raise ValueError(f"Unknown keep policy {keep!r}; expected one of {', '.join(KEEP_POLICIES)}")
+    if membership not in MEMBERSHIP_MODES:
+        raise ValueError(f"Unknown membership mode {membership!r}; expected one of {', '.join(MEMBERSHIP_MODES)}")
+    seen: Membership = ZpidSet(len(listings)) if membership == "exact" else BloomFilter(len(listings), error_rate)
+    candidates: Set[int] = set()
+    for listing in listings:
+        zpid = listing["zpid"]
+        if not seen.add(zpid):
+            candidates.add(zpid)
+    logger.info(
+        "Tracked %d zpids in %d bytes (%s), %d duplicate candidates",
+        len(listings),
+        seen.nbytes,
+        membership,
+        len(candidates),
+    )
+    if not candidates:
+        return list(listings)
+
+    positions: Dict[int, List[int]] = {}
+    for index, listing in enumerate(listings):
+        zpid = listing["zpid"]
+        if zpid in candidates:
+            positions.setdefault(zpid, []).append(index)
+
+    result: List[Mapping[str, Any]] = []
+    for index, listing in enumerate(listings):
+        group = positions.get(listing["zpid"])
+        if group is None or len(group) == 1:
+            result.append(listing)
+        elif group[0] == index:
+            result.append(merge_duplicates([listings[i] for i in group], keep))
+
+    logger.info("Merged duplicates: %d listings -> %d", len(listings), len(result))
+    return result
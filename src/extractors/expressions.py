@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .utils import get_logger, get_path_value
+
+logger = get_logger("expressions")
+
+# Every SAMPLE_EVERY-th record is checked against all clauses (without
+# short-circuiting) to estimate how selective each clause is.
+SAMPLE_EVERY = 1024
+
+_WILDCARD = "[*]"
+
+# Static selectivity guess used to order clauses until samples exist:
+# equality tests usually reject far more records than open ranges.
+_OPERATOR_RANK = {
+    "eq": 0,
+    "in": 1,
+    "not_in": 2,
+    "ne": 3,
+    "gt": 4,
+    "gte": 4,
+    "lt": 4,
+    "lte": 4,
+    "exists": 5,
+}
+
+ValueTest = Callable[[Any], bool]
+
+def _parse_field(field: str) -> List[Tuple[str, ...]]:
+    """
+    Split ``schools[*].rating`` into [("schools",), ("rating",)]: one plain
+    path per list level, fanned out over list items at each ``[*]``.
+    """
+    segments: List[Tuple[str, ...]] = []
+    for chunk in field.split(_WILDCARD):
+        parts = tuple(p for p in chunk.split(".") if p)
+        segments.append(parts)
+    return segments
+
+def _fan_out(segments: List[Tuple[str, ...]]) -> Callable[[Any], List[Any]]:
+    def get_all(record: Any) -> List[Any]:
+        values = [record]
+        for parts in segments[:-1]:
+            resolved = [get_path_value(v, parts) for v in values]
+            values = [item for v in resolved if isinstance(v, list) for item in v]
+        return [get_path_value(v, segments[-1]) for v in values]
+
+    return get_all
+
+def _compile_value_test(field: str, ops: Mapping[str, Any]) -> ValueTest:
+    tests: List[ValueTest] = []
+    for op, operand in ops.items():
+        if op == "eq":
+            tests.append(lambda v, x=operand: v == x)
+        elif op == "ne":
+            tests.append(lambda v, x=operand: v != x)
+        elif op in ("in", "not_in"):
+            if not isinstance(operand, (list, tuple, set)):
+                raise ValueError(f"Filter on {field!r}: {op!r} expects a list of values")
+            members = frozenset(operand)
+            if op == "in":
+                tests.append(lambda v, s=members: v in s)
+            else:
+                tests.append(lambda v, s=members: v not in s)
+        elif op == "gt":
+            tests.append(lambda v, x=operand: v > x)
+        elif op == "gte":
+            tests.append(lambda v, x=operand: v >= x)
+        elif op == "lt":
+            tests.append(lambda v, x=operand: v < x)
+        elif op == "lte":
+            tests.append(lambda v, x=operand: v <= x)
+        elif op != "exists":
+            raise ValueError(f"Filter on {field!r}: unknown operator {op!r}")
+
+    if len(tests) == 1:
+        return tests[0]
+    return lambda v: all(test(v) for test in tests)
+
+class Clause:
+    """A single compiled ``{"field": ..., <op>: ...}`` condition."""
+
+    __slots__ = ("field", "rank", "passed", "sampled", "test")
+
+    def __init__(self, spec: Mapping[str, Any]) -> None:
+        field = spec.get("field")
+        if not isinstance(field, str) or not field:
+            raise ValueError(f"Filter clause needs a 'field' path: {spec!r}")
+        ops = {k: v for k, v in spec.items() if k != "field"}
+        if not ops:
+            raise ValueError(f"Filter on {field!r} has no operator")
+
+        self.field = field
+        self.rank = min(_OPERATOR_RANK.get(op, len(_OPERATOR_RANK)) for op in ops)
+        self.passed = 0
+        self.sampled = 0
+        self.test = self._compile(field, ops)
+
+    @staticmethod
+    def _compile(field: str, ops: Mapping[str, Any]) -> Callable[[Any], bool]:
+        value_test = _compile_value_test(field, ops)
+        exists = bool(ops.get("exists", True))
+        segments = _parse_field(field)
+
+        if len(segments) == 1:
+            parts = segments[0]
+
+            def test_one(record: Any) -> bool:
+                value = get_path_value(record, parts)
+                if value is None:
+                    return not exists
+                if not exists:
+                    return False
+                try:
+                    return value_test(value)
+                except TypeError:
+                    return False
+
+            return test_one
+
+        get_all = _fan_out(segments)
+
+        def test_any(record: Any) -> bool:
+            present = [v for v in get_all(record) if v is not None]
+            if not exists:
+                return not present
+            try:
+                # Wildcard paths match when any element satisfies the clause
+                return any(value_test(v) for v in present)
+            except TypeError:
+                return False
+
+        return test_any
+
+    @property
+    def pass_rate(self) -> float:
+        # Laplace-smoothed so an unsampled clause sits at 0.5
+        return (self.passed + 1) / (self.sampled + 2)
+
+class CompiledFilter:
+    """
+    Conjunction of clauses evaluated in a single pass per record.
+
+    Clauses short-circuit in order of estimated selectivity; the order is
+    re-estimated from periodic samples so the clause that rejects the most
+    records runs first.
+    """
+
+    def __init__(self, clauses: Iterable[Clause]) -> None:
+        self.clauses: List[Clause] = sorted(clauses, key=lambda c: c.rank)
+        self._countdown = 1
+
+    def __call__(self, record: Any) -> bool:
+        self._countdown -= 1
+        if self._countdown == 0:
+            self._countdown = SAMPLE_EVERY
+            return self._sample(record)
+        for clause in self.clauses:
+            if not clause.test(record):
+                return False
+        return True
+
+    def _sample(self, record: Any) -> bool:
+        result = True
+        for clause in self.clauses:
+            clause.sampled += 1
+            if clause.test(record):
+                clause.passed += 1
+            else:
+                result = False
+        self.clauses.sort(key=lambda c: (c.pass_rate, c.rank))
+        return result
+
+def legacy_conditions(
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    min_bedrooms: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Express the fixed min_price/max_price/min_bedrooms settings as clauses.
+    """
+    # Listings without a price are always dropped, even with no bounds set
+    price: Dict[str, Any] = {"field": "price.value", "exists": True}
+    if min_price is not None:
+        price["gte"] = min_price
+    if max_price is not None:
+        price["lte"] = max_price
+    conditions = [price]
+    if min_bedrooms is not None:
+        conditions.append({"field": "bedrooms", "gte": min_bedrooms})
+    return conditions
+
+def compile_filter(conditions: Sequence[Mapping[str, Any]]) -> CompiledFilter:
+    """
+    Compile filter clauses such as ``{"field": "address.zipcode", "in": [...]}``
+    into one predicate.
+
+    Supported operators are eq, ne, in, not_in, gt, gte, lt, lte and exists;
+    several operators in one clause must all hold (e.g. a gte/lte range).
+    ``[*]`` in a path fans out over list items and matches if any item does.
+    """
+    compiled = CompiledFilter(Clause(spec) for spec in conditions)
+    logger.debug("Compiled %d filter clauses: %s", len(compiled.clauses), [c.field for c in compiled.clauses])
+    return compiled
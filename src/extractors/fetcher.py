@@ -0,0 +1,450 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import queue
+import random
+import ssl
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from .utils import get_logger
+
+logger = get_logger("fetcher")
+
+# Search kinds and the default URL template (relative to base_url) for each
+DEFAULT_ENDPOINTS = {
+    "zpid": "/property/{value}",
+    "zip": "/search?zipcode={value}",
+    "city": "/search?city={value}",
+}
+
+# Keys a search response may wrap its listings in
+_RESULT_KEYS = ("results", "listings", "props", "data")
+
+_RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+_USER_AGENT = "zillow-explorer/1.0"
+
+# Listings buffered between the fetch thread and the consumer
+HANDOFF_SIZE = 1024
+
+class FetchError(Exception):
+    """A request failed permanently (non-retryable status or retries exhausted)."""
+
+def parse_search(spec: str) -> Tuple[str, str]:
+    """
+    Split a ``kind:value`` search such as ``zip:13203`` or ``city:Syracuse, NY``.
+    """
+    kind, sep, value = spec.partition(":")
+    kind = kind.strip().lower()
+    if not sep or kind not in DEFAULT_ENDPOINTS or not value.strip():
+        raise ValueError(f"Search must look like zpid:<id>, zip:<code> or city:<name>, got {spec!r}")
+    return kind, value.strip()
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: ``rate`` requests per second on average,
+    with bursts of up to ``burst`` requests.
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None) -> None:
+        self.rate = rate
+        self.capacity = float(burst or max(1, int(rate)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class ResponseCache:
+    """
+    On-disk cache of successful response bodies, one file per URL.
+    """
+
+    def __init__(self, directory: str, ttl: Optional[float] = None) -> None:
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, url: str) -> str:
+        digest = hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + ".json")
+
+    def get(self, url: str) -> Optional[bytes]:
+        path = self._path(url)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, url: str, body: bytes) -> None:
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+class _Response:
+    __slots__ = ("status", "headers", "body", "reusable")
+
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes, reusable: bool) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.reusable = reusable
+
+async def _read_response(reader: asyncio.StreamReader) -> _Response:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before a response was received")
+    version, status, *_ = status_line.decode("latin-1").split(" ", 2)
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    reusable = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    if int(status) in (204, 304) or int(status) < 200:
+        body = b""
+    elif headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks: List[bytes] = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # Skip trailers up to the terminating blank line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    elif reusable:
+        # Such a body only ends when the server closes the connection, which
+        # it will not do on keep-alive; reading to EOF would hang
+        raise FetchError("Keep-alive response has neither Content-Length nor chunked encoding")
+    else:
+        body = await reader.read()
+    return _Response(int(status), headers, body, reusable)
+
+class _HostPool:
+    """Keep-alive connections to one scheme/host/port, capped at ``limit`` in flight."""
+
+    def __init__(self, scheme: str, host: str, port: int, limit: int, rate: Optional[float], burst: Optional[int]) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.slots = asyncio.Semaphore(limit)
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def connect(self, timeout: float) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        context = ssl.create_default_context() if self.scheme == "https" else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=context),
+            timeout,
+        )
+        return reader, writer, False
+
+    def release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, reusable: bool) -> None:
+        if reusable:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self) -> None:
+        for _, writer in self.idle:
+            writer.close()
+        self.idle.clear()
+
+class ListingFetcher:
+    """
+    Concurrent HTTP client for listing searches.
+
+    Requests share keep-alive connections per host. Each host is limited
+    to ``per_host`` requests in flight and ``rate`` requests per second
+    (token bucket), and at most ``concurrency`` requests run overall.
+    Connection errors, timeouts and 408/429/5xx responses are retried with
+    exponential backoff and jitter (honouring Retry-After). Successful
+    bodies are cached on disk when ``cache_dir`` is set.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        endpoints: Optional[Mapping[str, str]] = None,
+        concurrency: int = 16,
+        per_host: int = 4,
+        rate: Optional[float] = 5.0,
+        burst: Optional[int] = None,
+        retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 30.0,
+        cache_dir: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.endpoints = dict(DEFAULT_ENDPOINTS, **(endpoints or {}))
+        self.per_host = per_host
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = ResponseCache(cache_dir, cache_ttl) if cache_dir else None
+        self.headers = dict(headers or {})
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._pools: Dict[Tuple[str, str, int], _HostPool] = {}
+        self.requests = 0
+        self.cache_hits = 0
+
+    async def __aenter__(self) -> "ListingFetcher":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+    def url_for(self, kind: str, value: Any) -> str:
+        return self.base_url + self.endpoints[kind].format(value=quote(str(value), safe=""))
+
+    def _pool(self, scheme: str, host: str, port: int) -> _HostPool:
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _HostPool(scheme, host, port, self.per_host, self.rate, self.burst)
+            self._pools[key] = pool
+        return pool
+
+    async def _get_once(self, url: str) -> _Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        host = parts.hostname or ""
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        pool = self._pool(scheme, host, port)
+
+        async with self._slots, pool.slots:
+            if pool.bucket is not None:
+                await pool.bucket.acquire()
+            lines = [
+                f"GET {target} HTTP/1.1",
+                f"Host: {parts.netloc}",
+                f"User-Agent: {_USER_AGENT}",
+                "Accept: application/json",
+                "Accept-Encoding: identity",
+                "Connection: keep-alive",
+            ]
+            lines.extend(f"{name}: {value}" for name, value in self.headers.items())
+            request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+            # A pooled connection may have been closed by the server while
+            # idle; that is not a failure of the request, so retry it once on
+            # a fresh connection.
+            for _ in range(2):
+                reader, writer, reused = await pool.connect(self.timeout)
+                try:
+                    self.requests += 1
+                    writer.write(request)
+                    await writer.drain()
+                    response = await asyncio.wait_for(_read_response(reader), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                pool.release(reader, writer, response.reusable)
+                return response
+        raise ConnectionResetError(f"Could not send request to {url}")
+
+    async def get(self, url: str) -> bytes:
+        """
+        GET ``url`` and return the response body, using the cache if enabled.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+
+        attempt = 0
+        while True:
+            delay: Optional[float] = None
+            try:
+                response = await self._get_once(url)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as exc:
+                if attempt >= self.retries:
+                    raise FetchError(f"GET {url} failed after {attempt + 1} attempts: {exc!r}") from exc
+                logger.warning("GET %s failed (%r), retrying", url, exc)
+            else:
+                if 200 <= response.status < 300:
+                    if self.cache is not None:
+                        self.cache.put(url, response.body)
+                    return response.body
+                if response.status not in _RETRY_STATUSES or attempt >= self.retries:
+                    raise FetchError(f"GET {url} returned HTTP {response.status}")
+                logger.warning("GET %s returned HTTP %d, retrying", url, response.status)
+                retry_after = response.headers.get("retry-after", "")
+                if retry_after.isdigit():
+                    delay = float(retry_after)
+
+            if delay is None:
+                delay = self.backoff * (2**attempt) + random.uniform(0, self.backoff)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _search_one(self, kind: str, value: Any) -> List[Dict[str, Any]]:
+        url = self.url_for(kind, value)
+        body = await self.get(url)
+        payload = json.loads(body)
+        if isinstance(payload, dict):
+            for key in _RESULT_KEYS:
+                if isinstance(payload.get(key), list):
+                    payload = payload[key]
+                    break
+            else:
+                payload = [payload]
+        if not isinstance(payload, list):
+            logger.warning("Unexpected %s payload from %s", type(payload).__name__, url)
+            return []
+        return payload
+
+    async def search(self, searches: Iterable[Tuple[str, Any]]) -> AsyncIterator[Any]:
+        """
+        Run the ``(kind, value)`` searches concurrently and yield raw listings
+        in request order, so a rerun yields them in the same order. At most
+        ``concurrency`` searches are in flight or waiting to be yielded.
+        Failed searches are logged and skipped.
+        """
+        pending = iter(searches)
+        tasks: Deque["asyncio.Future[List[Dict[str, Any]]]"] = deque()
+
+        def refill() -> None:
+            for kind, value in itertools.islice(pending, self.concurrency - len(tasks)):
+                tasks.append(asyncio.ensure_future(self._search_one(kind, value)))
+
+        try:
+            refill()
+            while tasks:
+                task = tasks.popleft()
+                refill()
+                try:
+                    listings = await task
+                except (FetchError, ValueError) as exc:
+                    logger.error("Search failed: %s", exc)
+                    continue
+                for listing in listings:
+                    yield listing
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def iter_fetched_listings(
+    searches: Iterable[Tuple[str, Any]],
+    **options: Any,
+) -> Iterator[Any]:
+    """
+    Synchronous view of ListingFetcher.search for the rest of the pipeline.
+
+    The event loop runs in a background thread and hands listings over as
+    they arrive, so parse_property_listings can start on the first response
+    while the others are still in flight. At most HANDOFF_SIZE listings wait
+    for the consumer; fetching pauses while the handoff is full.
+    ``options`` go to ListingFetcher.
+    """
+    handoff: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=HANDOFF_SIZE)
+    stop = threading.Event()
+    searches = list(searches)
+
+    def hand_off(message: Tuple[str, Any]) -> bool:
+        # Give up once the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                handoff.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    async def produce() -> None:
+        async with ListingFetcher(**options) as fetcher:
+            count = 0
+            async for listing in fetcher.search(searches):
+                if stop.is_set():
+                    break
+                try:
+                    handoff.put_nowait(("item", listing))
+                except queue.Full:
+                    # Wait off the event loop so requests in flight progress
+                    if not await asyncio.to_thread(hand_off, ("item", listing)):
+                        break
+                count += 1
+            logger.info(
+                "Fetched %d listings for %d searches (%d requests, %d cache hits)",
+                count,
+                len(searches),
+                fetcher.requests,
+                fetcher.cache_hits,
+            )
+
+    def run() -> None:
+        try:
+            asyncio.run(produce())
+        except BaseException as exc:  # noqa: BLE001 - re-raised in the consumer
+            hand_off(("error", exc))
+        else:
+            hand_off(("done", None))
+
+    thread = threading.Thread(target=run, name="listing-fetcher", daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, value = handoff.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stop.set()
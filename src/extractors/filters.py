@@ -1,100 +1,154 @@
-thonfrom __future__ import annotations
+from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, Optional
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
 
+from .columnar import ListingTable, columnar_available
+from .expressions import compile_filter, legacy_conditions
+from .sorting import external_sort, make_sort_key, select_top_k
 from .utils import get_logger
 
 logger = get_logger("filters")
 
-def _get_nested_value(data: Dict[str, Any], path: str) -> Any:
-    current: Any = data
-    for part in path.split("."):
-        if not isinstance(current, dict):
-            return None
-        current = current.get(part)
-    return current
-
-def _apply_price_filter(
-    listings: Iterable[Dict[str, Any]],
-    min_price: Optional[int],
-    max_price: Optional[int],
-) -> List[Dict[str, Any]]:
-    result: List[Dict[str, Any]] = []
-    for listing in listings:
-        price = _get_nested_value(listing, "price.value")
-        if price is None:
-            continue
-        if min_price is not None and price < min_price:
-            continue
-        if max_price is not None and price > max_price:
-            continue
-        result.append(listing)
-    return result
-
-def _apply_bedroom_filter(
-    listings: Iterable[Dict[str, Any]],
-    min_bedrooms: Optional[int],
-) -> List[Dict[str, Any]]:
-    if min_bedrooms is None:
-        return list(listings)
-    result: List[Dict[str, Any]] = []
-    for listing in listings:
-        beds = listing.get("bedrooms")
-        if beds is None:
-            continue
-        try:
-            if int(beds) >= min_bedrooms:
-                result.append(listing)
-        except (TypeError, ValueError):
-            continue
-    return result
-
 def _apply_sorting(
     listings: Iterable[Dict[str, Any]],
     sort_by: str,
     order: str,
-) -> List[Dict[str, Any]]:
+    limit: Optional[int] = None,
+    sort_buffer_size: Optional[int] = None,
+) -> Iterable[Dict[str, Any]]:
     reverse = order.lower() == "desc"
+    sort_key = make_sort_key(sort_by)
 
-    def sort_key(item: Dict[str, Any]) -> Any:
-        value = _get_nested_value(item, sort_by)
-        # Ensure None values go to the end
-        return (value is None, value)
+    if limit is not None and limit > 0:
+        # Bounded heap: only the best `limit` listings are ever held
+        return select_top_k(listings, sort_key, limit, reverse=reverse)
+    if sort_buffer_size:
+        return external_sort(listings, sort_key, sort_buffer_size, reverse=reverse)
 
+    items = list(listings)
     try:
-        return sorted(listings, key=sort_key, reverse=reverse)
+        return sorted(items, key=sort_key, reverse=reverse)
     except TypeError:
         # Fallback: no sorting if incomparable types are encountered
         logger.warning("Failed to sort by %s due to incomparable types", sort_by)
-        return list(listings)
+        return items
 
-def apply_filters(
-    listings: List[Dict[str, Any]],
+def _apply_columnar(
+    listings: Iterable[Dict[str, Any]],
+    conditions: Sequence[Mapping[str, Any]],
+    sort_by: Optional[str],
+    order: str,
+    limit: Optional[int],
+) -> List[Dict[str, Any]]:
+    return filter_table(ListingTable(list(listings)), conditions, sort_by, order, limit)
+
+def filter_table(
+    table: ListingTable,
+    conditions: Sequence[Mapping[str, Any]],
+    sort_by: Optional[str],
+    order: str = "asc",
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Filter, sort and limit an already built ListingTable; the result equals
+    apply_filters with the same conditions on the table's records.
+    """
+    indices = table.filter_indices(conditions)
+    if not sort_by:
+        if limit is not None and limit > 0:
+            indices = indices[:limit]
+        return table.materialize(indices)
+
+    ordered = table.sort_indices(indices, sort_by, order, limit)
+    if ordered is not None:
+        return table.materialize(ordered)
+
+    # No usable column for the sort key: sort the surviving rows directly
+    survivors = _apply_sorting(table.materialize(indices), sort_by, order, limit)
+    return list(islice(survivors, limit)) if limit is not None and limit > 0 else list(survivors)
+
+def iter_filters(
+    listings: Iterable[Dict[str, Any]],
     min_price: Optional[int] = None,
     max_price: Optional[int] = None,
     min_bedrooms: Optional[int] = None,
-    sort_by: str = "price.value",
+    sort_by: Optional[str] = "price.value",
     order: str = "asc",
     limit: Optional[int] = None,
-) -> List[Dict[str, Any]]:
+    sort_buffer_size: Optional[int] = None,
+    where: Optional[Sequence[Mapping[str, Any]]] = None,
+    columnar: bool = False,
+) -> Iterator[Dict[str, Any]]:
     """
-    Apply filtering, sorting and limiting to a list of normalized listings.
+    Streaming counterpart of apply_filters.
+
+    min_price/max_price/min_bedrooms and any ``where`` clauses (see
+    expressions.compile_filter) are fused into one predicate and checked in
+    a single pass. With ``columnar`` (and numpy installed) the listings are
+    loaded into a ListingTable and filtered/sorted with vectorized masks.
+    The table is built anew on every call, which is slower than one row
+    pass; callers filtering the same listings repeatedly build the table
+    once and query it with filter_table, as profiles and the server do.
+
+    Without sort_by, listings pass straight through. With a limit, sorting
+    keeps only the top ``limit`` listings in a bounded heap. Without one,
+    survivors are sorted in memory, or with an on-disk merge sort holding at
+    most ``sort_buffer_size`` listings when that budget is configured.
     """
     logger.info(
-        "Applying filters: min_price=%s max_price=%s min_bedrooms=%s sort_by=%s order=%s limit=%s",
+        "Applying filters: min_price=%s max_price=%s min_bedrooms=%s where=%s sort_by=%s order=%s limit=%s",
         min_price,
         max_price,
         min_bedrooms,
+        where or [],
         sort_by,
         order,
         limit,
     )
 
-    filtered = _apply_price_filter(listings, min_price, max_price)
-    filtered = _apply_bedroom_filter(filtered, min_bedrooms)
-    sorted_list = _apply_sorting(filtered, sort_by, order)
+    conditions = legacy_conditions(min_price, max_price, min_bedrooms) + list(where or [])
+    if columnar:
+        if columnar_available():
+            yield from _apply_columnar(listings, conditions, sort_by, order, limit)
+            return
+        logger.warning("numpy is not installed, falling back to row-based filtering")
+
+    filtered: Iterable[Dict[str, Any]] = filter(compile_filter(conditions), listings)
+    if sort_by:
+        filtered = _apply_sorting(filtered, sort_by, order, limit, sort_buffer_size)
 
     if limit is not None and limit > 0:
-        sorted_list = sorted_list[:limit]
+        filtered = islice(filtered, limit)
+
+    yield from filtered
 
-    return sorted_list
\ No newline at end of file
+def apply_filters(
+    listings: Iterable[Dict[str, Any]],
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    min_bedrooms: Optional[int] = None,
+    sort_by: Optional[str] = "price.value",
+    order: str = "asc",
+    limit: Optional[int] = None,
+    sort_buffer_size: Optional[int] = None,
+    where: Optional[Sequence[Mapping[str, Any]]] = None,
+    columnar: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Apply filtering, sorting and limiting to a list of normalized listings.
+    """
+    return list(
+        iter_filters(
+            listings,
+            min_price=min_price,
+            max_price=max_price,
+            min_bedrooms=min_bedrooms,
+            sort_by=sort_by,
+            order=order,
+            limit=limit,
+            sort_buffer_size=sort_buffer_size,
+            where=where,
+            columnar=columnar,
+        )
+    )
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import json
+import mmap
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .listing import as_dict
+from .property_parser import normalize_sections
+from .sources import COMPRESSION_SUFFIXES
+from .utils import get_logger, iter_json_spans
+
+logger = get_logger("lazy_sections")
+
+# Sections that can be large and are only needed for the output
+LAZY_SECTIONS = ("priceHistory", "taxHistory", "resoFacts", "attributionInfo", "photos")
+
+class SourceSpan:
+    """Byte range of one raw record in an uncompressed input file."""
+
+    __slots__ = ("path", "offset", "length")
+
+    def __init__(self, path: str, offset: int, length: int) -> None:
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self) -> str:
+        return f"SourceSpan({self.path!r}, {self.offset}, {self.length})"
+
+def iter_spans(paths: Sequence[str], chunk_size: int = 1 << 16) -> Iterator[Tuple[Any, SourceSpan]]:
+    """
+    Lazily yield ``(record, span)`` for every record of uncompressed JSON
+    array or NDJSON files, where the span locates the record in its file.
+    """
+    for path in paths:
+        if path.endswith(COMPRESSION_SUFFIXES):
+            raise ValueError(f"Deferred sections need uncompressed input files, got {path}")
+        for record, offset, length in iter_json_spans(path, chunk_size):
+            yield record, SourceSpan(path, offset, length)
+
+def deferrable_sections(output: Optional[FrozenSet[str]], eager: Iterable[str]) -> FrozenSet[str]:
+    """
+    The LAZY_SECTIONS in ``output`` (None for all sections) that nothing
+    in ``eager``, the sections read before the transform, needs.
+    """
+    eager = frozenset(eager)
+    return frozenset(
+        name for name in LAZY_SECTIONS if (output is None or name in output) and name not in eager
+    )
+
+class SpanReader:
+    """Reads the records behind spans, mapping each input file once."""
+
+    def __init__(self) -> None:
+        self._files: Dict[str, Tuple[Any, mmap.mmap]] = {}
+
+    def load(self, span: SourceSpan) -> Any:
+        entry = self._files.get(span.path)
+        if entry is None:
+            f = open(span.path, "rb")
+            entry = self._files[span.path] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return json.loads(entry[1][span.offset : span.offset + span.length])
+
+    def close(self) -> None:
+        for f, mapped in self._files.values():
+            mapped.close()
+            f.close()
+        self._files.clear()
+
+    def __enter__(self) -> "SpanReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+def materialize_sections(listings: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Return the listings as dicts with every deferred section (one holding
+    a SourceSpan) normalized from its re-read source record. Spans are read
+    in file order, so survivors of a sort are still read sequentially.
+    """
+    result: List[Dict[str, Any]] = [as_dict(listing) for listing in listings]
+    pending = [
+        (index, [name for name, value in record.items() if type(value) is SourceSpan])
+        for index, record in enumerate(result)
+    ]
+    pending = [(index, names) for index, names in pending if names]
+    if not pending:
+        return result
+
+    def position(entry: Tuple[int, List[str]]) -> Tuple[str, int]:
+        span = result[entry[0]][entry[1][0]]
+        return span.path, span.offset
+
+    with SpanReader() as reader:
+        for index, names in sorted(pending, key=position):
+            record = dict(result[index])
+            record.update(normalize_sections(reader.load(record[names[0]]), names))
+            result[index] = record
+    logger.info("Materialized deferred sections of %d listings", len(pending))
+    return result
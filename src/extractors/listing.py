@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import sys
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from .utils import get_logger
+
+logger = get_logger("listing")
+
+_UNSET = object()
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+def _struct(keys: Tuple[str, ...], intern: Tuple[str, ...] = ()) -> Tuple[Callable[[Any], Any], Callable[[Any], Any]]:
+    """
+    Pack a dict with exactly ``keys`` into a tuple and back. Anything else
+    is stored as-is, so packing never changes what a listing holds.
+    """
+
+    def pack(value: Any) -> Any:
+        if type(value) is not dict or tuple(value) != keys:
+            return value
+        return tuple(_intern(v) if k in intern else v for k, v in value.items())
+
+    def unpack(value: Any) -> Any:
+        if type(value) is not tuple:
+            return value
+        return dict(zip(keys, value))
+
+    return pack, unpack
+
+def _struct_list(keys: Tuple[str, ...]) -> Tuple[Callable[[Any], Any], Callable[[Any], Any]]:
+    pack_item, unpack_item = _struct(keys)
+
+    def pack(value: Any) -> Any:
+        if type(value) is not list or any(type(item) is not dict or tuple(item) != keys for item in value):
+            return value
+        return tuple(pack_item(item) for item in value)
+
+    def unpack(value: Any) -> Any:
+        if type(value) is not tuple:
+            return value
+        return [unpack_item(item) for item in value]
+
+    return pack, unpack
+
+def _identity(value: Any) -> Any:
+    return value
+
+_PLAIN = (_identity, _identity)
+
+# Normalized sections in property_parser._SECTIONS order, each with the
+# functions that pack it into its compact form and expand it back.
+_CODECS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any], Any]]] = {
+    "zpid": _PLAIN,
+    "price": _struct(("value",)),
+    "address": _struct(("streetAddress", "city", "state", "zipcode"), intern=("city", "state")),
+    "bedrooms": _PLAIN,
+    "bathrooms": _PLAIN,
+    "livingArea": _PLAIN,
+    "yearBuilt": _PLAIN,
+    "lotSizeWithUnit": _struct(("lotSize",)),
+    "propertyType": (_intern, _identity),
+    "taxAssessment": _struct(("taxAssessedValue", "taxAssessmentYear")),
+    "priceHistory": _PLAIN,
+    "taxHistory": _PLAIN,
+    "schools": _struct_list(("name", "rating", "distance")),
+    "walkScore": _struct(("walkscore", "description")),
+    "resoFacts": _PLAIN,
+    "attributionInfo": _PLAIN,
+    "photos": _PLAIN,
+    "url": _PLAIN,
+}
+
+_UNPACK = {key: unpack for key, (_, unpack) in _CODECS.items()}
+
+class Listing(Mapping):
+    """
+    Compact, read-only normalized listing.
+
+    Sections live in slots instead of a per-listing dict; fixed-shape
+    nested dicts (price, address, schools, ...) are stored as tuples and
+    city/state/propertyType strings are interned. Reading a section
+    rebuilds today's dict shape, so filters, sorting and map_fields work
+    on a Listing exactly as on the dict from _normalize_listing.
+    """
+
+    __slots__ = tuple(_CODECS)
+
+    @classmethod
+    def from_dict(cls, record: Mapping[str, Any]) -> "Listing":
+        if any(key not in _CODECS for key in record):
+            raise ValueError(f"Cannot pack listing with unknown sections: {sorted(set(record) - set(_CODECS))}")
+        listing = cls.__new__(cls)
+        for key, value in record.items():
+            object.__setattr__(listing, key, _CODECS[key][0](value))
+        return listing
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("Listing is read-only")
+
+    def __getitem__(self, key: str) -> Any:
+        unpack = _UNPACK.get(key)
+        if unpack is None:
+            raise KeyError(key)
+        value = getattr(self, key, _UNSET)
+        if value is _UNSET:
+            raise KeyError(key)
+        return unpack(value)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        unpack = _UNPACK.get(key)
+        if unpack is None:
+            return default
+        value = getattr(self, key, _UNSET)
+        return default if value is _UNSET else unpack(value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in _UNPACK and hasattr(self, key)  # type: ignore[arg-type]
+
+    def __iter__(self) -> Iterator[str]:
+        for key in _UNPACK:
+            if hasattr(self, key):
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Listing({self.to_dict()!r})"
+
+    def __reduce__(self) -> Any:
+        # Pickle the packed slots; the default protocol would go through
+        # __setattr__, which is disabled.
+        return (_restore, (tuple((key, getattr(self, key)) for key in self),))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Expand into the plain dict shape produced by _normalize_listing.
+        """
+        return {key: self[key] for key in self}
+
+def _restore(packed: Tuple[Tuple[str, Any], ...]) -> Listing:
+    listing = Listing.__new__(Listing)
+    for key, value in packed:
+        object.__setattr__(listing, key, value)
+    return listing
+
+def as_dict(record: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Return ``record`` as a plain dict, expanding compact listings.
+    """
+    return record.to_dict() if isinstance(record, Listing) else record  # type: ignore[return-value]
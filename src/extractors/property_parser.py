@@ -1,20 +1,29 @@
-thonfrom __future__ import annotations
+from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import logging
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
+from .dead_letter import RejectSink
+from .listing import Listing
 from .utils import get_logger
 
 logger = get_logger("property_parser")
 
 def _safe_int(value: Any) -> Optional[int]:
+    if type(value) is int:
+        return value
     try:
         if value is None or value == "":
             return None
         return int(value)
-    except (TypeError, ValueError):
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError: an infinite float, as json reads "Infinity"
         return None
 
 def _safe_float(value: Any) -> Optional[float]:
+    if type(value) is float:
+        return value
     try:
         if value is None or value == "":
             return None
@@ -111,64 +120,428 @@ def _normalize_photos(raw: Dict[str, Any]) -> List[Dict[str, Any]]:
         return []
     return photos
 
-def _normalize_listing(raw: Dict[str, Any]) -> Dict[str, Any]:
-    zpid = raw.get("zpid") or raw.get("id") or raw.get("zpid_raw")
-    zpid_int = _safe_int(zpid)
+def extract_zpid(raw: Dict[str, Any]) -> Optional[int]:
+    """
+    Resolve the zpid of a raw listing the same way normalization does.
+    """
+    return _safe_int(raw.get("zpid") or raw.get("id") or raw.get("zpid_raw"))
+
+def _normalize_bedrooms(raw: Dict[str, Any]) -> Optional[int]:
+    return _safe_int(raw.get("bedrooms") or raw.get("beds"))
+
+def _normalize_bathrooms(raw: Dict[str, Any]) -> Optional[float]:
+    return _safe_float(raw.get("bathrooms") or raw.get("baths"))
 
+def _normalize_living_area(raw: Dict[str, Any]) -> Optional[int]:
     living_area = (
         raw.get("livingArea")
         or raw.get("area")
         or raw.get("living_area")
         or raw.get("sqft")
     )
+    return _safe_int(living_area)
 
+def _normalize_year_built(raw: Dict[str, Any]) -> Optional[int]:
+    return _safe_int(raw.get("yearBuilt") or raw.get("year_built"))
+
+def _normalize_lot_size(raw: Dict[str, Any]) -> Dict[str, Any]:
     lot_size = None
     lot_size_container = raw.get("lotSizeWithUnit") or {}
     if isinstance(lot_size_container, dict):
         lot_size = lot_size_container.get("lotSize") or lot_size_container.get("value")
+    return {"lotSize": _safe_int(lot_size)}
 
-    result: Dict[str, Any] = {
-        "zpid": zpid_int,
-        "price": _normalize_price(raw),
-        "address": _normalize_address(raw),
-        "bedrooms": _safe_int(raw.get("bedrooms") or raw.get("beds")),
-        "bathrooms": _safe_float(raw.get("bathrooms") or raw.get("baths")),
-        "livingArea": _safe_int(living_area),
-        "yearBuilt": _safe_int(raw.get("yearBuilt") or raw.get("year_built")),
-        "lotSizeWithUnit": {"lotSize": _safe_int(lot_size)},
-        "propertyType": raw.get("propertyType") or raw.get("property_type"),
-        "taxAssessment": _normalize_tax_assessment(raw),
-        "priceHistory": _normalize_price_history(raw),
-        "taxHistory": _normalize_tax_history(raw),
-        "schools": _normalize_schools(raw),
-        "walkScore": _normalize_walkscore(raw),
-        "resoFacts": raw.get("resoFacts") or raw.get("features") or {},
-        "attributionInfo": raw.get("attributionInfo") or {},
-        "photos": _normalize_photos(raw),
-        "url": raw.get("url"),
-    }
+def _normalize_property_type(raw: Dict[str, Any]) -> Any:
+    return raw.get("propertyType") or raw.get("property_type")
+
+def _normalize_reso_facts(raw: Dict[str, Any]) -> Any:
+    return raw.get("resoFacts") or raw.get("features") or {}
+
+def _normalize_attribution(raw: Dict[str, Any]) -> Any:
+    return raw.get("attributionInfo") or {}
+
+def _normalize_url(raw: Dict[str, Any]) -> Any:
+    return raw.get("url")
 
-    logger.debug("Normalized listing for zpid %s", zpid_int)
+# Reasons iter_property_listings skips a raw record for
+SKIP_REASONS = ("non_dict", "missing_zpid", "normalize_error")
+
+# Normalized sections in output order; zpid is always resolved first.
+_SECTIONS: Tuple[Tuple[str, Callable[[Dict[str, Any]], Any]], ...] = (
+    ("price", _normalize_price),
+    ("address", _normalize_address),
+    ("bedrooms", _normalize_bedrooms),
+    ("bathrooms", _normalize_bathrooms),
+    ("livingArea", _normalize_living_area),
+    ("yearBuilt", _normalize_year_built),
+    ("lotSizeWithUnit", _normalize_lot_size),
+    ("propertyType", _normalize_property_type),
+    ("taxAssessment", _normalize_tax_assessment),
+    ("priceHistory", _normalize_price_history),
+    ("taxHistory", _normalize_tax_history),
+    ("schools", _normalize_schools),
+    ("walkScore", _normalize_walkscore),
+    ("resoFacts", _normalize_reso_facts),
+    ("attributionInfo", _normalize_attribution),
+    ("photos", _normalize_photos),
+    ("url", _normalize_url),
+)
+
+# Sections whose normalizer raises on a malformed record (an address or
+# taxAssessment that is not an object). They are still run when projected
+# away, so a projection never changes which records are skipped.
+_CHECKED_SECTIONS: Tuple[Tuple[str, Callable[[Dict[str, Any]], Any]], ...] = (
+    ("address", _normalize_address),
+    ("taxAssessment", _normalize_tax_assessment),
+)
+
+# Every section of a normalized listing, in output order
+ALL_SECTIONS: Tuple[str, ...] = ("zpid",) + tuple(name for name, _ in _SECTIONS)
+
+def projection_for(paths: Iterable[str]) -> FrozenSet[str]:
+    """
+    Top-level sections needed to serve dotted paths such as ``price.value``
+    or ``schools[*].rating``.
+    """
+    return frozenset(path.split(".")[0].split("[")[0] for path in paths) | {"zpid"}
+
+def _normalize_listing(
+    raw: Dict[str, Any],
+    fields: Optional[FrozenSet[str]] = None,
+) -> Dict[str, Any]:
+    zpid_int = extract_zpid(raw)
+
+    result: Dict[str, Any] = {"zpid": zpid_int}
+    if fields is None:
+        for name, normalize in _SECTIONS:
+            result[name] = normalize(raw)
+    else:
+        # Projection pushdown: sections nobody reads are never built or copied
+        for name, normalize in _SECTIONS:
+            if name in fields:
+                result[name] = normalize(raw)
+        for name, normalize in _CHECKED_SECTIONS:
+            if name not in fields:
+                normalize(raw)
     return result
 
-def parse_property_listings(raw_listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+# Shape specialization. Feeds come in a handful of key layouts, so the alias
+# chains above mostly try keys a record does not have. For each layout seen,
+# one function is generated that reads only the keys the layout has, with
+# the same ``or`` semantics, section order and exceptions as the generic
+# path. Nested lookups that depend on values rather than keys (lot size,
+# walk score) still call their generic helper.
+
+def _key(name: str, shape: FrozenSet[str]) -> Optional[str]:
+    return f"raw[{name!r}]" if name in shape else None
+
+def _either(*terms: Optional[str]) -> str:
+    """
+    Source for ``t1 or t2 or ...`` where None marks a term that is always
+    None for this shape: dropped, except that a chain ending in one still
+    turns falsy values into None.
+    """
+    present = [term for term in terms if term is not None]
+    if terms[-1] is None:
+        present.append("None")
+    return " or ".join(present)
+
+def _aliases(names: Tuple[str, ...], shape: FrozenSet[str]) -> str:
+    return _either(*(_key(name, shape) for name in names))
+
+# Inlined type fast path of _safe_int/_safe_float, saving a call per value
+_AS_INT = "v if type(v) is int else _safe_int(v)"
+_AS_FLOAT = "v if type(v) is float else _safe_float(v)"
+
+def _converted(target: str, value: str, convert: str) -> List[str]:
+    if value == "None":
+        return [f"{target} = None"]
+    return [f"v = {value}", f"{target} = {convert}"]
+
+def _list_section(name: str, shape: FrozenSet[str]) -> List[str]:
+    if name not in shape:
+        return [f"result[{name!r}] = []"]
+    return [f"v = raw[{name!r}] or []", f"result[{name!r}] = v if isinstance(v, list) else []"]
+
+def _section_source(name: str, shape: FrozenSet[str]) -> List[str]:
+    if name == "price":
+        # The nested price.value term only runs when price is falsy, and then
+        # reads an empty dict, so it never contributes
+        value = _aliases(("price", "priceValue", "listPrice"), shape)
+        return _converted("price", value, _AS_INT) + ["result['price'] = {'value': price}"]
+    if name == "address":
+        nested = "address" in shape
+        fields = (
+            ("streetAddress", ("street", "streetAddress"), "streetAddress"),
+            ("city", ("city",), "city"),
+            ("state", ("state",), "state"),
+            ("zipcode", ("zipcode", "zip"), "zipcode"),
+        )
+        lines = ["addr = raw['address'] or {}"] if nested else []
+        items = []
+        for field, keys, top in fields:
+            terms = [f"addr.get({key!r})" if nested else None for key in keys]
+            items.append(f"{field!r}: {_either(*terms, _key(top, shape))}")
+        return lines + [f"result['address'] = {{{', '.join(items)}}}"]
+    if name == "taxAssessment":
+        nested = "taxAssessment" in shape
+        lines = ["tax = raw['taxAssessment'] or {}"] if nested else []
+        assessed = _either("tax.get('taxAssessedValue')" if nested else None, _key("tax_assessed_value", shape), _key("taxAssessedValue", shape))
+        year = _either("tax.get('taxAssessmentYear')" if nested else None, _key("taxAssessmentYear", shape), _key("tax_assessment_year", shape))
+        return lines + _converted("assessed", assessed, _AS_INT) + [
+            f"year = {year}",
+            "result['taxAssessment'] = {'taxAssessedValue': assessed, 'taxAssessmentYear': str(year) if year is not None else None}",
+        ]
+    if name in _SCALARS:
+        keys, convert = _SCALARS[name]
+        if convert is None:
+            return [f"result[{name!r}] = {_aliases(keys, shape)}"]
+        return _converted(f"result[{name!r}]", _aliases(keys, shape), convert)
+    if name in ("priceHistory", "taxHistory", "photos"):
+        return _list_section(name, shape)
+    if name == "lotSizeWithUnit":
+        return [f"result[{name!r}] = " + ("_normalize_lot_size(raw)" if name in shape else "{'lotSize': None}")]
+    if name == "schools":
+        if name not in shape:
+            return ["result['schools'] = []"]
+        # _normalize_schools inlined; school entries carry their own aliases
+        school = (
+            "{'name': s.get('name') or s.get('schoolName'), "
+            "'rating': r if type(r := s.get('rating') or s.get('score')) is int else _safe_int(r), "
+            "'distance': _safe_float(s.get('distance'))}"
+        )
+        return [
+            "v = raw['schools'] or []",
+            f"result['schools'] = [{school} for s in v if isinstance(s, dict)] if isinstance(v, list) else []",
+        ]
+    if name == "walkScore":
+        return [f"result[{name!r}] = " + ("_normalize_walkscore(raw)" if shape & {"walkScore", "walkscore"} else "None")]
+    if name == "resoFacts":
+        return [f"result[{name!r}] = {_aliases(('resoFacts', 'features'), shape)} or {{}}"]
+    if name == "attributionInfo":
+        return [f"result[{name!r}] = " + ("raw['attributionInfo'] or {}" if name in shape else "{}")]
+    raise KeyError(name)
+
+# Sections that are one alias chain, with the conversion applied to it
+_SCALARS: Dict[str, Tuple[Tuple[str, ...], Optional[str]]] = {
+    "bedrooms": (("bedrooms", "beds"), _AS_INT),
+    "bathrooms": (("bathrooms", "baths"), _AS_FLOAT),
+    "livingArea": (("livingArea", "area", "living_area", "sqft"), _AS_INT),
+    "yearBuilt": (("yearBuilt", "year_built"), _AS_INT),
+    "propertyType": (("propertyType", "property_type"), None),
+    "url": (("url",), None),
+}
+
+_SPECIALIZED_GLOBALS = {
+    "_safe_int": _safe_int,
+    "_safe_float": _safe_float,
+    "_normalize_lot_size": _normalize_lot_size,
+    "_normalize_walkscore": _normalize_walkscore,
+    "_normalize_address": _normalize_address,
+    "_normalize_tax_assessment": _normalize_tax_assessment,
+}
+
+def specialized_source(shape: FrozenSet[str], fields: Optional[FrozenSet[str]] = None) -> str:
+    """
+    Source of the normalizer generated for records with the keys ``shape``.
+    """
+    lines = _converted("zpid", _aliases(("zpid", "id", "zpid_raw"), shape), _AS_INT) + ["result = {'zpid': zpid}"]
+    for name, _ in _SECTIONS:
+        if fields is None or name in fields:
+            lines.extend(_section_source(name, shape))
+    if fields is not None:
+        # Without its key a checked section cannot raise
+        lines.extend(
+            f"{normalize.__name__}(raw)" for name, normalize in _CHECKED_SECTIONS if name not in fields and name in shape
+        )
+    body = "".join(f"    {line}\n" for line in lines)
+    return f"def normalize(raw):\n{body}    return result\n"
+
+def _specialize(shape: FrozenSet[str], fields: Optional[FrozenSet[str]]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    namespace = dict(_SPECIALIZED_GLOBALS)
+    exec(compile(specialized_source(shape, fields), "<shape normalizer>", "exec"), namespace)
+    return namespace["normalize"]
+
+class ShapeCache:
+    """
+    Normalizers specialized per record shape (its keys, in order) and
+    projection, built the first time a shape is seen.
+
+    Once ``max_shapes`` shapes are cached, records of new shapes use the
+    generic normalizer, so inputs whose layouts vary record by record cost
+    little more than before. ``hits``, ``misses`` (shapes built) and
+    ``generic`` count normalizations by the path they took.
+    """
+
+    __slots__ = ("max_shapes", "hits", "misses", "generic", "_normalizers")
+
+    def __init__(self, max_shapes: int = 128) -> None:
+        self.max_shapes = max_shapes
+        self.hits = 0
+        self.misses = 0
+        self.generic = 0
+        self._normalizers: Dict[Tuple[Tuple[str, ...], Optional[FrozenSet[str]]], Callable[[Dict[str, Any]], Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._normalizers)
+
+    def normalize(self, raw: Dict[str, Any], fields: Optional[FrozenSet[str]] = None) -> Dict[str, Any]:
+        key = (tuple(raw), fields)
+        normalize = self._normalizers.get(key)
+        if normalize is not None:
+            self.hits += 1
+            return normalize(raw)
+        if len(self._normalizers) >= self.max_shapes:
+            self.generic += 1
+            return _normalize_listing(raw, fields)
+        self.misses += 1
+        normalize = self._normalizers[key] = _specialize(frozenset(key[0]), fields)
+        return normalize(raw)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses + self.generic
+        return {
+            "shapes": len(self._normalizers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "generic": self.generic,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+    def clear(self) -> None:
+        self._normalizers.clear()
+        self.hits = self.misses = self.generic = 0
+
+# Shared by every parse in this process; see shape_cache_stats
+_shapes = ShapeCache()
+
+def shape_cache_stats() -> Dict[str, Any]:
+    """
+    Shape-cache counters of this process (see ShapeCache).
+    """
+    return _shapes.stats()
+
+def log_shape_cache_stats() -> None:
+    stats = _shapes.stats()
+    if stats["hit_rate"] is not None:
+        logger.info(
+            "Shape cache: %d shapes, %d hits, %d built, %d generic (hit rate %.1f%%)",
+            stats["shapes"],
+            stats["hits"],
+            stats["misses"],
+            stats["generic"],
+            stats["hit_rate"] * 100,
+        )
+
+def normalize_sections(raw: Dict[str, Any], names: Iterable[str]) -> Dict[str, Any]:
+    """
+    Normalize only the named sections of one raw listing, in output order.
+    """
+    wanted = frozenset(names)
+    return {name: normalize(raw) for name, normalize in _SECTIONS if name in wanted}
+
+def _with_deferred(norm: Dict[str, Any], deferred: FrozenSet[str], source: Any) -> Dict[str, Any]:
+    return {name: source if name in deferred else norm[name] for name in ALL_SECTIONS if name in norm or name in deferred}
+
+def log_skipped(skipped: Counter[str], context: str = "listings") -> None:
+    """
+    Log one summary line for records skipped by reason.
+    """
+    total = sum(skipped.values())
+    if total:
+        reasons = ", ".join(f"{reason}={count}" for reason, count in sorted(skipped.items()))
+        logger.warning("Skipped %d malformed %s (%s)", total, context, reasons)
+
+def iter_property_listings(
+    raw_listings: Iterable[Any],
+    start: int = 0,
+    fields: Optional[FrozenSet[str]] = None,
+    compact: bool = False,
+    skipped: Optional[Counter[str]] = None,
+    dead_letter: Optional[RejectSink] = None,
+    specialize: bool = True,
+    deferred: FrozenSet[str] = frozenset(),
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily normalize raw listings, skipping records that cannot be parsed.
+
+    ``start`` offsets the indices reported for skipped records, which keeps
+    them meaningful when a batch is one shard of a larger input. ``fields``
+    (see projection_for) limits normalization to the listed top-level
+    sections; the same records are skipped either way. With ``compact`` each listing is yielded as a read-only
+    Listing instead of a dict, which takes a fraction of the memory.
+    ``specialize`` normalizes through the shape cache (see ShapeCache);
+    the output is the same either way.
+
+    With ``deferred`` sections, ``raw_listings`` yields ``(raw, source)``
+    pairs and those sections are not normalized: each holds ``source``
+    until normalize_sections is run on the re-read record (see
+    extractors.lazy_sections). None of them can cause a record to be
+    skipped, so the same records are kept either way.
+
+    Skipped records are counted by reason (see SKIP_REASONS) and written to
+    ``dead_letter`` when given. The counts are added to ``skipped`` when the
+    caller collects them, otherwise they are logged once at the end;
+    per-record details are only logged at DEBUG level.
+    """
+    counts: Counter[str] = Counter()
+    debug = logger.isEnabledFor(logging.DEBUG)
+    normalize = _shapes.normalize if specialize else _normalize_listing
+    if deferred:
+        fields = (fields if fields is not None else frozenset(ALL_SECTIONS)) - deferred
+    source = None
+    try:
+        for idx, raw in enumerate(raw_listings, start):
+            if deferred:
+                raw, source = raw
+            if not isinstance(raw, dict):
+                counts["non_dict"] += 1
+                if debug:
+                    logger.debug("Skipping non-dict listing at index %d", idx)
+                if dead_letter is not None:
+                    dead_letter.write("non_dict", idx, raw)
+                continue
+            try:
+                norm = normalize(raw, fields)
+            except Exception as exc:  # noqa: BLE001
+                counts["normalize_error"] += 1
+                if debug:
+                    logger.debug("Failed to normalize listing at index %d", idx, exc_info=True)
+                if dead_letter is not None:
+                    dead_letter.write("normalize_error", idx, raw, f"{type(exc).__name__}: {exc}")
+                continue
+            if norm["zpid"] is None:
+                counts["missing_zpid"] += 1
+                if debug:
+                    logger.debug("Listing at index %d missing zpid, skipping", idx)
+                if dead_letter is not None:
+                    dead_letter.write("missing_zpid", idx, raw)
+                continue
+            if deferred:
+                norm = _with_deferred(norm, deferred, source)
+            yield Listing.from_dict(norm) if compact else norm
+    finally:
+        if skipped is not None:
+            skipped.update(counts)
+        else:
+            log_skipped(counts)
+
+def parse_property_listings(
+    raw_listings: Iterable[Any],
+    start: int = 0,
+    fields: Optional[FrozenSet[str]] = None,
+    compact: bool = False,
+    skipped: Optional[Counter[str]] = None,
+    dead_letter: Optional[RejectSink] = None,
+    specialize: bool = True,
+    deferred: FrozenSet[str] = frozenset(),
+) -> List[Dict[str, Any]]:
     """
     Convert raw scraped Zillow-like data into normalized listings.
 
     The function is defensive and attempts to handle missing or slightly
     malformed records without failing the entire batch.
     """
-    normalized: List[Dict[str, Any]] = []
-    for idx, raw in enumerate(raw_listings):
-        if not isinstance(raw, dict):
-            logger.warning("Skipping non-dict listing at index %d", idx)
-            continue
-        try:
-            norm = _normalize_listing(raw)
-            if norm.get("zpid") is None:
-                logger.warning("Listing at index %d missing zpid, skipping", idx)
-                continue
-            normalized.append(norm)
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Failed to normalize listing at index %d: %s", idx, exc)
-    return normalized
\ No newline at end of file
+    return list(
+        iter_property_listings(raw_listings, start, fields, compact, skipped, dead_letter, specialize, deferred)
+    )
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import heapq
+import pickle
+import tempfile
+from itertools import chain, islice
+from operator import itemgetter
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Set, Tuple, TypeVar
+
+from .utils import compile_path, get_logger, get_path_value
+
+logger = get_logger("sorting")
+
+T = TypeVar("T")
+
+_Entry = Tuple[Any, int, Any]
+
+SortKey = Tuple[bool, Any]
+
+def make_sort_key(sort_by: str) -> Callable[[Dict[str, Any]], SortKey]:
+    """
+    Build the key function used to order listings by a dotted path.
+
+    The path is split once here rather than on every key extraction.
+    """
+    parts = compile_path(sort_by)
+
+    def sort_key(item: Dict[str, Any]) -> SortKey:
+        value = get_path_value(item, parts)
+        # Ensure None values go to the end
+        return (value is None, value)
+
+    return sort_key
+
+def select_top_k(
+    items: Iterable[T],
+    key: Callable[[T], Any],
+    k: int,
+    reverse: bool = False,
+) -> List[T]:
+    """
+    Return ``sorted(items, key=key, reverse=reverse)[:k]`` in O(n log k) time
+    and O(k) memory.
+
+    If keys turn out not to be comparable, the first k items are returned in
+    input order, mirroring the fallback of an unsortable in-memory list.
+    """
+    source = iter(items)
+    head = list(islice(source, k))
+    select = heapq.nlargest if reverse else heapq.nsmallest
+    try:
+        return select(k, chain(head, source), key=key)
+    except TypeError:
+        logger.warning("Sort keys are not comparable; keeping input order")
+        return head
+
+def _spill(entries: List[_Entry]) -> IO[bytes]:
+    run = tempfile.TemporaryFile(prefix="zillow-sort-")
+    for entry in entries:
+        pickle.dump(entry, run, protocol=pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+def _read_run(run: IO[bytes]) -> Iterator[_Entry]:
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+def _key_types(entries: List[_Entry]) -> Set[type]:
+    # Keys come from make_sort_key, so only the value half can be incomparable.
+    return {type(entry[0][1]) for entry in entries if entry[0][1] is not None}
+
+def _comparable(types: Set[type]) -> bool:
+    return len(types) <= 1 or all(issubclass(t, (int, float)) for t in types)
+
+def external_sort(
+    items: Iterable[T],
+    key: Callable[[T], SortKey],
+    buffer_size: int,
+    reverse: bool = False,
+) -> Iterator[T]:
+    """
+    Stable sort that spills sorted runs of ``buffer_size`` items to temporary
+    files and lazily k-way merges them, so memory stays O(buffer_size).
+
+    Inputs that fit in the buffer are sorted in memory without touching disk.
+    When keys are not comparable, items are yielded in input order instead.
+    """
+    runs: List[IO[bytes]] = []
+    key_types: Set[type] = set()
+    sortable = True
+    buffer: List[_Entry] = []
+    first_key = itemgetter(0)
+
+    def flush() -> None:
+        nonlocal sortable
+        if sortable:
+            try:
+                buffer.sort(key=first_key, reverse=reverse)
+            except TypeError:
+                sortable = False
+                logger.warning("Sort keys are not comparable; keeping input order")
+        key_types.update(_key_types(buffer))
+        runs.append(_spill(buffer))
+        buffer.clear()
+
+    try:
+        for seq, item in enumerate(items):
+            buffer.append((key(item), seq, item))
+            if len(buffer) >= buffer_size:
+                flush()
+
+        if not runs:
+            try:
+                buffer.sort(key=first_key, reverse=reverse)
+            except TypeError:
+                logger.warning("Sort keys are not comparable; keeping input order")
+                # A failed sort leaves the list partially reordered
+                buffer.sort(key=itemgetter(1))
+            for entry in buffer:
+                yield entry[2]
+            return
+
+        if buffer:
+            flush()
+        logger.info("External sort spilled %d runs of up to %d listings", len(runs), buffer_size)
+
+        if sortable and not _comparable(key_types):
+            logger.warning("Sort keys are not comparable; keeping input order")
+            sortable = False
+
+        if sortable:
+            # heapq.merge breaks ties by run order and runs cover consecutive
+            # input ranges, so the merge is stable like sorted().
+            for entry in heapq.merge(*(_read_run(run) for run in runs), key=first_key, reverse=reverse):
+                yield entry[2]
+        else:
+            # Each run holds one contiguous input range, so restoring the
+            # sequence order run by run reproduces the original order.
+            for run in runs:
+                for entry in sorted(_read_run(run), key=itemgetter(1)):
+                    yield entry[2]
+    finally:
+        for run in runs:
+            run.close()
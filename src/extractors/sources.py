@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import glob
+import gzip
+import io
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, Iterator, List, Sequence
+
+from .utils import get_logger, iter_json_stream
+
+try:  # zstandard is optional; only .zst inputs need it
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None  # type: ignore[assignment]
+
+try:  # orjson is optional; it decodes a memory-mapped file without copying it
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None  # type: ignore[assignment]
+
+logger = get_logger("sources")
+
+RECORD_SUFFIXES = (".json", ".ndjson", ".jsonl")
+
+COMPRESSION_SUFFIXES = (".gz", ".zst")
+
+# Uncompressed files at least this large are memory-mapped instead of read
+MMAP_THRESHOLD = 64 << 20
+
+_GLOB_CHARS = ("*", "?", "[")
+
+_WHITESPACE = b" \t\r\n"
+
+def _is_input_file(name: str) -> bool:
+    for suffix in COMPRESSION_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            break
+    return name.endswith(RECORD_SUFFIXES)
+
+def expand_inputs(specs: Sequence[str]) -> List[str]:
+    """
+    Resolve input arguments to files: plain paths, glob patterns (``**``
+    recurses) and directories, which contribute every JSON/NDJSON file
+    below them, optionally .gz or .zst compressed. Globs and directories
+    expand in sorted order, and a file named twice is only read once.
+    """
+    paths: List[str] = []
+    seen = set()
+    for spec in specs:
+        if os.path.isdir(spec):
+            found = []
+            for root, dirs, files in os.walk(spec):
+                dirs.sort()
+                found.extend(os.path.join(root, name) for name in sorted(files) if _is_input_file(name))
+            if not found:
+                raise FileNotFoundError(f"No JSON input files in directory {spec}")
+        elif not os.path.exists(spec) and any(char in spec for char in _GLOB_CHARS):
+            found = sorted(path for path in glob.glob(spec, recursive=True) if os.path.isfile(path))
+            if not found:
+                raise FileNotFoundError(f"No input files match {spec}")
+        elif os.path.isfile(spec):
+            found = [spec]
+        else:
+            raise FileNotFoundError(spec)
+
+        for path in found:
+            key = os.path.realpath(path)
+            if key not in seen:
+                seen.add(key)
+                paths.append(path)
+    return paths
+
+def open_input(path: str) -> IO[str]:
+    """
+    Open an input file as UTF-8 text, decompressing .gz and .zst files.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"Reading {path} needs the zstandard package")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def iter_input_records(paths: Sequence[str], chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Lazily yield the records of every file in order (see iter_json_stream).
+    """
+    for path in paths:
+        with open_input(path) as f:
+            yield from iter_json_stream(f, chunk_size)
+
+def _decode_text(text: str, path: str) -> List[Any]:
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    records = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not records and text.strip():
+        raise ValueError(f"{path}: top-level JSON must be an array of listings or NDJSON")
+    return records
+
+def _load_mapped(path: str) -> List[Any]:
+    loads = orjson.loads if orjson is not None else json.loads
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        start = 0
+        while start < len(mapped) and mapped[start] in _WHITESPACE:
+            start += 1
+        if mapped[start : start + 1] != b"[":
+            # NDJSON: only one line is ever copied out of the mapping
+            return [loads(line) for line in iter(mapped.readline, b"") if line.strip()]
+        if orjson is None:
+            # The stdlib decoder needs a bytes copy of the whole file
+            return json.loads(mapped[:])
+        view = memoryview(mapped)
+        try:
+            return orjson.loads(view)
+        finally:
+            view.release()
+
+def load_records(path: str, mmap_threshold: int = MMAP_THRESHOLD) -> List[Any]:
+    """
+    Load every record of one JSON array or NDJSON file, which may be
+    compressed. Large uncompressed files are memory-mapped rather than read
+    into an intermediate buffer.
+    """
+    if not path.endswith(COMPRESSION_SUFFIXES) and 0 < mmap_threshold <= os.path.getsize(path):
+        records = _load_mapped(path)
+    else:
+        with open_input(path) as f:
+            records = _decode_text(f.read(), path)
+    if not isinstance(records, list):
+        raise ValueError(f"{path}: top-level JSON must be an array of listings or NDJSON")
+    return records
+
+def load_inputs(paths: Sequence[str], workers: int = 1, mmap_threshold: int = MMAP_THRESHOLD) -> List[Any]:
+    """
+    Load and concatenate the records of ``paths`` in order, decoding up to
+    ``workers`` files at a time in separate processes.
+    """
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            batches = list(pool.map(load_records, paths, [mmap_threshold] * len(paths)))
+    else:
+        batches = [load_records(path, mmap_threshold) for path in paths]
+
+    if len(batches) == 1:
+        return batches[0]
+    records: List[Any] = []
+    for batch in batches:
+        records.extend(batch)
+    logger.info("Loaded %d records from %d files", len(records), len(paths))
+    return records
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple
+
+from .expressions import compile_filter, legacy_conditions
+from .filters import iter_filters
+from .listing import as_dict
+from .utils import get_logger
+
+logger = get_logger("store")
+
+# Indexed listing fields and the SQL column holding each of them
+INDEXED_FIELDS = {
+    "price.value": "price",
+    "bedrooms": "bedrooms",
+    "address.zipcode": "zipcode",
+    "address.state": "state",
+    "propertyType": "property_type",
+}
+
+_NUMERIC_COLUMNS = {"price", "bedrooms"}
+
+_SQL_OPERATORS = {"eq": "=", "ne": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+_RANGE_OPERATORS = {"gt", "gte", "lt", "lte"}
+
+# Columns are declared without a type so SQLite never coerces values
+# (a zipcode stored as 13203 must not start matching "13203").
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    zpid INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    price,
+    bedrooms,
+    zipcode,
+    state,
+    property_type,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+CREATE INDEX IF NOT EXISTS idx_listings_bedrooms ON listings (bedrooms);
+CREATE INDEX IF NOT EXISTS idx_listings_zipcode ON listings (zipcode);
+CREATE INDEX IF NOT EXISTS idx_listings_state ON listings (state);
+CREATE INDEX IF NOT EXISTS idx_listings_property_type ON listings (property_type);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_UPSERT = """
+INSERT INTO listings (zpid, seq, price, bedrooms, zipcode, state, property_type, body)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (zpid) DO UPDATE SET
+    price = excluded.price,
+    bedrooms = excluded.bedrooms,
+    zipcode = excluded.zipcode,
+    state = excluded.state,
+    property_type = excluded.property_type,
+    body = excluded.body
+"""
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _sortable_type(column: str, value: Any) -> bool:
+    if value is None:
+        return True
+    return _is_number(value) if column in _NUMERIC_COLUMNS else isinstance(value, str)
+
+def _clause_sql(clause: Mapping[str, Any]) -> Optional[Tuple[str, List[Any]]]:
+    """
+    Translate a filter clause on an indexed field into SQL, or return None
+    when SQLite's semantics could differ from the Python predicate.
+    """
+    column = INDEXED_FIELDS.get(clause.get("field"))  # type: ignore[arg-type]
+    if column is None:
+        return None
+    ops = {k: v for k, v in clause.items() if k != "field"}
+    if not ops.get("exists", True):
+        return f"{column} IS NULL", []
+
+    numeric = column in _NUMERIC_COLUMNS
+    parts = [f"{column} IS NOT NULL"]
+    params: List[Any] = []
+    for op, operand in ops.items():
+        if op == "exists":
+            continue
+        if op in ("in", "not_in"):
+            if not isinstance(operand, (list, tuple, set)):
+                return None
+            values = list(operand)
+        elif op in _SQL_OPERATORS:
+            values = [operand]
+        else:
+            return None
+        if not all(_is_number(v) if numeric else isinstance(v, str) for v in values):
+            return None
+
+        if op in ("in", "not_in"):
+            placeholders = ", ".join("?" for _ in values)
+            parts.append(f"{column} {'IN' if op == 'in' else 'NOT IN'} ({placeholders})")
+        elif op in _RANGE_OPERATORS:
+            if not numeric:
+                return None
+            # Python refuses to order numbers against strings; SQLite does not
+            parts.append(f"typeof({column}) IN ('integer', 'real') AND {column} {_SQL_OPERATORS[op]} ?")
+        else:
+            parts.append(f"{column} {_SQL_OPERATORS[op]} ?")
+        params.extend(values)
+    return " AND ".join(parts), params
+
+class ListingStore:
+    """
+    SQLite file of normalized listings keyed by zpid.
+
+    price.value, bedrooms, address.zipcode, address.state and propertyType
+    are copied into indexed columns so filter queries can be answered
+    without reparsing the raw input. Listings keep their load order, which
+    reproduces apply_filters' stable ordering of ties.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "ListingStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def load(self, listings: Iterable[Dict[str, Any]], batch_size: int = 5000) -> int:
+        """
+        Replace the store contents with ``listings``; a repeated zpid keeps
+        its first position and the most recent data.
+        """
+        unsortable: Set[str] = set()
+
+        def rows() -> Iterator[Tuple[Any, ...]]:
+            for seq, listing in enumerate(listings):
+                address = listing.get("address") or {}
+                values = {
+                    "price": (listing.get("price") or {}).get("value"),
+                    "bedrooms": listing.get("bedrooms"),
+                    "zipcode": address.get("zipcode"),
+                    "state": address.get("state"),
+                    "property_type": listing.get("propertyType"),
+                }
+                for column, value in values.items():
+                    if not _sortable_type(column, value):
+                        unsortable.add(column)
+                yield (listing["zpid"], seq, *values.values(), json.dumps(as_dict(listing), separators=(",", ":")))
+
+        count = 0
+        with self._conn:
+            self._conn.execute("DELETE FROM listings")
+            source = rows()
+            while True:
+                batch = list(islice(source, batch_size))
+                if not batch:
+                    break
+                self._conn.executemany(_UPSERT, batch)
+                count += len(batch)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('unsortable_columns', ?)",
+                (json.dumps(sorted(unsortable)),),
+            )
+        logger.info("Stored %d listings in %s", count, self.path)
+        return count
+
+    def _unsortable_columns(self) -> Set[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'unsortable_columns'").fetchone()
+        return set(json.loads(row[0])) if row else set()
+
+    def query(
+        self,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        min_bedrooms: Optional[int] = None,
+        where: Optional[Sequence[Mapping[str, Any]]] = None,
+        sort_by: Optional[str] = "price.value",
+        order: str = "asc",
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Answer an apply_filters query from the indexes.
+
+        Clauses on indexed fields become SQL predicates; the rest run in
+        Python on the rows SQLite returns. Sorting and limiting happen in
+        SQL when the sort key is an indexed column with uniformly typed values.
+        """
+        conditions = legacy_conditions(min_price, max_price, min_bedrooms) + list(where or [])
+        sql_parts: List[str] = []
+        params: List[Any] = []
+        residual: List[Mapping[str, Any]] = []
+        for clause in conditions:
+            translated = _clause_sql(clause)
+            if translated is None:
+                residual.append(clause)
+            else:
+                sql_parts.append(translated[0])
+                params.extend(translated[1])
+
+        sort_column = INDEXED_FIELDS.get(sort_by) if sort_by else None
+        if sort_column in self._unsortable_columns():
+            sort_column = None
+        descending = order.lower() == "desc"
+
+        sql = "SELECT body FROM listings"
+        if sql_parts:
+            sql += " WHERE " + " AND ".join(f"({part})" for part in sql_parts)
+        if sort_column:
+            # Matches sorted(..., reverse=...) on (is_none, value) keys: missing
+            # values last when ascending, first when descending, ties by load order.
+            direction = "DESC" if descending else "ASC"
+            sql += f" ORDER BY ({sort_column} IS NULL) {direction}, {sort_column} {direction}, seq"
+        else:
+            sql += " ORDER BY seq"
+
+        sql_sorted = bool(sort_column) or not sort_by
+        has_limit = limit is not None and limit > 0
+        if sql_sorted and has_limit and not residual:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        rows = (json.loads(body) for (body,) in self._conn.execute(sql, params))
+        if not sql_sorted:
+            # Sort key has no usable index: let apply_filters' machinery do it
+            return list(iter_filters(rows, where=residual, sort_by=sort_by, order=order, limit=limit))
+
+        if residual:
+            rows = filter(compile_filter(residual), rows)
+        return list(islice(rows, limit) if has_limit else rows)
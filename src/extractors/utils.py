@@ -1,12 +1,15 @@
-thonfrom __future__ import annotations
+from __future__ import annotations
 
 import json
 import logging
 import os
-from typing import Any, Dict, List, Union
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 
 _LOGGING_CONFIGURED = False
 
+_ARRAY_DELIMITER = re.compile(r"\s*([,\]])")
+
 def _configure_logging() -> None:
     global _LOGGING_CONFIGURED
     if _LOGGING_CONFIGURED:
@@ -21,16 +24,206 @@ def get_logger(name: str) -> logging.Logger:
     _configure_logging()
     return logging.getLogger(name)
 
+def compile_path(path: str) -> Tuple[str, ...]:
+    """
+    Split a dotted path such as ``price.value`` once for repeated lookups.
+    """
+    return tuple(path.split("."))
+
+def get_path_value(data: Any, parts: Tuple[str, ...]) -> Any:
+    current = data
+    for part in parts:
+        # Plain dicts skip the much slower ABC check
+        if type(current) is not dict and not isinstance(current, Mapping):
+            return None
+        current = current.get(part)
+    return current
+
 def load_json_file(path: str) -> Union[Dict[str, Any], List[Any]]:
     if not os.path.exists(path):
         raise FileNotFoundError(path)
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def _ensure_parent_dir(path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+def _iter_json_array(f: Any, chunk_size: int, base: Optional[int] = None) -> Iterator[Any]:
+    """
+    Yield the items of a JSON array whose opening bracket was consumed.
+
+    With ``base``, the stream offset of the first character ``f`` returns,
+    each item is yielded as ``(item, offset, text)`` with its source text.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    first = True
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos < len(buf):
+            if buf[pos] in ",]":
+                if buf[pos] == "]" and first:
+                    return
+                # A leading comma, or a second one, or one before "]"
+                raise json.JSONDecodeError("Expecting value", buf, pos)
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A value is only complete once the following delimiter has
+                # been read; "12" at the buffer edge may really be "1234".
+                match = _ARRAY_DELIMITER.match(buf, end)
+                if match:
+                    yield item if base is None else (item, base + pos, buf[pos:end])
+                    if match.group(1) == "]":
+                        return
+                    pos = match.end()
+                    first = False
+                    continue
+                if eof or buf.find(",", end) != -1 or buf.find("]", end) != -1:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, end)
+        elif eof:
+            raise json.JSONDecodeError("Unterminated JSON array", buf, pos)
+
+        # While a record stays incomplete, read as much again as is buffered:
+        # a record spanning many chunks is decoded O(log n) times, not once
+        # per chunk
+        chunk = f.read(max(chunk_size, len(buf) - pos))
+        if not chunk:
+            eof = True
+        if base is not None:
+            base += pos
+        buf = buf[pos:] + chunk
+        pos = 0
+
+class _PrefixedReader:
+    """Re-expose already consumed text ahead of the rest of a file."""
+
+    def __init__(self, prefix: str, f: Any) -> None:
+        self._prefix = prefix
+        self._f = f
+
+    def read(self, size: int) -> str:
+        if self._prefix:
+            data, self._prefix = self._prefix, ""
+            return data
+        return self._f.read(size)
+
+def _iter_ndjson(f: Any, head: str, chunk_size: int) -> Iterator[Any]:
+    pending = head
+    while True:
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+    if pending.strip():
+        yield json.loads(pending)
+
+def iter_json_stream(f: Any, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Lazily yield records from an open text stream holding a top-level JSON
+    array or NDJSON.
+    """
+    head = f.read(chunk_size)
+    stripped = head.lstrip()
+    if stripped.startswith("["):
+        yield from _iter_json_array(_PrefixedReader(stripped[1:], f), chunk_size)
+    else:
+        yield from _iter_ndjson(f, head, chunk_size)
+
+def iter_json_records(path: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Lazily yield records from a top-level JSON array or an NDJSON file.
+
+    Only the current record and a read buffer are held in memory at a time.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_json_stream(f, chunk_size)
+
+def iter_json_spans(path: str, chunk_size: int = 1 << 16) -> Iterator[Tuple[Any, int, int]]:
+    """
+    Like iter_json_records for an uncompressed file, but yield each record
+    with its byte offset and length in the file.
+    """
+    # Read as latin-1, one character per byte, so text offsets are byte
+    # offsets; records with other characters are decoded again as UTF-8
+    with open(path, "r", encoding="latin-1", newline="") as f:
+        head = f.read(chunk_size)
+        stripped = head.lstrip()
+        if stripped.startswith("["):
+            base = len(head) - len(stripped) + 1
+            for item, offset, text in _iter_json_array(_PrefixedReader(stripped[1:], f), chunk_size, base):
+                if not text.isascii():
+                    item = json.loads(text.encode("latin-1"))
+                yield item, offset, len(text)
+            return
+
+    offset = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line), offset, len(line)
+            offset += len(line)
+
+def format_record(record: Any, pretty: bool) -> str:
+    """
+    One record as it appears inside a JSON array written by save_json_file.
+    """
+    if pretty:
+        # Indent one level so the output matches json.dump(list, indent=4)
+        return "    " + json.dumps(record, indent=4).replace("\n", "\n    ")
+    return json.dumps(record, separators=(",", ":"))
+
+def write_json_records(
+    path: str,
+    records: Iterable[Any],
+    pretty: bool = True,
+    ndjson: bool = False,
+) -> int:
+    """
+    Write records incrementally as a JSON array (or NDJSON) and return the count.
+
+    The JSON array output is byte-identical to save_json_file for the same data.
+    """
+    _ensure_parent_dir(path)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if ndjson:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")))
+                f.write("\n")
+                count += 1
+            return count
+
+        separator = ",\n" if pretty else ","
+        for record in records:
+            f.write(("[\n" if pretty else "[") if count == 0 else separator)
+            f.write(format_record(record, pretty))
+            count += 1
+        if count == 0:
+            f.write("[]")
+        else:
+            f.write("\n]" if pretty else "]")
+    return count
+
 def save_json_file(path: str, data: Any, pretty: bool = True) -> None:
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _ensure_parent_dir(path)
     with open(path, "w", encoding="utf-8") as f:
         if pretty:
             json.dump(data, f, indent=4, sort_keys=False)
         else:
-            json.dump(data, f, separators=(",", ":"))
\ No newline at end of file
+            json.dump(data, f, separators=(",", ":"))
@@ -1,8 +1,9 @@
-thonimport json
+import json
 import logging
 import os
 import sys
-from typing import Any, Dict, List, Optional
+from contextlib import nullcontext
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
 import click
 
@@ -11,11 +12,36 @@ CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 if CURRENT_DIR not in sys.path:
     sys.path.insert(0, CURRENT_DIR)
 
-from extractors.property_parser import parse_property_listings  # type: ignore  # noqa: E402
-from extractors.filters import apply_filters  # type: ignore  # noqa: E402
-from extractors.utils import get_logger, load_json_file, save_json_file  # type: ignore  # noqa: E402
-from transformers.field_mapper import map_fields  # type: ignore  # noqa: E402
-from transformers.data_cleanser import clean_record  # type: ignore  # noqa: E402
+from extractors.dead_letter import DeadLetterWriter  # type: ignore  # noqa: E402
+from extractors.dedupe import dedupe_listings  # type: ignore  # noqa: E402
+from extractors.property_parser import (  # type: ignore  # noqa: E402
+    iter_property_listings,
+    log_shape_cache_stats,
+    log_skipped,
+    parse_property_listings,
+    projection_for,
+)
+from extractors.fetcher import iter_fetched_listings, parse_search  # type: ignore  # noqa: E402
+from extractors.lazy_sections import deferrable_sections, iter_spans, materialize_sections  # type: ignore  # noqa: E402
+from extractors.sources import COMPRESSION_SUFFIXES, expand_inputs, iter_input_records, load_inputs  # type: ignore  # noqa: E402
+from extractors.filters import apply_filters, iter_filters  # type: ignore  # noqa: E402
+from extractors.store import ListingStore  # type: ignore  # noqa: E402
+from extractors.utils import (  # type: ignore  # noqa: E402
+    get_logger,
+    load_json_file,
+    save_json_file,
+)
+from extractors.writers import partition_directory, write_records  # type: ignore  # noqa: E402
+from transformers.aggregator import Aggregator  # type: ignore  # noqa: E402
+from transformers.field_mapper import iter_mapped_fields, map_fields  # type: ignore  # noqa: E402
+from transformers.data_cleanser import clean_records, iter_clean_records  # type: ignore  # noqa: E402
+from transformers.exporter import ColumnarExporter  # type: ignore  # noqa: E402
+from pipeline.checkpoint import CheckpointError, input_signature, run_checkpointed_pipeline  # type: ignore  # noqa: E402
+from pipeline.incremental import IncrementalState, run_incremental_pipeline  # type: ignore  # noqa: E402
+from pipeline.metrics import Profiler, RunMetrics  # type: ignore  # noqa: E402
+from pipeline.parallel import run_sharded_pipeline  # type: ignore  # noqa: E402
+from pipeline.profiles import Profile, load_profiles, profile_output_path, run_profiles  # type: ignore  # noqa: E402
+from pipeline.server import QueryService, serve  # type: ignore  # noqa: E402
 
 logger = get_logger("zillow_explorer")
 
@@ -41,50 +67,424 @@ def load_settings() -> Dict[str, Any]:
             },
         }
 
+def _filter_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    filters_cfg = settings.get("filters", {})
+    return {
+        "min_price": filters_cfg.get("min_price"),
+        "max_price": filters_cfg.get("max_price"),
+        "min_bedrooms": filters_cfg.get("min_bedrooms"),
+        "where": filters_cfg.get("where") or [],
+        "sort_by": filters_cfg.get("sort_by", "price.value"),
+        "order": filters_cfg.get("order", "asc"),
+        "limit": filters_cfg.get("limit"),
+        "sort_buffer_size": filters_cfg.get("sort_buffer_size"),
+        "columnar": bool(filters_cfg.get("columnar", False)),
+    }
+
+def _transform_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    transform_cfg = settings.get("transform", {})
+    return {
+        "field_mapping": transform_cfg.get("field_mapping") or {},
+        "include_fields": transform_cfg.get("include_fields") or [],
+        "strip_empty": bool(transform_cfg.get("strip_empty", True)),
+    }
+
+def _source_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    source_cfg = settings.get("source", {})
+    return {
+        "base_url": source_cfg.get("base_url") or "",
+        "endpoints": source_cfg.get("endpoints") or {},
+        "concurrency": int(source_cfg.get("concurrency", 16)),
+        "per_host": int(source_cfg.get("per_host", 4)),
+        "rate": source_cfg.get("rate", 5.0),
+        "burst": source_cfg.get("burst"),
+        "retries": int(source_cfg.get("retries", 3)),
+        "backoff": float(source_cfg.get("backoff", 0.5)),
+        "timeout": float(source_cfg.get("timeout", 30.0)),
+        "cache_dir": source_cfg.get("cache_dir"),
+        "cache_ttl": source_cfg.get("cache_ttl"),
+    }
+
+def _server_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    server_cfg = settings.get("server", {})
+    return {
+        "cache_size": int(server_cfg.get("cache_size", 256)),
+        "reload_interval": float(server_cfg.get("reload_interval", 2.0)),
+        "columnar": bool(server_cfg.get("columnar", True)),
+    }
+
+def _aggregate_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    aggregate_cfg = settings.get("aggregate", {})
+    options: Dict[str, Any] = {"relative_accuracy": float(aggregate_cfg.get("relative_accuracy", 0.01))}
+    if aggregate_cfg.get("group_by"):
+        options["group_by"] = list(aggregate_cfg["group_by"])
+    if aggregate_cfg.get("quantiles"):
+        options["quantiles"] = [float(q) for q in aggregate_cfg["quantiles"]]
+    return options
+
+def _output_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    output_cfg = settings.get("output", {})
+    return {
+        "partition_by": output_cfg.get("partition_by") or None,
+        "writer_threads": int(output_cfg.get("writer_threads", 4)),
+        "max_open_files": int(output_cfg.get("max_open_files", 64)),
+    }
+
+def _output_target(output_path: str, settings: Dict[str, Any]) -> str:
+    return partition_directory(output_path) if _output_options(settings)["partition_by"] else output_path
+
+def _export_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    export_cfg = settings.get("export", {})
+    return {
+        "path": export_cfg.get("path") or None,
+        "row_group_size": int(export_cfg.get("row_group_size", 50000)),
+    }
+
+def _exporter(settings: Dict[str, Any]) -> Optional[ColumnarExporter]:
+    options = _export_options(settings)
+    if not options["path"]:
+        return None
+    return ColumnarExporter(options["path"], row_group_size=options["row_group_size"])
+
+def _checkpoint_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    checkpoint_cfg = settings.get("checkpoint", {})
+    return {"chunk_size": int(checkpoint_cfg.get("chunk_size", 50000))}
+
+def _dedupe_options(settings: Dict[str, Any]) -> Dict[str, Any]:
+    dedupe_cfg = settings.get("dedupe", {})
+    return {
+        "keep": dedupe_cfg.get("keep", "freshest"),
+        "membership": dedupe_cfg.get("membership", "exact"),
+        "error_rate": float(dedupe_cfg.get("bloom_error_rate", 0.001)),
+    }
+
+def _read_paths(settings: Dict[str, Any], aggregator: Optional[Aggregator] = None) -> List[str]:
+    """
+    Paths the filters, sort key and aggregator read before the transform.
+    """
+    options = _filter_options(settings)
+    paths = ["price.value"]
+    if aggregator is not None:
+        paths.extend(aggregator.paths)
+    if options["min_bedrooms"] is not None:
+        paths.append("bedrooms")
+    paths.extend(clause.get("field") or "" for clause in options["where"])
+    if options["sort_by"]:
+        paths.append(options["sort_by"])
+    return paths
+
+def _required_fields(settings: Dict[str, Any], aggregator: Optional[Aggregator] = None) -> Optional[FrozenSet[str]]:
+    """
+    Top-level sections the filters, sort key, include_fields and the
+    aggregator will read, or None when every section is needed.
+    """
+    include_fields = _transform_options(settings)["include_fields"]
+    if not include_fields:
+        return None
+    return projection_for(list(include_fields) + _read_paths(settings, aggregator))
+
+def _transform_stage(
+    filtered: List[Dict[str, Any]],
+    settings: Dict[str, Any],
+    metrics: RunMetrics,
+) -> List[Dict[str, Any]]:
+    transform_options = _transform_options(settings)
+    with metrics.stage("map", len(filtered)) as stage:
+        mapped = map_fields(
+            filtered,
+            field_mapping=transform_options["field_mapping"],
+            include_fields=transform_options["include_fields"],
+        )
+        stage.records_out = len(mapped)
+
+    with metrics.stage("clean", len(mapped)) as stage:
+        cleaned = clean_records(mapped, strip_empty=transform_options["strip_empty"])
+        stage.records_out = len(cleaned)
+    logger.info("Cleaned %d listings", len(cleaned))
+    return cleaned
+
+def _dedupe_stage(
+    normalized: List[Dict[str, Any]],
+    settings: Dict[str, Any],
+    metrics: RunMetrics,
+) -> List[Dict[str, Any]]:
+    with metrics.stage("dedupe", len(normalized)) as stage:
+        deduped = dedupe_listings(normalized, **_dedupe_options(settings))
+        stage.records_out = len(deduped)
+    return deduped  # type: ignore[return-value]
+
 def build_pipeline(
     raw_listings: List[Dict[str, Any]],
     settings: Dict[str, Any],
+    workers: int = 1,
+    store: Optional[ListingStore] = None,
+    metrics: Optional[RunMetrics] = None,
+    dead_letter: Optional[DeadLetterWriter] = None,
+    aggregator: Optional[Aggregator] = None,
+    dedupe: bool = False,
 ) -> List[Dict[str, Any]]:
     logger.info("Starting pipeline for %d raw listings", len(raw_listings))
+    metrics = metrics if metrics is not None else RunMetrics()
+
+    # Duplicates can span shards, so deduplication needs the sequential path
+    if workers > 1 and store is None and not dedupe:
+        with metrics.stage("sharded", len(raw_listings)) as stage:
+            cleaned = run_sharded_pipeline(
+                raw_listings,
+                _filter_options(settings),
+                _transform_options(settings),
+                workers=workers,
+                fields=_required_fields(settings, aggregator),
+                skipped=metrics.counters,
+                dead_letter=dead_letter,
+                aggregator=aggregator,
+            )
+            stage.records_out = len(cleaned)
+        logger.info("Cleaned %d listings", len(cleaned))
+        return cleaned
 
-    normalized = parse_property_listings(raw_listings)
+    # The store must hold complete listings for later queries
+    fields = _required_fields(settings, aggregator) if store is None else None
+    with metrics.stage("parse", len(raw_listings)) as stage:
+        normalized = parse_property_listings(
+            raw_listings,
+            fields=fields,
+            compact=True,
+            skipped=metrics.counters,
+            dead_letter=dead_letter,
+        )
+        stage.records_out = len(normalized)
     logger.info("Parsed %d normalized listings", len(normalized))
+    if dedupe:
+        normalized = _dedupe_stage(normalized, settings, metrics)
+    if aggregator is not None:
+        with metrics.stage("aggregate", len(normalized)) as stage:
+            stage.records_out = aggregator.update(normalized)
+    if store is not None:
+        with metrics.stage("store", len(normalized)) as stage:
+            stage.records_out = store.load(normalized)
 
-    filters_cfg = settings.get("filters", {})
-    filtered = apply_filters(
-        normalized,
-        min_price=filters_cfg.get("min_price"),
-        max_price=filters_cfg.get("max_price"),
-        min_bedrooms=filters_cfg.get("min_bedrooms"),
-        sort_by=filters_cfg.get("sort_by", "price.value"),
-        order=filters_cfg.get("order", "asc"),
-        limit=filters_cfg.get("limit"),
+    with metrics.stage("filter", len(normalized)) as stage:
+        filtered = apply_filters(normalized, **_filter_options(settings))
+        stage.records_out = len(filtered)
+    logger.info("After filtering, %d listings remain", len(filtered))
+    return _transform_stage(filtered, settings, metrics)
+
+def build_lazy_pipeline(
+    input_paths: List[str],
+    settings: Dict[str, Any],
+    metrics: Optional[RunMetrics] = None,
+    dead_letter: Optional[DeadLetterWriter] = None,
+    aggregator: Optional[Aggregator] = None,
+) -> List[Dict[str, Any]]:
+    """
+    build_pipeline over uncompressed input files that leaves the heavy
+    sections (see LAZY_SECTIONS) nothing reads before the transform in the
+    files. Listings hold the byte range of their raw record instead, and
+    only the listings that survive filtering are read again to normalize
+    those sections. Raw records are dropped as soon as they are parsed.
+    This bounds memory, not time: the first pass still decodes each raw
+    record in full.
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    deferred = deferrable_sections(
+        _required_fields(settings, aggregator),
+        projection_for(_read_paths(settings, aggregator)),
     )
+    logger.info("Deferring sections: %s", ", ".join(sorted(deferred)) or "none")
+
+    spans = iter_spans(input_paths)
+    with metrics.stage("parse") as stage:
+        normalized = parse_property_listings(
+            spans if deferred else (record for record, _ in spans),
+            fields=_required_fields(settings, aggregator),
+            compact=True,
+            skipped=metrics.counters,
+            dead_letter=dead_letter,
+            deferred=deferred,
+        )
+        stage.records_out = len(normalized)
+    logger.info("Parsed %d normalized listings", len(normalized))
+    if aggregator is not None:
+        with metrics.stage("aggregate", len(normalized)) as stage:
+            stage.records_out = aggregator.update(normalized)
+
+    with metrics.stage("filter", len(normalized)) as stage:
+        filtered = apply_filters(normalized, **_filter_options(settings))
+        stage.records_out = len(filtered)
     logger.info("After filtering, %d listings remain", len(filtered))
+    del normalized
+    with metrics.stage("materialize", len(filtered)) as stage:
+        filtered = materialize_sections(filtered)
+        stage.records_out = len(filtered)
+    return _transform_stage(filtered, settings, metrics)
 
-    transform_cfg = settings.get("transform", {})
-    mapped = map_fields(
-        filtered,
-        field_mapping=transform_cfg.get("field_mapping") or {},
-        include_fields=transform_cfg.get("include_fields") or [],
+def query_store(
+    store: ListingStore,
+    settings: Dict[str, Any],
+    metrics: Optional[RunMetrics] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run the filter and transform stages against a populated listing store.
+    """
+    metrics = metrics if metrics is not None else RunMetrics()
+    options = _filter_options(settings)
+    with metrics.stage("query") as stage:
+        filtered = store.query(
+            min_price=options["min_price"],
+            max_price=options["max_price"],
+            min_bedrooms=options["min_bedrooms"],
+            where=options["where"],
+            sort_by=options["sort_by"],
+            order=options["order"],
+            limit=options["limit"],
+        )
+        stage.records_out = len(filtered)
+    logger.info("Store query returned %d listings", len(filtered))
+    return _transform_stage(filtered, settings, metrics)
+
+def stream_pipeline(
+    raw_listings: Iterable[Any],
+    settings: Dict[str, Any],
+    metrics: Optional[RunMetrics] = None,
+    dead_letter: Optional[DeadLetterWriter] = None,
+    aggregator: Optional[Aggregator] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazy variant of build_pipeline where every stage is a generator.
+
+    Memory stays flat unless sorting is enabled, in which case only the
+    listings that pass the filters are buffered. With ``metrics`` every
+    stage is timed per record, which costs a little throughput. The
+    ``aggregator`` sees every parsed listing, including those read after
+    an unsorted limit is reached.
+    """
+    def tracked(name: str, records: Iterable[Any]) -> Iterable[Any]:
+        return records if metrics is None else metrics.track(name, records)
+
+    transform_options = _transform_options(settings)
+    skipped = metrics.counters if metrics is not None else None
+    raw_listings = tracked("read", raw_listings)
+    normalized = tracked(
+        "parse",
+        iter_property_listings(
+            raw_listings,
+            fields=_required_fields(settings, aggregator),
+            compact=True,
+            skipped=skipped,
+            dead_letter=dead_letter,
+        ),
+    )
+    if aggregator is not None:
+        normalized = aggregator.observe(normalized)
+    filtered = tracked("filter", iter_filters(normalized, **_filter_options(settings)))
+    mapped = tracked(
+        "map",
+        iter_mapped_fields(
+            filtered,
+            field_mapping=transform_options["field_mapping"],
+            include_fields=transform_options["include_fields"],
+        ),
     )
+    cleaned = tracked("clean", iter_clean_records(mapped, strip_empty=transform_options["strip_empty"]))
+    return cleaned if aggregator is None else _drain_after(cleaned, normalized)
 
-    strip_empty = bool(transform_cfg.get("strip_empty", True))
-    cleaned: List[Dict[str, Any]] = []
-    for item in mapped:
-        cleaned_item = clean_record(item, strip_empty=strip_empty)
-        if cleaned_item:
-            cleaned.append(cleaned_item)
+def _drain_after(records: Iterable[Dict[str, Any]], upstream: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    yield from records
+    # A limit without sorting stops pulling early; finish the upstream pass
+    for _ in upstream:
+        pass
 
-    logger.info("Cleaned %d listings", len(cleaned))
-    return cleaned
+def _run_streaming(
+    raw_listings: Iterable[Any],
+    output_path: str,
+    settings: Dict[str, Any],
+    pretty: bool,
+    metrics: Optional[RunMetrics] = None,
+    dead_letter: Optional[DeadLetterWriter] = None,
+    aggregator: Optional[Aggregator] = None,
+) -> None:
+    exporter = _exporter(settings)
+    try:
+        with exporter if exporter is not None else nullcontext():
+            if metrics is None:
+                records = stream_pipeline(raw_listings, settings, dead_letter=dead_letter, aggregator=aggregator)
+                if exporter is not None:
+                    records = exporter.observe(records)
+                count = write_records(output_path, records, pretty=pretty, **_output_options(settings))
+            else:
+                with metrics.stage("write") as stage:
+                    records = stream_pipeline(raw_listings, settings, metrics, dead_letter, aggregator)
+                    if exporter is not None:
+                        records = exporter.observe(records)
+                    count = write_records(output_path, records, pretty=pretty, **_output_options(settings))
+                    stage.records_out = count
+                metrics.finish_tracked(consumer="write")
+    except json.JSONDecodeError as exc:
+        logger.error("Failed to decode input JSON: %s", exc)
+        raise SystemExit(1)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Pipeline execution failed: %s", exc)
+        raise SystemExit(1)
+
+    logger.info("Streamed %d records to %s", count, _output_target(output_path, settings))
+    click.echo(f"Wrote {count} records to {_output_target(output_path, settings)}")
+
+def _write_result(
+    output_path: str,
+    result: List[Dict[str, Any]],
+    pretty: bool,
+    metrics: Optional[RunMetrics] = None,
+    settings: Optional[Dict[str, Any]] = None,
+) -> None:
+    settings = settings if settings is not None else {}
+    logger.info("Writing %d records to %s", len(result), _output_target(output_path, settings))
+    metrics = metrics if metrics is not None else RunMetrics()
+    exporter = _exporter(settings)
+    with metrics.stage("write", len(result)) as stage, exporter if exporter is not None else nullcontext():
+        records = exporter.observe(result) if exporter is not None else result
+        stage.records_out = write_records(output_path, records, pretty=pretty, **_output_options(settings))
+    click.echo(f"Wrote {len(result)} records to {_output_target(output_path, settings)}")
+
+def _delta_path(output_path: str) -> str:
+    base, _ = os.path.splitext(output_path)
+    return f"{base}.delta.json"
+
+def _prometheus_path(metrics_path: str) -> str:
+    base, _ = os.path.splitext(metrics_path)
+    return f"{base}.prom"
+
+def _run_store_query(
+    store_path: Optional[str],
+    output_path: str,
+    settings: Dict[str, Any],
+    pretty: bool,
+    metrics: RunMetrics,
+) -> None:
+    if not store_path or not os.path.exists(store_path):
+        logger.error("--from-store needs an existing --store file: %s", store_path)
+        raise SystemExit(1)
+
+    try:
+        with ListingStore(store_path) as store:
+            result = query_store(store, settings, metrics)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Store query failed: %s", exc)
+        raise SystemExit(1)
+
+    _write_result(output_path, result, pretty, metrics, settings)
 
 @click.command()
 @click.option(
     "--input-file",
+    "--input",
     "-i",
-    default=None,
-    help="Path to JSON file containing raw Zillow-like listing data.",
+    "input_files",
+    multiple=True,
+    help=(
+        "JSON array or NDJSON file of raw Zillow-like listings; also a glob or a directory, "
+        "optionally .gz/.zst compressed. Repeatable; files are read in order."
+    ),
 )
 @click.option(
     "--output-file",
@@ -93,12 +493,154 @@ def build_pipeline(
     help="Path where the normalized JSON output should be written.",
 )
 @click.option(
-    "--pretty",
-    is_flag=True,
+    "--pretty/--compact",
     default=True,
-    help="Pretty-print JSON output.",
+    help="Pretty-print JSON array output, or write it compactly (several times faster).",
+)
+@click.option(
+    "--search",
+    "searches",
+    multiple=True,
+    help="Fetch listings instead of reading --input-file: zpid:<id>, zip:<code> or city:<name>. Repeatable.",
+)
+@click.option(
+    "--serve",
+    "serve_address",
+    default=None,
+    help="Keep the input warm in memory and answer queries over HTTP on host:port or unix:/path/to.sock.",
 )
-def main(input_file: Optional[str], output_file: Optional[str], pretty: bool) -> None:
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Read JSON arrays or NDJSON incrementally and write output as it is produced.",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of worker processes used to parse, map and clean listings.",
+)
+@click.option(
+    "--store",
+    "store_path",
+    default=None,
+    help="SQLite listing store to populate with normalized listings (or to query with --from-store).",
+)
+@click.option(
+    "--from-store",
+    is_flag=True,
+    default=False,
+    help="Answer the query from --store instead of parsing the input file.",
+)
+@click.option(
+    "--incremental",
+    "state_path",
+    default=None,
+    help="State file from previous runs; only new or changed listings are reprocessed and a delta file is written.",
+)
+@click.option(
+    "--profiles",
+    "profiles_path",
+    default=None,
+    help=(
+        "JSON file of named settings profiles; the input is parsed once and each profile writes its output_file "
+        "or <output-dir>/<name>.json. Not available with --stream."
+    ),
+)
+@click.option(
+    "--dedupe",
+    is_flag=True,
+    default=False,
+    help="Merge listings that share a zpid (e.g. overlapping city, ZIP and zpid scrapes) into one.",
+)
+@click.option(
+    "--lazy-sections",
+    is_flag=True,
+    default=False,
+    help=(
+        "Leave photos, price/tax history, resoFacts and attributionInfo in the input files until after filtering. "
+        "Cuts peak memory; every record is still decoded in full once, so run time stays about the same."
+    ),
+)
+@click.option(
+    "--partition-by",
+    default=None,
+    help=(
+        "Write one file per value of this output field (e.g. address.state) into a directory named "
+        "after --output-file, with its suffix: out/listings.json.gz -> out/listings/NY.json.gz."
+    ),
+)
+@click.option(
+    "--export",
+    "export_path",
+    default=None,
+    help=(
+        "Also write the output as flattened, typed columns: .parquet, .arrow or .csv (the fallback without "
+        "pyarrow). Lists such as schools become child tables, e.g. listings.schools.parquet."
+    ),
+)
+@click.option(
+    "--checkpoint",
+    "checkpoint_dir",
+    default=None,
+    help="Commit the run in chunks to this directory so an interrupted run can be continued with --resume.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Continue an interrupted --checkpoint run (default directory: <output-file>.checkpoint).",
+)
+@click.option(
+    "--aggregate",
+    "aggregate_path",
+    default=None,
+    help="Write market statistics grouped by zipcode, city, state and propertyType to this JSON file.",
+)
+@click.option(
+    "--metrics",
+    "metrics_path",
+    default=None,
+    help="Write per-stage metrics as JSON to this path, plus a Prometheus textfile next to it (.prom).",
+)
+@click.option(
+    "--dead-letter",
+    "dead_letter_path",
+    default=None,
+    help="Write malformed input records as NDJSON to this path, with the reason each was skipped.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Profile the run with cProfile and tracemalloc; reports are written next to the output file.",
+)
+def main(
+    input_files: Tuple[str, ...],
+    output_file: Optional[str],
+    pretty: bool,
+    searches: Tuple[str, ...],
+    serve_address: Optional[str],
+    stream: bool,
+    workers: int,
+    store_path: Optional[str],
+    from_store: bool,
+    state_path: Optional[str],
+    profiles_path: Optional[str],
+    dedupe: bool,
+    lazy_sections: bool,
+    partition_by: Optional[str],
+    export_path: Optional[str],
+    checkpoint_dir: Optional[str],
+    resume: bool,
+    aggregate_path: Optional[str],
+    metrics_path: Optional[str],
+    dead_letter_path: Optional[str],
+    profile: bool,
+) -> None:
     """
     Run the Zillow Explorer pipeline on sample or provided input data.
     """
@@ -106,33 +648,368 @@ def main(input_file: Optional[str], output_file: Optional[str], pretty: bool) ->
     default_input = os.path.join(project_root, "data", "inputs.sample.json")
     default_output = os.path.join(project_root, "data", "example_output.json")
 
-    input_path = input_file or default_input
+    input_specs = list(input_files) or [default_input]
     output_path = output_file or default_output
+    if profiles_path and not output_file:
+        # With --profiles the output is a directory of per-profile files
+        output_path = os.path.join(project_root, "data", "profiles")
+    if resume and not checkpoint_dir:
+        checkpoint_dir = f"{output_path}.checkpoint"
 
     logger.info("Loading settings and input data")
     settings = load_settings()
+    if partition_by:
+        settings["output"] = {**settings.get("output", {}), "partition_by": partition_by}
+    if export_path:
+        settings["export"] = {**settings.get("export", {}), "path": export_path}
+    if serve_address:
+        _run_server(input_specs, serve_address, settings)
+        return
+
+    aggregator = Aggregator(**_aggregate_options(settings)) if aggregate_path else None
+    metrics = RunMetrics()
+    profiler = Profiler() if profile else None
+    dead_letter = DeadLetterWriter(dead_letter_path) if dead_letter_path else None
     try:
-        raw_listings = load_json_file(input_path)
-    except FileNotFoundError:
-        logger.error("Input file not found: %s", input_path)
+        with profiler if profiler is not None else nullcontext():
+            _run(
+                input_specs,
+                output_path,
+                settings,
+                pretty,
+                searches,
+                stream,
+                workers,
+                store_path,
+                from_store,
+                state_path,
+                profiles_path,
+                metrics,
+                dead_letter,
+                aggregator,
+                dedupe,
+                lazy_sections,
+                checkpoint_dir,
+                resume,
+                # Per-record stage timing in --stream mode is only worth its
+                # overhead when someone reads the numbers
+                track_stream=bool(metrics_path or profile),
+            )
+        if aggregate_path and aggregator is not None:
+            save_json_file(aggregate_path, aggregator.report(), pretty=True)
+            logger.info("Wrote market statistics to %s", aggregate_path)
+    finally:
+        log_skipped(metrics.counters)
+        log_shape_cache_stats()
+        if dead_letter is not None:
+            dead_letter.close()
+        # Also written for failed runs, which are the ones worth looking at
+        if metrics_path:
+            metrics.write_json(metrics_path)
+            metrics.write_prometheus(_prometheus_path(metrics_path))
+            logger.info("Wrote metrics to %s and %s", metrics_path, _prometheus_path(metrics_path))
+        if profiler is not None:
+            reports = profiler.dump(os.path.splitext(output_path)[0])
+            logger.info("Wrote profile reports: %s", ", ".join(reports))
+
+def _input_paths(input_specs: List[str]) -> List[str]:
+    try:
+        return expand_inputs(input_specs)
+    except FileNotFoundError as exc:
+        logger.error("Input file not found: %s", exc)
+        raise SystemExit(1)
+
+def _run_server(input_specs: List[str], address: str, settings: Dict[str, Any]) -> None:
+    input_paths = _input_paths(input_specs)
+    if len(input_paths) != 1:
+        # Hot-reload watches one file's signature
+        logger.error("--serve needs exactly one input file, got %d", len(input_paths))
+        raise SystemExit(1)
+    try:
+        service = QueryService(
+            input_paths[0],
+            _filter_options(settings),
+            _transform_options(settings),
+            **_server_options(settings),
+        )
+        serve(address, service)
+    except (OSError, ValueError) as exc:
+        logger.error("Could not start the query server: %s", exc)
+        raise SystemExit(1)
+
+def _run_profiles(
+    raw_listings: List[Any],
+    profiles_path: str,
+    output_dir: str,
+    settings: Dict[str, Any],
+    pretty: bool,
+    metrics: RunMetrics,
+    dead_letter: Optional[DeadLetterWriter],
+    aggregator: Optional[Aggregator] = None,
+    dedupe: bool = False,
+) -> None:
+    try:
+        profile_settings = load_profiles(profiles_path, settings)
+    except (OSError, ValueError) as exc:
+        logger.error("Could not load profiles from %s: %s", profiles_path, exc)
+        raise SystemExit(1)
+
+    profiles = [
+        Profile(
+            name,
+            _filter_options(profile),
+            _transform_options(profile),
+            profile_output_path(output_dir, name, profile),
+        )
+        for name, profile in profile_settings.items()
+    ]
+    # Parse only the sections some profile reads; None means all of them
+    required = [_required_fields(profile, aggregator) for profile in profile_settings.values()]
+    fields = None if any(f is None for f in required) else frozenset().union(*required)
+
+    try:
+        with metrics.stage("parse", len(raw_listings)) as stage:
+            normalized = parse_property_listings(
+                raw_listings,
+                fields=fields,
+                compact=True,
+                skipped=metrics.counters,
+                dead_letter=dead_letter,
+            )
+            stage.records_out = len(normalized)
+        logger.info("Parsed %d normalized listings for %d profiles", len(normalized), len(profiles))
+        if dedupe:
+            normalized = _dedupe_stage(normalized, settings, metrics)
+        if aggregator is not None:
+            with metrics.stage("aggregate", len(normalized)) as stage:
+                stage.records_out = aggregator.update(normalized)
+        with metrics.stage("profiles", len(normalized)) as stage:
+            results = run_profiles(normalized, profiles)
+            stage.records_out = sum(len(result) for result in results.values())
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Pipeline execution failed: %s", exc)
+        raise SystemExit(1)
+
+    with metrics.stage("write") as stage:
+        for profile in profiles:
+            save_json_file(profile.output_path, results[profile.name], pretty=pretty)
+        stage.records_out = sum(len(result) for result in results.values())
+    click.echo(f"Wrote {len(profiles)} profiles to {output_dir}")
+
+def _run_lazy(
+    input_paths: List[str],
+    output_path: str,
+    settings: Dict[str, Any],
+    pretty: bool,
+    metrics: RunMetrics,
+    dead_letter: Optional[DeadLetterWriter],
+    aggregator: Optional[Aggregator],
+) -> None:
+    try:
+        result = build_lazy_pipeline(input_paths, settings, metrics, dead_letter, aggregator)
+    except json.JSONDecodeError as exc:
+        logger.error("Failed to decode input JSON: %s", exc)
+        raise SystemExit(1)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Pipeline execution failed: %s", exc)
+        raise SystemExit(1)
+    _write_result(output_path, result, pretty, metrics, settings)
+
+def _run_checkpointed(
+    input_paths: List[str],
+    output_path: str,
+    checkpoint_dir: str,
+    resume: bool,
+    settings: Dict[str, Any],
+    pretty: bool,
+    metrics: RunMetrics,
+    dead_letter: Optional[DeadLetterWriter],
+    aggregator: Optional[Aggregator],
+) -> None:
+    try:
+        with metrics.stage("checkpointed") as stage:
+            count = run_checkpointed_pipeline(
+                iter_input_records(input_paths),
+                _filter_options(settings),
+                _transform_options(settings),
+                output_path,
+                checkpoint_dir,
+                source=input_signature(input_paths),
+                resume=resume,
+                pretty=pretty,
+                fields=_required_fields(settings, aggregator),
+                skipped=metrics.counters,
+                dead_letter=dead_letter,
+                aggregator=aggregator,
+                **_checkpoint_options(settings),
+                **_output_options(settings),
+            )
+            stage.records_out = count
+    except CheckpointError as exc:
+        logger.error("Cannot resume: %s", exc)
         raise SystemExit(1)
     except json.JSONDecodeError as exc:
         logger.error("Failed to decode input JSON: %s", exc)
         raise SystemExit(1)
+    except Exception as exc:  # noqa: BLE001
+        logger.exception("Pipeline execution failed: %s", exc)
+        raise SystemExit(1)
+    click.echo(f"Wrote {count} records to {_output_target(output_path, settings)}")
+
+def _run(
+    input_specs: List[str],
+    output_path: str,
+    settings: Dict[str, Any],
+    pretty: bool,
+    searches: Tuple[str, ...],
+    stream: bool,
+    workers: int,
+    store_path: Optional[str],
+    from_store: bool,
+    state_path: Optional[str],
+    profiles_path: Optional[str],
+    metrics: RunMetrics,
+    dead_letter: Optional[DeadLetterWriter],
+    aggregator: Optional[Aggregator],
+    dedupe: bool,
+    lazy_sections: bool,
+    checkpoint_dir: Optional[str],
+    resume: bool,
+    track_stream: bool,
+) -> None:
+    if from_store:
+        if aggregator is not None:
+            logger.warning("--aggregate is ignored with --from-store")
+        _run_store_query(store_path, output_path, settings, pretty, metrics)
+        return
+    if stream and profiles_path:
+        logger.error("--profiles cannot be combined with --stream")
+        raise SystemExit(1)
+    if stream and (workers > 1 or store_path or dedupe or state_path):
+        logger.warning("--workers, --store, --dedupe and --incremental are ignored in --stream mode")
+
+    source: Optional[Iterator[Any]] = None
+    if searches:
+        source_options = _source_options(settings)
+        if not source_options["base_url"]:
+            logger.error("--search needs source.base_url in settings.json")
+            raise SystemExit(1)
+        try:
+            source = iter_fetched_listings([parse_search(spec) for spec in searches], **source_options)
+        except ValueError as exc:
+            logger.error("%s", exc)
+            raise SystemExit(1)
+
+    if checkpoint_dir:
+        if source is not None or profiles_path or state_path or store_path or dedupe:
+            logger.warning("--checkpoint is ignored with --search, --profiles, --incremental, --store and --dedupe")
+        else:
+            if stream or lazy_sections or workers > 1 or _export_options(settings)["path"]:
+                logger.warning("--stream, --lazy-sections, --workers and --export are ignored with --checkpoint")
+            input_paths = _input_paths(input_specs)
+            _run_checkpointed(input_paths, output_path, checkpoint_dir, resume, settings, pretty, metrics, dead_letter, aggregator)
+            return
 
-    if not isinstance(raw_listings, list):
-        logger.error("Input JSON must be a list of listing objects")
+    if stream:
+        if source is None:
+            source = iter_input_records(_input_paths(input_specs))
+        _run_streaming(
+            source,
+            output_path,
+            settings,
+            pretty,
+            metrics if track_stream else None,
+            dead_letter,
+            aggregator,
+        )
+        return
+
+    input_paths = _input_paths(input_specs) if source is None else []
+    if lazy_sections:
+        if source is not None or profiles_path or state_path or store_path or dedupe:
+            logger.warning("--lazy-sections is ignored with --search, --profiles, --incremental, --store and --dedupe")
+        elif any(path.endswith(COMPRESSION_SUFFIXES) for path in input_paths):
+            logger.warning("--lazy-sections is ignored for compressed input files")
+        else:
+            if workers > 1:
+                logger.warning("--workers is ignored with --lazy-sections")
+            _run_lazy(input_paths, output_path, settings, pretty, metrics, dead_letter, aggregator)
+            return
+
+    state: Optional[IncrementalState] = None
+    digests: Optional[List[str]] = None
+    try:
+        with metrics.stage("read") as stage:
+            if source is not None:
+                raw_listings = list(source)
+            elif state_path and not profiles_path:
+                # Incremental runs hash each record's source bytes as it is read
+                state = IncrementalState(state_path)
+                raw_listings, digests = state.read(input_paths)
+            else:
+                # Several files are decoded in parallel by up to --workers processes
+                raw_listings = load_inputs(input_paths, workers)
+            stage.records_out = len(raw_listings)
+    except json.JSONDecodeError as exc:
+        logger.error("Failed to decode input JSON: %s", exc)
+        raise SystemExit(1)
+    except (OSError, RuntimeError, ValueError) as exc:
+        logger.error("Could not read input: %s", exc)
         raise SystemExit(1)
 
+    if profiles_path:
+        if workers > 1 or store_path or state_path or _export_options(settings)["path"]:
+            logger.warning("--workers, --store, --incremental and --export are ignored with --profiles")
+        _run_profiles(raw_listings, profiles_path, output_path, settings, pretty, metrics, dead_letter, aggregator, dedupe)
+        return
+
+    if state_path:
+        if workers > 1 or store_path or dedupe:
+            logger.warning("--workers, --store and --dedupe are ignored in --incremental mode")
+        try:
+            with state or IncrementalState(state_path) as state, metrics.stage("incremental", len(raw_listings)) as stage:
+                result, delta = run_incremental_pipeline(
+                    raw_listings,
+                    _filter_options(settings),
+                    _transform_options(settings),
+                    state,
+                    skipped=metrics.counters,
+                    dead_letter=dead_letter,
+                    aggregator=aggregator,
+                    digests=digests,
+                    eager=projection_for(_read_paths(settings, aggregator)),
+                )
+                stage.records_out = len(result)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Pipeline execution failed: %s", exc)
+            raise SystemExit(1)
+        save_json_file(_delta_path(output_path), delta, pretty=pretty)
+        logger.info("Wrote delta to %s", _delta_path(output_path))
+        _write_result(output_path, result, pretty, metrics, settings)
+        return
+
+    if dedupe and workers > 1 and not store_path:
+        logger.warning("--workers is ignored with --dedupe, since duplicates can span shards")
+    store = ListingStore(store_path) if store_path else None
     try:
-        result = build_pipeline(raw_listings, settings)
+        result = build_pipeline(
+            raw_listings,
+            settings,
+            workers=workers,
+            store=store,
+            metrics=metrics,
+            dead_letter=dead_letter,
+            aggregator=aggregator,
+            dedupe=dedupe,
+        )
     except Exception as exc:  # noqa: BLE001
         logger.exception("Pipeline execution failed: %s", exc)
         raise SystemExit(1)
+    finally:
+        if store is not None:
+            store.close()
 
-    logger.info("Writing %d records to %s", len(result), output_path)
-    save_json_file(output_path, result, pretty=pretty)
-    click.echo(f"Wrote {len(result)} records to {output_path}")
+    _write_result(output_path, result, pretty, metrics, settings)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import shutil
+from collections import Counter
+from itertools import islice
+from operator import itemgetter
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence
+
+from extractors.dead_letter import RejectSink
+from extractors.property_parser import log_skipped
+from extractors.utils import get_logger
+from extractors.writers import MAX_OPEN_PARTITIONS, RecordWriter, write_records
+from pipeline.incremental import fingerprint
+from pipeline.parallel import process_shard
+from transformers.aggregator import Aggregator
+
+logger = get_logger("checkpoint")
+
+CHECKPOINT_VERSION = 1
+
+_STATE_FILE = "checkpoint.json"
+
+class CheckpointError(ValueError):
+    """A checkpoint that cannot be resumed."""
+
+def input_signature(paths: Sequence[str]) -> List[List[Any]]:
+    """
+    Path, size and modification time of every input file, so a resume can
+    tell that the input is still the one the checkpoint was written for.
+    """
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return signature
+
+def _part_path(directory: str, kind: str, index: int) -> str:
+    return os.path.join(directory, f"{kind}-{index:05d}.ndjson")
+
+def _commit_lines(path: str, records: Iterable[Any]) -> None:
+    with RecordWriter(path, ndjson=True) as writer:
+        writer.write_many(records)
+
+def _read_lines(path: str) -> Iterator[Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+class Checkpoint:
+    """
+    Progress of a checkpointed run, kept in ``directory`` next to the
+    committed output chunks (part-NNNNN.ndjson) and rejects
+    (rejects-NNNNN.ndjson) it refers to.
+
+    A chunk's files are written first and the state file is replaced
+    atomically afterwards, so a crash at any point leaves the state of the
+    last fully committed chunk; files of a later chunk are overwritten when
+    it is processed again.
+    """
+
+    def __init__(self, directory: str, key: str) -> None:
+        self.directory = directory
+        self.key = key
+        self.position = 0
+        self.parts = 0
+        self.taken = 0
+        self.skipped: Counter = Counter()
+        self.aggregator: Optional[Dict[str, Any]] = None
+        self.top: Optional[List[List[Any]]] = None
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.directory, _STATE_FILE)
+
+    def load(self) -> None:
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("version") != CHECKPOINT_VERSION or state.get("key") != self.key:
+            raise CheckpointError(
+                f"{self.directory} was written for a different input or settings; remove it to start over"
+            )
+        self.position = state["position"]
+        self.parts = state["parts"]
+        self.taken = state["taken"]
+        self.skipped = Counter(state["skipped"])
+        self.aggregator = state["aggregator"]
+        self.top = state["top"]
+
+    def save(self) -> None:
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "key": self.key,
+            "position": self.position,
+            "parts": self.parts,
+            "taken": self.taken,
+            "skipped": dict(self.skipped),
+            "aggregator": self.aggregator,
+            "top": self.top,
+        }
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def reset(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def run_checkpointed_pipeline(
+    raw_listings: Iterable[Any],
+    filter_options: Dict[str, Any],
+    transform_options: Dict[str, Any],
+    output_path: str,
+    checkpoint_dir: str,
+    source: Any = None,
+    resume: bool = False,
+    chunk_size: int = 50_000,
+    pretty: bool = True,
+    partition_by: Optional[str] = None,
+    writer_threads: int = 4,
+    max_open_files: int = MAX_OPEN_PARTITIONS,
+    fields: Optional[FrozenSet[str]] = None,
+    skipped: Optional[Counter] = None,
+    dead_letter: Optional[RejectSink] = None,
+    aggregator: Optional[Aggregator] = None,
+) -> int:
+    """
+    Run the pipeline over ``raw_listings`` in chunks of ``chunk_size``,
+    committing each chunk to ``checkpoint_dir`` before starting the next,
+    and write the result to ``output_path``. Returns the records written.
+
+    Each chunk is processed like a shard of the sharded pipeline. Unsorted
+    results are committed as output chunks; sorted ones as sorted runs that
+    are merged at the end, or, with a limit, as the running top ``limit``
+    kept in the checkpoint itself. Skip counts, the aggregator state and
+    rejects (replayed into ``dead_letter`` at the end) are committed with
+    every chunk.
+
+    With ``resume`` the run continues after the last committed chunk of a
+    checkpoint written for the same ``source`` (e.g. input_signature) and
+    settings, and the output is byte-identical to an uninterrupted run.
+    The checkpoint is removed once the output is written.
+    """
+    sort_by = filter_options.get("sort_by") or ""
+    reverse = filter_options.get("order", "asc").lower() == "desc"
+    limit = filter_options.get("limit")
+    limit = limit if limit is not None and limit > 0 else None
+    quarantine = dead_letter is not None
+    key = fingerprint(
+        {
+            "source": source,
+            "filters": filter_options,
+            "transform": transform_options,
+            "fields": sorted(fields) if fields is not None else None,
+            "chunk_size": chunk_size,
+            "quarantine": quarantine,
+            "aggregate": [list(aggregator.group_by), list(aggregator.quantiles), aggregator.relative_accuracy]
+            if aggregator is not None
+            else None,
+        }
+    )
+
+    checkpoint = Checkpoint(checkpoint_dir, key)
+    if resume and os.path.exists(checkpoint.state_path):
+        checkpoint.load()
+        logger.info(
+            "Resuming from %s after %d listings in %d committed chunks",
+            checkpoint_dir,
+            checkpoint.position,
+            checkpoint.parts,
+        )
+    else:
+        if resume:
+            logger.warning("No checkpoint in %s; starting from the beginning", checkpoint_dir)
+        checkpoint.reset()
+
+    source_iter = iter(raw_listings)
+    # The input is read again on resume; skip what was already committed
+    for _ in islice(source_iter, checkpoint.position):
+        pass
+
+    shard_aggregator = aggregator.empty_copy() if aggregator is not None else None
+    while True:
+        chunk = list(islice(source_iter, chunk_size))
+        if not chunk:
+            break
+        keyed, chunk_skipped, rejects, chunk_aggregate = process_shard(
+            (
+                checkpoint.position,
+                chunk,
+                filter_options,
+                transform_options,
+                fields,
+                quarantine,
+                shard_aggregator.empty_copy() if shard_aggregator is not None else None,
+            )
+        )
+
+        if sort_by and limit is not None:
+            top = (checkpoint.top or []) + [[list(key), record] for key, record in keyed]
+            try:
+                top = sorted(top, key=itemgetter(0), reverse=reverse)
+            except TypeError:
+                logger.warning("Failed to sort by %s due to incomparable types", sort_by)
+            checkpoint.top = top[:limit]
+        elif sort_by:
+            _commit_lines(_part_path(checkpoint_dir, "part", checkpoint.parts), ([list(key), record] for key, record in keyed))
+        else:
+            if limit is not None:
+                keyed = keyed[: max(0, limit - checkpoint.taken)]
+                checkpoint.taken += len(keyed)
+            _commit_lines(_part_path(checkpoint_dir, "part", checkpoint.parts), (record for _, record in keyed if record))
+        if quarantine:
+            _commit_lines(_part_path(checkpoint_dir, "rejects", checkpoint.parts), (list(entry) for entry in rejects))
+
+        checkpoint.parts += 1
+        checkpoint.position += len(chunk)
+        checkpoint.skipped.update(chunk_skipped)
+        if chunk_aggregate is not None:
+            merged = Aggregator.from_state(checkpoint.aggregator) if checkpoint.aggregator else chunk_aggregate.empty_copy()
+            checkpoint.aggregator = merged.merge(chunk_aggregate).to_state()
+        checkpoint.save()
+        logger.info("Committed chunk %d (%d listings read)", checkpoint.parts, checkpoint.position)
+
+    # The output is renamed into place once complete, so a failed merge leaves nothing behind
+    output = dict(pretty=pretty, partition_by=partition_by, writer_threads=writer_threads, max_open_files=max_open_files)
+    try:
+        count = write_records(output_path, _results(checkpoint, sort_by, reverse, limit), **output)
+    except TypeError:
+        # Like an in-memory sort of incomparable keys, keep input order
+        logger.warning("Failed to sort by %s due to incomparable types", sort_by)
+        count = write_records(output_path, _results(checkpoint, "", reverse, limit), **output)
+
+    if dead_letter is not None:
+        for index in range(checkpoint.parts):
+            path = _part_path(checkpoint_dir, "rejects", index)
+            if os.path.exists(path):
+                for reason, position, record, error in _read_lines(path):
+                    dead_letter.write(reason, position, record, error)
+    if aggregator is not None and checkpoint.aggregator is not None:
+        aggregator.merge(Aggregator.from_state(checkpoint.aggregator))
+    if skipped is not None:
+        skipped.update(checkpoint.skipped)
+    else:
+        log_skipped(checkpoint.skipped)
+
+    checkpoint.remove()
+    logger.info("Wrote %d records to %s from %d checkpointed chunks", count, output_path, checkpoint.parts)
+    return count
+
+def _results(checkpoint: Checkpoint, sort_by: str, reverse: bool, limit: Optional[int]) -> Iterator[Dict[str, Any]]:
+    if sort_by and limit is not None:
+        yield from (record for _, record in checkpoint.top or [] if record)
+        return
+    parts = [_part_path(checkpoint.directory, "part", index) for index in range(checkpoint.parts)]
+    if not sort_by:
+        for path in parts:
+            for record in _read_lines(path):
+                # Sorted runs hold [key, record] pairs
+                record = record[1] if type(record) is list else record
+                if record:
+                    yield record
+        return
+    # Every run is sorted and runs cover consecutive input ranges; merge
+    # takes ties from earlier runs first, so it is as stable as one sort
+    for _, record in heapq.merge(*(_read_lines(path) for path in parts), key=itemgetter(0), reverse=reverse):
+        if record:
+            yield record
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+from collections import Counter
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from extractors.dead_letter import RejectSink
+from extractors.filters import apply_filters
+from extractors.property_parser import extract_zpid, iter_property_listings, log_skipped, parse_property_listings
+from extractors.sources import COMPRESSION_SUFFIXES, load_records, open_input
+from extractors.utils import get_logger, iter_json_spans, iter_json_stream
+from transformers.aggregator import Aggregator
+from transformers.data_cleanser import clean_record, load_clean_plan
+from transformers.field_mapper import compile_projection
+
+logger = get_logger("incremental")
+
+# Bumped whenever the table layout changes; older state is rebuilt
+STATE_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    zpid INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL,
+    output_key TEXT,
+    output TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    records TEXT NOT NULL
+);
+"""
+
+# Bound parameters per SELECT ... IN (...), below SQLite's oldest limit of 999
+_LOOKUP_BATCH = 500
+
+def fingerprint(value: Any) -> str:
+    """
+    Stable content hash of a JSON-compatible value.
+    """
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+def _file_digest(path: str) -> str:
+    # SHA-256 has hardware support on most CPUs, so whole files hash fastest
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _span_digests(path: str, records: List[Any], digests: List[str]) -> None:
+    if path.endswith(COMPRESSION_SUFFIXES):
+        with open_input(path) as f:
+            for record in iter_json_stream(f):
+                records.append(record)
+                digests.append(fingerprint(record))
+        return
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for record, offset, length in iter_json_spans(path):
+                records.append(record)
+                digests.append(_digest(mapped[offset : offset + length]))
+
+class IncrementalState:
+    """
+    SQLite manifest of the previous run: per-zpid raw content hash and the
+    last cleaned output produced for it, plus the content hash of every
+    input file with the hashes of the records it held.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._files: List[Tuple[str, str, str]] = []
+        self._conn = sqlite3.connect(path)
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != STATE_VERSION:
+            if version:
+                logger.warning("Rebuilding incremental state %s written by an older version", path)
+            with self._conn:
+                self._conn.execute("DROP TABLE IF EXISTS records")
+                self._conn.execute("DROP TABLE IF EXISTS files")
+                self._conn.execute(f"PRAGMA user_version = {STATE_VERSION}")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "IncrementalState":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def read(self, paths: Sequence[str]) -> Tuple[List[Any], List[str]]:
+        """
+        Load the records of ``paths`` in order together with a digest of
+        each, for run_incremental_pipeline.
+
+        A file whose bytes are unchanged since the previous run is decoded
+        in one go and its records keep their recorded digests. Records of
+        other files are hashed from their source bytes, so nothing is
+        serialized again; those of compressed files fall back to
+        fingerprint. A record's digest therefore changes when its file is
+        reformatted or (de)compressed, which makes it count as changed once.
+        """
+        records: List[Any] = []
+        digests: List[str] = []
+        known = dict(
+            ((path, digest), listed) for path, digest, listed in self._conn.execute("SELECT path, digest, records FROM files")
+        )
+        self._files = []
+        for path in paths:
+            file_digest = _file_digest(path)
+            listed = known.get((os.path.abspath(path), file_digest))
+            start = len(records)
+            if listed:
+                records.extend(load_records(path))
+                digests.extend(listed.split(","))
+            if not listed or len(records) != len(digests):
+                del records[start:], digests[start:]
+                _span_digests(path, records, digests)
+            self._files.append((os.path.abspath(path), file_digest, ",".join(digests[start:])))
+        return records, digests
+
+    def hashes(self) -> Dict[int, str]:
+        return dict(self._conn.execute("SELECT zpid, hash FROM records"))
+
+    def output_keys(self) -> Dict[int, str]:
+        return dict(self._conn.execute("SELECT zpid, output_key FROM records WHERE output_key IS NOT NULL"))
+
+    def outputs(self, zpids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        The cached outputs of ``zpids``, looked up in batches.
+        """
+        zpids = list(zpids)
+        found: Dict[int, Dict[str, Any]] = {}
+        for start in range(0, len(zpids), _LOOKUP_BATCH):
+            batch = zpids[start : start + _LOOKUP_BATCH]
+            rows = self._conn.execute(
+                f"SELECT zpid, output FROM records WHERE zpid IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            found.update((zpid, json.loads(output)) for zpid, output in rows if output is not None)
+        return found
+
+    def commit(
+        self,
+        upserts: Sequence[Tuple[int, str]],
+        outputs: Sequence[Tuple[int, str, Dict[str, Any]]],
+        removed: Sequence[int],
+    ) -> None:
+        with self._conn:
+            # Replacing a row also drops the output cached for its old content
+            self._conn.executemany("INSERT OR REPLACE INTO records (zpid, hash) VALUES (?, ?)", upserts)
+            self._conn.executemany(
+                "UPDATE records SET output_key = ?, output = ? WHERE zpid = ?",
+                [(key, _dumps(output), zpid) for zpid, key, output in outputs],
+            )
+            self._conn.executemany("DELETE FROM records WHERE zpid = ?", [(zpid,) for zpid in removed])
+            # Only the files read by this run are kept
+            self._conn.execute("DELETE FROM files")
+            self._conn.executemany("INSERT OR REPLACE INTO files (path, digest, records) VALUES (?, ?, ?)", self._files)
+
+def run_incremental_pipeline(
+    raw_listings: Sequence[Any],
+    filter_options: Dict[str, Any],
+    transform_options: Dict[str, Any],
+    state: IncrementalState,
+    skipped: Optional[Counter[str]] = None,
+    dead_letter: Optional[RejectSink] = None,
+    aggregator: Optional[Aggregator] = None,
+    digests: Optional[Sequence[str]] = None,
+    eager: Optional[FrozenSet[str]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, List[int]]]:
+    """
+    Run the pipeline, fully normalizing and cleaning only listings whose
+    raw content changed since the previous run recorded in ``state``.
+
+    ``digests`` are the content hashes of ``raw_listings`` (see
+    IncrementalState.read); without them every listing is fingerprinted.
+    Unchanged listings normalized fine before, so only their ``eager``
+    sections (see projection_for), those the filters, sort key and
+    ``aggregator`` read, are normalized again; a survivor is only
+    completed when no output is cached for it.
+
+    Filtering and sorting still see every listing, so the result equals a
+    full run. Returns the cleaned records and an added/changed/removed delta
+    of zpids relative to the previous run. Skipped listings are counted
+    by reason in ``skipped`` (or logged once) and written to
+    ``dead_letter`` when given. ``aggregator`` sees every listing, cached
+    or not.
+    """
+    previous = state.hashes()
+    latest: Dict[int, str] = {}
+    # (index, zpid, digest) of every listing with a zpid, and the indices
+    # of those whose content is unchanged
+    entries: List[Tuple[int, Optional[int], str]] = []
+    unchanged: List[int] = []
+    for idx, raw in enumerate(raw_listings):
+        zpid = extract_zpid(raw) if isinstance(raw, dict) else None
+        if zpid is None:
+            entries.append((idx, None, ""))
+            continue
+        digest = digests[idx] if digests is not None else fingerprint(raw)
+        latest[zpid] = digest
+        entries.append((idx, zpid, digest))
+        if eager is not None and previous.get(zpid) == digest:
+            unchanged.append(idx)
+
+    # Invariant: an unchanged listing was stored because it normalized
+    # without being skipped, and a projection skips the same records as a
+    # full parse, so one pass over just them yields one listing each
+    counts: Counter[str] = Counter()
+    batch = parse_property_listings([raw_listings[idx] for idx in unchanged], fields=eager, skipped=counts)
+    eager_indices = unchanged
+    if len(batch) != len(unchanged):
+        # The state was written by a parser that accepted more records:
+        # normalize these one by one like changed listings instead
+        logger.warning(
+            "%d of %d unchanged listings no longer parse; normalizing them in full",
+            len(unchanged) - len(batch),
+            len(unchanged),
+        )
+        counts.clear()
+        batch, eager_indices = [], []
+    partial = iter(batch)
+    normalized: List[Dict[str, Any]] = []
+    # id(listing) -> (index, digest, whether every section was normalized)
+    sources: Dict[int, Tuple[int, str, bool]] = {}
+    position = 0
+    for idx, zpid, digest in entries:
+        if position < len(eager_indices) and eager_indices[position] == idx:
+            position += 1
+            norm = next(partial, None)
+            if norm is None:
+                raise RuntimeError(f"Incremental run lost the normalized listing at index {idx}")
+            sources[id(norm)] = (idx, digest, False)
+            normalized.append(norm)
+            continue
+        # Let the parser classify rejects so reasons match a full run
+        norm = next(iter_property_listings([raw_listings[idx]], idx, skipped=counts, dead_letter=dead_letter), None)
+        if norm is None:
+            if zpid is not None and latest.get(zpid) == digest:
+                latest.pop(zpid)
+            continue
+        sources[id(norm)] = (idx, digest, True)
+        normalized.append(norm)
+
+    if skipped is not None:
+        skipped.update(counts)
+    else:
+        log_skipped(counts)
+    if aggregator is not None:
+        aggregator.update(normalized)
+
+    delta = {
+        "added": [zpid for zpid in latest if zpid not in previous],
+        "changed": [zpid for zpid, digest in latest.items() if zpid in previous and previous[zpid] != digest],
+        "removed": [zpid for zpid in previous if zpid not in latest],
+    }
+    logger.info(
+        "Incremental run: %d added, %d changed, %d removed, %d unchanged",
+        len(delta["added"]),
+        len(delta["changed"]),
+        len(delta["removed"]),
+        len(unchanged),
+    )
+
+    filtered = apply_filters(normalized, **filter_options)
+
+    # Cached outputs are only valid for the same raw content and transform
+    transform_key = fingerprint(transform_options)
+    output_keys = state.output_keys()
+    cached = state.outputs(
+        norm["zpid"] for norm in filtered if output_keys.get(norm["zpid"]) == f"{sources[id(norm)][1]}:{transform_key}"
+    )
+
+    strip_empty = bool(transform_options.get("strip_empty", True))
+    projection = compile_projection(
+        transform_options.get("include_fields") or [],
+        transform_options.get("field_mapping") or {},
+    )
+    plan = load_clean_plan()
+    cleaned: List[Dict[str, Any]] = []
+    outputs: List[Tuple[int, str, Dict[str, Any]]] = []
+    for norm in filtered:
+        zpid = norm["zpid"]
+        idx, digest, complete = sources[id(norm)]
+        output_key = f"{digest}:{transform_key}"
+        output = cached.get(zpid) if output_keys.get(zpid) == output_key else None
+        if output is None:
+            if not complete:
+                # It passed the projected parse, which skips the same
+                # records as a full one, so this yields a listing
+                full = next(iter_property_listings([raw_listings[idx]], idx), None)
+                if full is None:
+                    raise RuntimeError(f"Listing {zpid} at index {idx} parsed with a projection but not in full")
+                norm = full
+            output = clean_record(projection.apply(norm), strip_empty=strip_empty, plan=plan)
+            if latest.get(zpid) == digest:
+                outputs.append((zpid, output_key, output))
+        if output:
+            cleaned.append(output)
+
+    upserts = [(zpid, digest) for zpid, digest in latest.items() if previous.get(zpid) != digest]
+    state.commit(upserts, outputs, delta["removed"])
+    return cleaned, delta
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from extractors.utils import get_logger
+
+try:  # resource is POSIX-only; peak RSS is simply not reported elsewhere
+    import resource
+except ImportError:  # pragma: no cover - depends on the platform
+    resource = None  # type: ignore[assignment]
+
+logger = get_logger("metrics")
+
+def _peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class StageMetrics:
+    """Timings and record counts of one pipeline stage."""
+
+    __slots__ = (
+        "name",
+        "wall_seconds",
+        "cpu_seconds",
+        "records_in",
+        "records_out",
+        "process_peak_rss_bytes",
+        "peak_traced_bytes",
+    )
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.records_in: Optional[int] = None
+        self.records_out: Optional[int] = None
+        # Peak RSS of the whole process so far, read when the stage ended;
+        # it never drops, so a stage inherits the peaks of earlier stages
+        self.process_peak_rss_bytes: Optional[int] = None
+        self.peak_traced_bytes: Optional[int] = None
+
+    @property
+    def records_per_sec(self) -> Optional[float]:
+        records = self.records_in if self.records_in is not None else self.records_out
+        if records is None or self.wall_seconds <= 0:
+            return None
+        return records / self.wall_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        rate = self.records_per_sec
+        return {
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "records_per_sec": None if rate is None else round(rate, 1),
+            "process_peak_rss_bytes": self.process_peak_rss_bytes,
+            "peak_traced_bytes": self.peak_traced_bytes,
+        }
+
+class RunMetrics:
+    """
+    Per-stage wall/CPU time, record counts and memory of one run, plus
+    counters such as skipped records by reason.
+
+    Batch stages are measured with the ``stage`` context manager. Lazy
+    stages are wrapped with ``track``, which times every pull through the
+    generator chain and later subtracts the upstream stage, so each stage
+    reports only its own time.
+
+    ``process_peak_rss_bytes`` is the process-wide peak RSS up to the end
+    of a stage, not the stage's own peak. The stage's own peak is
+    ``peak_traced_bytes``, which is only available while tracemalloc is
+    running (``--profile``). Lazy stages run interleaved, so they share the
+    traced peak of their chain.
+    """
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, StageMetrics] = {}
+        self.counters: Counter = Counter()
+        self.started = time.time()
+        self._tracked: List[str] = []
+
+    def _stage(self, name: str) -> StageMetrics:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageMetrics(name)
+        return stage
+
+    def _record_memory(self, stage: StageMetrics) -> None:
+        stage.process_peak_rss_bytes = _peak_rss_bytes()
+        if tracemalloc.is_tracing():
+            stage.peak_traced_bytes = tracemalloc.get_traced_memory()[1]
+
+    @contextmanager
+    def stage(self, name: str, records_in: Optional[int] = None) -> Iterator[StageMetrics]:
+        """
+        Time a batch stage; set ``records_out`` on the yielded object.
+        """
+        stage = self._stage(name)
+        stage.records_in = records_in
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield stage
+        finally:
+            stage.wall_seconds += time.perf_counter() - wall
+            stage.cpu_seconds += time.process_time() - cpu
+            self._record_memory(stage)
+            logger.info(
+                "Stage %s: %.3fs wall, %.3fs cpu, %s -> %s records",
+                name,
+                stage.wall_seconds,
+                stage.cpu_seconds,
+                stage.records_in,
+                stage.records_out,
+            )
+
+    def track(self, name: str, records: Iterable[Any]) -> Iterator[Any]:
+        """
+        Wrap the output of a lazy stage; successive calls must follow the
+        order of the generator chain.
+        """
+        stage = self._stage(name)
+        stage.records_out = 0
+        self._tracked.append(name)
+        return self._timed(stage, iter(records))
+
+    @staticmethod
+    def _timed(stage: StageMetrics, iterator: Iterator[Any]) -> Iterator[Any]:
+        perf_counter, process_time = time.perf_counter, time.process_time
+        while True:
+            wall, cpu = perf_counter(), process_time()
+            try:
+                record = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stage.wall_seconds += perf_counter() - wall
+                stage.cpu_seconds += process_time() - cpu
+            stage.records_out += 1
+            yield record
+
+    def finish_tracked(self, records_in: Optional[int] = None, consumer: Optional[str] = None) -> None:
+        """
+        Turn the cumulative times of tracked stages into per-stage times and
+        chain their record counts; ``records_in`` is the first stage's input.
+        ``consumer`` names the batch stage that drained the chain, whose
+        time is reduced by the chain's own.
+        """
+        if consumer is not None and self._tracked:
+            last = self.stages[self._tracked[-1]]
+            drained = self.stages[consumer]
+            drained.records_in = last.records_out
+            drained.wall_seconds = max(0.0, drained.wall_seconds - last.wall_seconds)
+            drained.cpu_seconds = max(0.0, drained.cpu_seconds - last.cpu_seconds)
+        upstream: Optional[StageMetrics] = None
+        for name in self._tracked:
+            stage = self.stages[name]
+            if upstream is None:
+                stage.records_in = records_in
+            else:
+                stage.records_in = upstream.records_out
+            self._record_memory(stage)
+            upstream = stage
+        # Walk backwards so each subtraction uses the upstream's cumulative time
+        for index in range(len(self._tracked) - 1, 0, -1):
+            stage = self.stages[self._tracked[index]]
+            previous = self.stages[self._tracked[index - 1]]
+            stage.wall_seconds = max(0.0, stage.wall_seconds - previous.wall_seconds)
+            stage.cpu_seconds = max(0.0, stage.cpu_seconds - previous.cpu_seconds)
+        self._tracked = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started": self.started,
+            "wall_seconds": round(sum(stage.wall_seconds for stage in self.stages.values()), 6),
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "stages": {name: stage.to_dict() for name, stage in self.stages.items()},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def write_json(self, path: str) -> None:
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def write_prometheus(self, path: str, prefix: str = "zillow_explorer") -> None:
+        """
+        Write the metrics in the Prometheus text format, for the node
+        exporter's textfile collector.
+        """
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str, samples: List[Any]) -> None:
+            samples = [(labels, value) for labels, value in samples if value is not None]
+            if not samples:
+                return
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}" if label_text else f"{prefix}_{name} {value}")
+
+        stages = list(self.stages.values())
+        family("stage_wall_seconds", "gauge", "Wall-clock time spent in the stage.", [({"stage": s.name}, round(s.wall_seconds, 6)) for s in stages])
+        family("stage_cpu_seconds", "gauge", "CPU time spent in the stage.", [({"stage": s.name}, round(s.cpu_seconds, 6)) for s in stages])
+        family("stage_records_in", "gauge", "Records entering the stage.", [({"stage": s.name}, s.records_in) for s in stages])
+        family("stage_records_out", "gauge", "Records leaving the stage.", [({"stage": s.name}, s.records_out) for s in stages])
+        family(
+            "stage_records_per_second",
+            "gauge",
+            "Stage throughput.",
+            [({"stage": s.name}, None if s.records_per_sec is None else round(s.records_per_sec, 1)) for s in stages],
+        )
+        family(
+            "stage_process_peak_rss_bytes",
+            "gauge",
+            "Process-wide peak RSS up to the end of the stage (includes earlier stages).",
+            [({"stage": s.name}, s.process_peak_rss_bytes) for s in stages],
+        )
+        family("stage_peak_traced_bytes", "gauge", "Peak traced allocation during the stage.", [({"stage": s.name}, s.peak_traced_bytes) for s in stages])
+        family("events_total", "counter", "Run counters such as skipped records by reason.", [({"event": k}, v) for k, v in sorted(self.counters.items())])
+        family("last_run_timestamp_seconds", "gauge", "Start time of the run.", [({}, round(self.started, 3))])
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _write_atomic(path: str, text: str) -> None:
+    # The textfile collector may read at any time; never expose a partial file
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+class Profiler:
+    """
+    cProfile plus tracemalloc around a run, dumped next to the output file.
+    """
+
+    def __init__(self, top: int = 40) -> None:
+        self.top = top
+        self._profile = cProfile.Profile()
+
+    def __enter__(self) -> "Profiler":
+        tracemalloc.start(10)
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._profile.disable()
+
+    def dump(self, base_path: str) -> List[str]:
+        """
+        Write ``<base>.pstats``, a cumulative-time report ``<base>.profile.txt``
+        and the largest allocation sites ``<base>.tracemalloc.txt``.
+        """
+        paths = [f"{base_path}.pstats", f"{base_path}.profile.txt", f"{base_path}.tracemalloc.txt"]
+        self._profile.dump_stats(paths[0])
+
+        report = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=report)
+        stats.sort_stats("cumulative").print_stats(self.top)
+        stats.sort_stats("tottime").print_stats(self.top)
+        _write_atomic(paths[1], report.getvalue())
+
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"current={current} peak={peak} bytes", ""]
+            lines.extend(str(stat) for stat in snapshot.statistics("lineno")[: self.top])
+            _write_atomic(paths[2], "\n".join(lines) + "\n")
+        else:
+            paths.pop()
+        return paths
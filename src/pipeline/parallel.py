@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import math
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from extractors.dead_letter import Reject, RejectBuffer, RejectSink, replay_rejects
+from extractors.filters import apply_filters
+from extractors.property_parser import log_skipped, parse_property_listings
+from extractors.sorting import make_sort_key
+from extractors.utils import get_logger
+from transformers.aggregator import Aggregator
+from transformers.data_cleanser import clean_record, load_clean_plan
+from transformers.field_mapper import iter_mapped_fields
+
+logger = get_logger("parallel")
+
+# Shards per worker; more, smaller shards keep workers busy when some
+# chunks contain heavier listings than others.
+SHARDS_PER_WORKER = 4
+
+KeyedRecord = Tuple[Any, Dict[str, Any]]
+
+def process_shard(
+    args: Tuple[int, Sequence[Any], Dict[str, Any], Dict[str, Any], Optional[FrozenSet[str]], bool, Optional[Aggregator]],
+) -> Tuple[List[KeyedRecord], Counter, List[Reject], Optional[Aggregator]]:
+    """
+    Run the pipeline on one contiguous chunk of raw listings starting at
+    input index ``start``. Returns the cleaned records, sorted and limited
+    within the chunk, each with its sort key (None when unsorted), plus the
+    chunk's skip counts, its rejects when ``quarantine`` is set and its
+    aggregator.
+    """
+    start, chunk, filter_options, transform_options, fields, quarantine, aggregator = args
+    skipped: Counter = Counter()
+    rejects = RejectBuffer() if quarantine else None
+    normalized = parse_property_listings(chunk, start, fields, skipped=skipped, dead_letter=rejects)
+    if aggregator is not None:
+        aggregator.update(normalized)
+
+    # Sorting and limiting per shard is safe: the global top-k is always a
+    # subset of the union of every shard's top-k.
+    filtered = apply_filters(normalized, **filter_options)
+    sort_by = filter_options.get("sort_by")
+    keys: List[Any] = [None] * len(filtered)
+    if sort_by:
+        sort_key = make_sort_key(sort_by)
+        keys = [sort_key(item) for item in filtered]
+
+    mapped = iter_mapped_fields(
+        filtered,
+        field_mapping=transform_options.get("field_mapping") or {},
+        include_fields=transform_options.get("include_fields") or [],
+    )
+    strip_empty = bool(transform_options.get("strip_empty", True))
+    plan = load_clean_plan()
+    cleaned = [(key, clean_record(item, strip_empty=strip_empty, plan=plan)) for key, item in zip(keys, mapped)]
+    return cleaned, skipped, rejects.entries if rejects is not None else [], aggregator
+
+def _merge_shards(
+    shards: List[List[KeyedRecord]],
+    sort_by: str,
+    order: str,
+    limit: Any,
+) -> List[Dict[str, Any]]:
+    # Shards arrive in input order and each one is already stably sorted, so
+    # one more stable sort reproduces the single-process ordering, ties included.
+    merged: List[KeyedRecord] = [pair for shard in shards for pair in shard]
+    if sort_by:
+        try:
+            merged.sort(key=lambda pair: pair[0], reverse=order.lower() == "desc")
+        except TypeError:
+            logger.warning("Failed to sort by %s due to incomparable types", sort_by)
+    if limit is not None and limit > 0:
+        merged = merged[:limit]
+    return [record for _, record in merged if record]
+
+def run_sharded_pipeline(
+    raw_listings: Sequence[Any],
+    filter_options: Dict[str, Any],
+    transform_options: Dict[str, Any],
+    workers: int,
+    fields: Optional[FrozenSet[str]] = None,
+    skipped: Optional[Counter] = None,
+    dead_letter: Optional[RejectSink] = None,
+    aggregator: Optional[Aggregator] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Run parse/filter/map/clean across a process pool and merge the shards.
+
+    The result matches the sequential pipeline exactly, including the
+    global sort order and limit. Records the shards skipped are added to
+    ``skipped`` by reason (or logged once) and written to ``dead_letter``
+    in input order. Each shard aggregates its own listings and the shard
+    aggregators are merged into ``aggregator``.
+    """
+    shard_count = max(1, workers * SHARDS_PER_WORKER)
+    chunk_size = max(1, math.ceil(len(raw_listings) / shard_count))
+    shard_aggregator = aggregator.empty_copy() if aggregator is not None else None
+    tasks = [
+        (
+            start,
+            raw_listings[start : start + chunk_size],
+            filter_options,
+            transform_options,
+            fields,
+            dead_letter is not None,
+            shard_aggregator,
+        )
+        for start in range(0, len(raw_listings), chunk_size)
+    ]
+    logger.info("Processing %d shards of up to %d listings on %d workers", len(tasks), chunk_size, workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(process_shard, tasks))
+
+    counts: Counter = Counter()
+    for _, shard_skipped, shard_rejects, shard_aggregate in results:
+        counts.update(shard_skipped)
+        if dead_letter is not None:
+            replay_rejects(shard_rejects, dead_letter)
+        if aggregator is not None and shard_aggregate is not None:
+            aggregator.merge(shard_aggregate)
+    if skipped is not None:
+        skipped.update(counts)
+    else:
+        log_skipped(counts)
+
+    return _merge_shards(
+        [shard for shard, _, _, _ in results],
+        sort_by=filter_options.get("sort_by") or "",
+        order=filter_options.get("order", "asc"),
+        limit=filter_options.get("limit"),
+    )
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from extractors.columnar import ListingTable, columnar_available
+from extractors.expressions import compile_filter, legacy_conditions
+from extractors.filters import apply_filters
+from extractors.utils import get_logger, load_json_file
+from transformers.data_cleanser import clean_records, load_clean_plan
+from transformers.field_mapper import map_fields
+
+logger = get_logger("profiles")
+
+class Profile:
+    """One named settings profile evaluated over the shared listings."""
+
+    __slots__ = ("name", "filter_options", "transform_options", "output_path")
+
+    def __init__(
+        self,
+        name: str,
+        filter_options: Dict[str, Any],
+        transform_options: Dict[str, Any],
+        output_path: str,
+    ) -> None:
+        self.name = name
+        self.filter_options = filter_options
+        self.transform_options = transform_options
+        self.output_path = output_path
+
+def load_profiles(path: str, base_settings: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a ``{name: settings}`` JSON file and return complete settings per
+    profile. Every section a profile sets (``filters``, ``transform``, ...)
+    is merged key by key over the same section of ``base_settings``; an
+    optional ``output_file`` names the profile's output file.
+    """
+    raw = load_json_file(path)
+    if not isinstance(raw, dict) or not raw:
+        raise ValueError(f"{path} must be a JSON object mapping profile names to settings")
+
+    profiles: Dict[str, Dict[str, Any]] = {}
+    for name, overrides in raw.items():
+        if not name or os.sep in name or name.startswith("."):
+            raise ValueError(f"Invalid profile name {name!r}")
+        if not isinstance(overrides, dict):
+            raise ValueError(f"Profile {name!r} must be a JSON object")
+        if isinstance(overrides.get("output"), str):
+            # "output" is the output settings section
+            raise ValueError(f"Profile {name!r} names its output file with output_file, not output")
+        settings = dict(base_settings)
+        for section, values in overrides.items():
+            base = base_settings.get(section)
+            settings[section] = {**base, **values} if isinstance(base, dict) and isinstance(values, dict) else values
+        profiles[name] = settings
+    return profiles
+
+def _key(*parts: Any) -> str:
+    return json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+
+def run_profiles(
+    listings: Sequence[Dict[str, Any]],
+    profiles: Sequence[Profile],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Evaluate every profile's filters and transform over the same parsed
+    listings and return the cleaned records per profile name.
+
+    Each stage is memoized on the options that determine its output, so
+    profiles that share a filter set run one predicate pass, those that
+    also share sort/order/limit share the sorted result, and matching
+    include_fields/field_mapping and strip_empty share map and clean.
+    Profiles with identical settings get the same result list.
+    """
+    table: Optional[ListingTable] = None
+    if any(p.filter_options.get("columnar") for p in profiles) and columnar_available():
+        table = ListingTable(listings)
+
+    survivors: Dict[str, List[Dict[str, Any]]] = {}
+    ordered: Dict[str, List[Dict[str, Any]]] = {}
+    mapped: Dict[str, List[Dict[str, Any]]] = {}
+    cleaned: Dict[str, List[Dict[str, Any]]] = {}
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    plan = load_clean_plan()
+
+    for profile in profiles:
+        options = profile.filter_options
+        transform = profile.transform_options
+        conditions = legacy_conditions(options["min_price"], options["max_price"], options["min_bedrooms"])
+        conditions += list(options["where"] or [])
+
+        filter_key = _key(conditions)
+        if filter_key not in survivors:
+            if table is not None:
+                survivors[filter_key] = table.materialize(table.filter_indices(conditions))
+            else:
+                survivors[filter_key] = list(filter(compile_filter(conditions), listings))
+
+        # Sorting the survivors of a shared pass equals apply_filters on the
+        # full input: the filter keeps input order and the sort is stable.
+        order_key = _key(filter_key, options["sort_by"], options["order"], options["limit"])
+        if order_key not in ordered:
+            ordered[order_key] = apply_filters(
+                survivors[filter_key],
+                sort_by=options["sort_by"],
+                order=options["order"],
+                limit=options["limit"],
+                sort_buffer_size=options["sort_buffer_size"],
+            )
+
+        map_key = _key(order_key, transform["include_fields"], transform["field_mapping"])
+        if map_key not in mapped:
+            mapped[map_key] = map_fields(
+                ordered[order_key],
+                field_mapping=transform["field_mapping"],
+                include_fields=transform["include_fields"],
+            )
+
+        clean_key = _key(map_key, transform["strip_empty"])
+        if clean_key not in cleaned:
+            cleaned[clean_key] = clean_records(mapped[map_key], strip_empty=transform["strip_empty"], plan=plan)
+        results[profile.name] = cleaned[clean_key]
+
+    logger.info(
+        "Evaluated %d profiles with %d filter passes, %d sorts, %d projections and %d cleans",
+        len(profiles),
+        len(survivors),
+        len(ordered),
+        len(mapped),
+        len(cleaned),
+    )
+    return results
+
+def profile_output_path(output_dir: str, name: str, settings: Dict[str, Any]) -> str:
+    """
+    The profile's ``output_file`` (relative to ``output_dir``), or ``<name>.json``.
+    """
+    output = settings.get("output_file")
+    if isinstance(output, str) and output:
+        return output if os.path.isabs(output) else os.path.join(output_dir, output)
+    return os.path.join(output_dir, f"{name}.json")
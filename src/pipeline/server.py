@@ -0,0 +1,397 @@
+from __future__ import annotations
+
+import json
+import os
+import socketserver
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+from extractors.columnar import ListingTable, columnar_available
+from extractors.expressions import compile_filter, legacy_conditions
+from extractors.filters import apply_filters, filter_table
+from extractors.property_parser import parse_property_listings, shape_cache_stats
+from extractors.sources import iter_input_records
+from extractors.utils import get_logger
+from transformers.data_cleanser import clean_records, load_clean_plan
+from transformers.field_mapper import iter_mapped_fields
+
+logger = get_logger("server")
+
+# Options a query may override; anything else is rejected
+FILTER_KEYS = ("min_price", "max_price", "min_bedrooms", "where", "sort_by", "order", "limit")
+TRANSFORM_KEYS = ("field_mapping", "include_fields", "strip_empty")
+
+Signature = Tuple[int, int, int]
+
+class QueryError(ValueError):
+    """A query the server cannot answer; reported to the client as HTTP 400."""
+
+def _file_signature(path: str) -> Optional[Signature]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def normalize_query(
+    request: Dict[str, Any],
+    filter_defaults: Dict[str, Any],
+    transform_defaults: Dict[str, Any],
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Merge a query over the configured defaults and validate it.
+
+    Returns complete filter and transform options, so queries that only
+    differ in spelling (omitted vs. explicit defaults, key order, ``DESC``
+    vs. ``desc``) normalize to the same options and share a cache entry.
+    """
+    unknown = sorted(set(request) - set(FILTER_KEYS) - set(TRANSFORM_KEYS))
+    if unknown:
+        raise QueryError(f"Unknown query options: {', '.join(unknown)}")
+
+    filters = {key: filter_defaults.get(key) for key in FILTER_KEYS}
+    transform = {key: transform_defaults.get(key) for key in TRANSFORM_KEYS}
+    for key, value in request.items():
+        (filters if key in FILTER_KEYS else transform)[key] = value
+
+    for key in ("min_price", "max_price", "min_bedrooms"):
+        value = filters[key]
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            raise QueryError(f"{key} must be a number, got {value!r}")
+    if filters["limit"] is not None and (isinstance(filters["limit"], bool) or not isinstance(filters["limit"], int)):
+        raise QueryError(f"limit must be an integer, got {filters['limit']!r}")
+    if filters["sort_by"] is not None and not isinstance(filters["sort_by"], str):
+        raise QueryError(f"sort_by must be a field path, got {filters['sort_by']!r}")
+    order = str(filters["order"] or "asc").lower()
+    if order not in ("asc", "desc"):
+        raise QueryError(f"order must be 'asc' or 'desc', got {filters['order']!r}")
+    filters["order"] = order
+    where = filters["where"] or []
+    if not isinstance(where, list) or not all(isinstance(clause, dict) for clause in where):
+        raise QueryError("where must be a list of filter clauses")
+    filters["where"] = list(where)
+    field_mapping = transform["field_mapping"] or {}
+    if not isinstance(field_mapping, dict) or not all(
+        isinstance(source, str) and isinstance(target, str) for source, target in field_mapping.items()
+    ):
+        raise QueryError("field_mapping must map field names to field names")
+    transform["field_mapping"] = dict(field_mapping)
+    include_fields = transform["include_fields"] or []
+    if not isinstance(include_fields, list) or not all(isinstance(field, str) for field in include_fields):
+        raise QueryError("include_fields must be a list of field names")
+    transform["include_fields"] = list(include_fields)
+    transform["strip_empty"] = bool(True if transform["strip_empty"] is None else transform["strip_empty"])
+
+    try:
+        compile_filter(_conditions(filters))
+    except ValueError as exc:
+        raise QueryError(str(exc)) from exc
+    return filters, transform
+
+def _conditions(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return legacy_conditions(filters["min_price"], filters["max_price"], filters["min_bedrooms"]) + filters["where"]
+
+def query_key(filters: Dict[str, Any], transform: Dict[str, Any]) -> str:
+    return json.dumps([filters, transform], sort_keys=True, separators=(",", ":"))
+
+class Dataset:
+    """
+    Normalized listings of one version of the input file, plus a columnar
+    table over them when numpy is available.
+    """
+
+    def __init__(
+        self,
+        listings: Sequence[Dict[str, Any]],
+        signature: Optional[Signature] = None,
+        generation: int = 0,
+        columnar: bool = True,
+    ) -> None:
+        self.listings = listings
+        self.signature = signature
+        self.generation = generation
+        self.table = ListingTable(listings) if columnar and columnar_available() else None
+
+    @classmethod
+    def load(cls, path: str, generation: int = 0, columnar: bool = True) -> "Dataset":
+        signature = _file_signature(path)
+        listings = parse_property_listings(iter_input_records([path]), compact=True)
+        logger.info("Loaded %d listings from %s", len(listings), path)
+        return cls(listings, signature, generation, columnar)
+
+    def query(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Filter, sort and limit exactly like apply_filters with ``filters``.
+        """
+        if self.table is not None:
+            return filter_table(self.table, _conditions(filters), filters["sort_by"], filters["order"], filters["limit"])
+        return apply_filters(self.listings, **filters)
+
+class QueryCache:
+    """
+    Thread-safe LRU of encoded query responses.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: str, body: bytes) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+class QueryService:
+    """
+    Keeps the normalized dataset of ``path`` warm in memory and answers
+    queries with the same semantics as the batch pipeline: apply_filters,
+    then map_fields and clean_record.
+
+    Encoded responses are cached per dataset version under the normalized
+    query. A watcher thread polls the input file and swaps in a freshly
+    loaded dataset when it changes; queries keep using the previous one
+    while the new one loads, and a file that fails to load is logged and
+    skipped until it changes again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        filter_defaults: Dict[str, Any],
+        transform_defaults: Dict[str, Any],
+        cache_size: int = 256,
+        reload_interval: float = 2.0,
+        columnar: bool = True,
+    ) -> None:
+        self.path = path
+        self.filter_defaults = filter_defaults
+        self.transform_defaults = transform_defaults
+        self.reload_interval = reload_interval
+        self.columnar = columnar
+        self.cache = QueryCache(cache_size)
+        self.dataset = Dataset.load(path, columnar=columnar)
+        self._seen = self.dataset.signature
+        self._reload_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def query(self, request: Dict[str, Any]) -> Tuple[bytes, bool]:
+        """
+        Answer a query with the JSON-encoded records and whether the
+        response came from the cache.
+        """
+        filters, transform = normalize_query(request, self.filter_defaults, self.transform_defaults)
+        # One reference, so a concurrent reload cannot mix two versions
+        dataset = self.dataset
+        key = f"{dataset.generation}:{query_key(filters, transform)}"
+        body = self.cache.get(key)
+        if body is not None:
+            return body, True
+
+        filtered = dataset.query(filters)
+        mapped = iter_mapped_fields(
+            filtered,
+            field_mapping=transform["field_mapping"],
+            include_fields=transform["include_fields"],
+        )
+        cleaned = clean_records(mapped, strip_empty=transform["strip_empty"], plan=load_clean_plan())
+        body = json.dumps(cleaned, separators=(",", ":")).encode("utf-8")
+        self.cache.put(key, body)
+        return body, False
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load the input file again if it changed (or ``force``); returns
+        whether a new dataset was swapped in.
+        """
+        with self._reload_lock:
+            signature = _file_signature(self.path)
+            if signature is None or (signature == self._seen and not force):
+                return False
+            self._seen = signature
+            try:
+                dataset = Dataset.load(self.path, self.dataset.generation + 1, self.columnar)
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Failed to reload %s, still serving the previous data: %s", self.path, exc)
+                return False
+            self.dataset = dataset
+            self.cache.clear()
+            logger.info("Reloaded %s (generation %d)", self.path, dataset.generation)
+            return True
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.reload_interval):
+            self.reload()
+
+    def start_watching(self) -> None:
+        if self.reload_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="dataset-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        dataset = self.dataset
+        return {
+            "path": self.path,
+            "listings": len(dataset.listings),
+            "generation": dataset.generation,
+            "columnar": dataset.table is not None,
+            "cache": {
+                "size": len(self.cache),
+                "maxsize": self.cache.maxsize,
+                "hits": self.cache.hits,
+                "misses": self.cache.misses,
+            },
+            "shapes": shape_cache_stats(),
+        }
+
+def _query_from_params(query_string: str) -> Dict[str, Any]:
+    request: Dict[str, Any] = {}
+    for key, value in parse_qsl(query_string, keep_blank_values=True):
+        # Numbers, lists and objects arrive JSON-encoded; anything else is a string
+        try:
+            request[key] = json.loads(value)
+        except ValueError:
+            request[key] = value
+    return request
+
+class _QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Any
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        url = urlsplit(self.path)
+        if url.path == "/query":
+            self._answer(lambda: _query_from_params(url.query))
+        elif url.path == "/stats":
+            self._reply(200, json.dumps(self.server.service.stats()).encode("utf-8"))
+        elif url.path == "/health":
+            self._reply(200, b'{"status":"ok"}')
+        else:
+            self._reply(404, b'{"error":"not found"}')
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        url = urlsplit(self.path)
+        if url.path == "/query":
+            self._answer(self._read_body)
+        elif url.path == "/reload":
+            self._read_body()
+            reloaded = self.server.service.reload(force=True)
+            self._reply(200, json.dumps({"reloaded": reloaded}).encode("utf-8"))
+        else:
+            self._reply(404, b'{"error":"not found"}')
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError as exc:
+            raise QueryError(f"Query body is not valid JSON: {exc}") from exc
+        if not isinstance(request, dict):
+            raise QueryError("Query body must be a JSON object")
+        return request
+
+    def _answer(self, read_request: Any) -> None:
+        try:
+            body, cached = self.server.service.query(read_request())
+        except QueryError as exc:
+            self._reply(400, json.dumps({"error": str(exc)}).encode("utf-8"))
+            return
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Query failed: %s", exc)
+            self._reply(500, json.dumps({"error": str(exc)}).encode("utf-8"))
+            return
+        self._reply(200, body, {"X-Cache": "hit" if cached else "miss"})
+
+    def _reply(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - http.server naming
+        logger.debug(format, *args)
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+Server = Union[ThreadingHTTPServer, _UnixHTTPServer]
+
+def make_server(address: str, service: QueryService) -> Server:
+    """
+    Bind an HTTP server for ``service`` on ``host:port`` (``:port`` binds
+    localhost) or on a Unix socket given as ``unix:/path/to.sock``.
+    """
+    server: Server
+    if address.startswith("unix:"):
+        socket_path = address[len("unix:") :]
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _QueryHandler)
+    else:
+        host, _, port = address.rpartition(":")
+        try:
+            server = ThreadingHTTPServer((host or "127.0.0.1", int(port)), _QueryHandler)
+        except ValueError:
+            raise ValueError(f"Invalid server address {address!r}; use host:port or unix:/path") from None
+        server.daemon_threads = True
+    server.service = service  # type: ignore[union-attr]
+    return server
+
+def serve(address: str, service: QueryService) -> None:
+    """
+    Serve queries until interrupted.
+    """
+    server = make_server(address, service)
+    service.start_watching()
+    logger.info("Serving %d listings from %s on %s", len(service.dataset.listings), service.path, address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        service.stop()
+        server.server_close()
+        if address.startswith("unix:"):
+            try:
+                os.unlink(address[len("unix:") :])
+            except OSError:
+                pass
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from extractors.utils import compile_path, get_logger, get_path_value
+
+logger = get_logger("aggregator")
+
+DEFAULT_GROUP_BY = ("address.zipcode", "address.city", "address.state", "propertyType")
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+# Metrics with a quantile sketch; the others only report a mean
+_SKETCHED = ("price", "price_per_sqft", "tax_to_list_ratio")
+_METRICS = _SKETCHED + ("school_rating", "walkscore")
+
+# Normalized fields listing_metrics reads
+METRIC_PATHS = ("price.value", "livingArea", "taxAssessment.taxAssessedValue", "schools", "walkScore.walkscore")
+
+_PRICE = compile_path("price.value")
+_TAX_ASSESSED = compile_path("taxAssessment.taxAssessedValue")
+_WALKSCORE = compile_path("walkScore.walkscore")
+_STATE = compile_path("address.state")
+
+def _number(value: Any) -> Optional[float]:
+    # NaN and infinities would poison the sums and cannot be sketched
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    try:
+        number = float(value)
+    except OverflowError:
+        return None
+    return number if math.isfinite(number) else None
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative-error guarantees (DDSketch).
+
+    Values are counted in logarithmic buckets, so every quantile estimate is
+    within ``relative_accuracy`` of a true value at that rank, memory grows
+    with the log of the value range rather than the count, and two sketches
+    with the same accuracy merge exactly by adding bucket counts.
+    """
+
+    __slots__ = ("relative_accuracy", "_gamma", "_log_gamma", "positive", "negative", "zero_count", "count", "min", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be in (0, 1), got {relative_accuracy!r}")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self._gamma**key / (self._gamma + 1)
+
+    def add(self, value: float) -> None:
+        if value > 0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + 1
+        else:
+            self.zero_count += 1
+        self.count += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(self.min, -self._value(key))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self.max, max(self.min, self._value(key)))
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "positive": {str(key): count for key, count in self.positive.items()},
+            "negative": {str(key): count for key, count in self.negative.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.positive = {int(key): count for key, count in data["positive"].items()}
+        sketch.negative = {int(key): count for key, count in data["negative"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+def listing_metrics(listing: Mapping[str, Any]) -> Dict[str, List[float]]:
+    """
+    The values one normalized listing contributes to each metric.
+    """
+    values: Dict[str, List[float]] = {}
+    price = _number(get_path_value(listing, _PRICE))
+    if price is not None:
+        values["price"] = [price]
+        area = _number(listing.get("livingArea"))
+        if area:
+            per_sqft = _number(price / area)
+            if per_sqft is not None:
+                values["price_per_sqft"] = [per_sqft]
+        assessed = _number(get_path_value(listing, _TAX_ASSESSED))
+        if assessed is not None and price:
+            ratio = _number(assessed / price)
+            if ratio is not None:
+                values["tax_to_list_ratio"] = [ratio]
+    schools = listing.get("schools")
+    if isinstance(schools, list):
+        ratings = [_number(school.get("rating")) for school in schools if isinstance(school, dict)]
+        values["school_rating"] = [rating for rating in ratings if rating is not None]
+    walkscore = _number(get_path_value(listing, _WALKSCORE))
+    if walkscore is not None:
+        values["walkscore"] = [walkscore]
+    return values
+
+class GroupStats:
+    """Running count, sums and sketches of one group of listings."""
+
+    __slots__ = ("count", "sums", "counts", "sketches")
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.count = 0
+        self.sums: Dict[str, float] = dict.fromkeys(_METRICS, 0.0)
+        self.counts: Dict[str, int] = dict.fromkeys(_METRICS, 0)
+        self.sketches = {metric: QuantileSketch(relative_accuracy) for metric in _SKETCHED}
+
+    def add(self, values: Mapping[str, List[float]]) -> None:
+        self.count += 1
+        for metric, samples in values.items():
+            for value in samples:
+                self.sums[metric] += value
+                self.counts[metric] += 1
+            sketch = self.sketches.get(metric)
+            if sketch is not None:
+                for value in samples:
+                    sketch.add(value)
+
+    def merge(self, other: "GroupStats") -> None:
+        self.count += other.count
+        for metric in _METRICS:
+            self.sums[metric] += other.sums[metric]
+            self.counts[metric] += other.counts[metric]
+        for metric, sketch in self.sketches.items():
+            sketch.merge(other.sketches[metric])
+
+    def summary(self, quantiles: Sequence[float]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"count": self.count}
+        for metric in _METRICS:
+            count = self.counts[metric]
+            stats: Dict[str, Any] = {"count": count, "mean": round(self.sums[metric] / count, 4) if count else None}
+            sketch = self.sketches.get(metric)
+            if sketch is not None:
+                stats["min"] = round(sketch.min, 4) if sketch.count else None
+                stats["max"] = round(sketch.max, 4) if sketch.count else None
+                for q in quantiles:
+                    value = sketch.quantile(q)
+                    stats[f"p{q * 100:g}"] = None if value is None else round(value, 4)
+            result[metric] = stats
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sums": dict(self.sums),
+            "counts": dict(self.counts),
+            "sketches": {metric: sketch.to_dict() for metric, sketch in self.sketches.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "GroupStats":
+        stats = cls()
+        stats.count = data["count"]
+        stats.sums.update(data["sums"])
+        stats.counts.update(data["counts"])
+        stats.sketches = {metric: QuantileSketch.from_dict(sketch) for metric, sketch in data["sketches"].items()}
+        return stats
+
+class Aggregator:
+    """
+    One-pass grouped market statistics over normalized listings.
+
+    Every listing is added to one group per ``group_by`` path (plus the
+    overall ``"*"`` group): count, mean price and price quantiles, price
+    per livingArea sqft, tax-assessed-to-list ratio, mean school rating and
+    mean walkscore. Cities are keyed as ``"City, ST"`` so same-named cities
+    in different states stay apart. Only sums and sketches are kept, so
+    aggregators built over shards or separate runs merge into the result a
+    single pass would give (quantiles within ``relative_accuracy``).
+    """
+
+    def __init__(
+        self,
+        group_by: Sequence[str] = DEFAULT_GROUP_BY,
+        quantiles: Sequence[float] = DEFAULT_QUANTILES,
+        relative_accuracy: float = 0.01,
+    ) -> None:
+        self.group_by = tuple(group_by)
+        self.quantiles = tuple(quantiles)
+        self.relative_accuracy = relative_accuracy
+        self.total = GroupStats(relative_accuracy)
+        self.groups: Dict[str, Dict[str, GroupStats]] = {path: {} for path in self.group_by}
+        self._paths: List[Tuple[str, Tuple[str, ...]]] = [(path, compile_path(path)) for path in self.group_by]
+
+    @property
+    def paths(self) -> List[str]:
+        """Every normalized field the aggregation reads."""
+        return list(self.group_by) + ["address.state"] + list(METRIC_PATHS)
+
+    def empty_copy(self) -> "Aggregator":
+        return Aggregator(self.group_by, self.quantiles, self.relative_accuracy)
+
+    def _group_key(self, path: str, parts: Tuple[str, ...], listing: Mapping[str, Any]) -> Optional[str]:
+        value = get_path_value(listing, parts)
+        if value is None or value == "":
+            return None
+        if path == "address.city":
+            state = get_path_value(listing, _STATE)
+            return f"{value}, {state}" if state else str(value)
+        return str(value)
+
+    def add(self, listing: Mapping[str, Any]) -> None:
+        values = listing_metrics(listing)
+        self.total.add(values)
+        for path, parts in self._paths:
+            key = self._group_key(path, parts, listing)
+            if key is None:
+                continue
+            groups = self.groups[path]
+            stats = groups.get(key)
+            if stats is None:
+                stats = groups[key] = GroupStats(self.relative_accuracy)
+            stats.add(values)
+
+    def update(self, listings: Iterable[Mapping[str, Any]]) -> int:
+        count = 0
+        for listing in listings:
+            self.add(listing)
+            count += 1
+        return count
+
+    def observe(self, listings: Iterable[Mapping[str, Any]]) -> Iterator[Mapping[str, Any]]:
+        """
+        Pass listings through unchanged while adding each one, so the
+        aggregation rides along a streaming pipeline.
+        """
+        for listing in listings:
+            self.add(listing)
+            yield listing
+
+    def merge(self, other: "Aggregator") -> "Aggregator":
+        if other.group_by != self.group_by or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge aggregators with different group_by or relative accuracy")
+        self.total.merge(other.total)
+        for path, groups in other.groups.items():
+            mine = self.groups[path]
+            for key, stats in groups.items():
+                if key in mine:
+                    mine[key].merge(stats)
+                else:
+                    mine[key] = GroupStats.from_dict(stats.to_dict())
+        return self
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summary statistics per group, groups ordered by key.
+        """
+        return {
+            "total": self.total.summary(self.quantiles),
+            "groups": {
+                path: {key: groups[key].summary(self.quantiles) for key in sorted(groups)}
+                for path, groups in self.groups.items()
+            },
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        JSON-compatible state that from_state restores for later merging.
+        """
+        return {
+            "group_by": list(self.group_by),
+            "quantiles": list(self.quantiles),
+            "relative_accuracy": self.relative_accuracy,
+            "total": self.total.to_dict(),
+            "groups": {path: {key: stats.to_dict() for key, stats in groups.items()} for path, groups in self.groups.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: Mapping[str, Any]) -> "Aggregator":
+        aggregator = cls(state["group_by"], state["quantiles"], state["relative_accuracy"])
+        aggregator.total = GroupStats.from_dict(state["total"])
+        for path, groups in state["groups"].items():
+            aggregator.groups[path] = {key: GroupStats.from_dict(stats) for key, stats in groups.items()}
+        return aggregator
@@ -1,6 +1,10 @@
-thonfrom __future__ import annotations
+from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Union
+import json
+import os
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
 
 from extractors.utils import get_logger
 
@@ -8,6 +12,24 @@ logger = get_logger("data_cleanser")
 
 JsonType = Union[Dict[str, Any], List[Any], str, int, float, bool, None]
 
+# Per-key cleaning plan: None marks a scalar field, a nested mapping an
+# object with known properties; keys without an entry are cleaned generically.
+CleanPlan = Mapping[str, Optional[Mapping[str, Any]]]
+
+DEFAULT_SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "data",
+    "schema.json",
+)
+
+_SCALAR_TYPES = {"integer", "number", "string", "boolean", "null"}
+
+# Values of these types are never empty, whatever the schema says
+_NEVER_EMPTY = (int, float, bool)
+
+# Returned by the copy-on-write cleaners for values that should be dropped
+_EMPTY = object()
+
 def _is_empty(value: Any) -> bool:
     if value is None:
         return True
@@ -47,10 +69,104 @@ def _clean(value: JsonType, strip_empty: bool) -> Optional[JsonType]:
         return None
     return value
 
-def clean_record(record: Dict[str, Any], strip_empty: bool = True) -> Dict[str, Any]:
+def compile_clean_plan(schema: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Derive a cleaning plan from a JSON schema's ``properties``.
+    """
+    plan: Dict[str, Any] = {}
+    for key, spec in (schema.get("properties") or {}).items():
+        types = spec.get("type")
+        types = set(types) if isinstance(types, list) else {types}
+        if types <= _SCALAR_TYPES:
+            plan[key] = None
+        elif "object" in types and spec.get("properties"):
+            plan[key] = compile_clean_plan(spec)
+    return plan
+
+@lru_cache(maxsize=None)
+def load_clean_plan(schema_path: str = DEFAULT_SCHEMA_PATH) -> Dict[str, Any]:
+    try:
+        with open(schema_path, "r", encoding="utf-8") as f:
+            return compile_clean_plan(json.load(f))
+    except (OSError, ValueError) as exc:
+        logger.warning("Could not load cleaning schema %s (%s); cleaning generically", schema_path, exc)
+        return {}
+
+def _cow_value(value: Any) -> Any:
+    if value is None:
+        return _EMPTY
+    if isinstance(value, str):
+        return value if value.strip() else _EMPTY
+    if isinstance(value, _NEVER_EMPTY):
+        return value
+    if isinstance(value, dict):
+        return _cow_dict(value, None)
+    if isinstance(value, list):
+        return _cow_list(value)
+    if isinstance(value, (tuple, set)) and not value:
+        return _EMPTY
+    return value
+
+def _cow_list(value: List[Any]) -> Any:
+    result: Optional[List[Any]] = None
+    for index, item in enumerate(value):
+        cleaned = _cow_value(item)
+        if result is None:
+            if cleaned is item:
+                continue
+            result = value[:index]
+        if cleaned is not _EMPTY:
+            result.append(cleaned)
+    if result is None:
+        return value if value else _EMPTY
+    return result if result else _EMPTY
+
+def _cow_dict(value: Dict[str, Any], plan: Optional[CleanPlan]) -> Any:
+    # Copy-on-write: the input dict is returned untouched unless something
+    # below it had to be dropped, so clean subtrees are shared, not rebuilt.
+    result: Optional[Dict[str, Any]] = None
+    for index, (key, item) in enumerate(value.items()):
+        if plan is not None and key in plan:
+            sub_plan = plan[key]
+            if sub_plan is None and (item is None or isinstance(item, _NEVER_EMPTY)):
+                # Scalar field: no container walk needed
+                cleaned = _EMPTY if item is None else item
+            elif sub_plan is not None and isinstance(item, dict):
+                cleaned = _cow_dict(item, sub_plan)
+            else:
+                cleaned = _cow_value(item)
+        else:
+            cleaned = _cow_value(item)
+
+        if result is None:
+            if cleaned is item:
+                continue
+            result = dict(islice(value.items(), index))
+        if cleaned is not _EMPTY:
+            result[key] = cleaned
+    if result is None:
+        return value if value else _EMPTY
+    return result if result else _EMPTY
+
+def clean_record(
+    record: Dict[str, Any],
+    strip_empty: bool = True,
+    plan: Optional[CleanPlan] = None,
+) -> Dict[str, Any]:
     """
     Recursively remove null/empty values from a record.
+
+    With strip_empty the record is cleaned copy-on-write, guided by ``plan``
+    (the data/schema.json plan by default): subtrees without empty values
+    are returned as-is rather than rebuilt.
     """
+    if strip_empty and isinstance(record, dict):
+        cleaned_cow = _cow_dict(record, load_clean_plan() if plan is None else plan)
+        if cleaned_cow is _EMPTY:
+            logger.debug("Record became empty after cleansing")
+            return {}
+        return cleaned_cow
+
     cleaned = _clean(record, strip_empty)
     if cleaned is None:
         logger.debug("Record became empty after cleansing")
@@ -58,4 +174,28 @@ def clean_record(record: Dict[str, Any], strip_empty: bool = True) -> Dict[str,
     if not isinstance(cleaned, dict):
         # Should not happen for records, but keep defensive.
         return {"value": cleaned}
-    return cleaned
\ No newline at end of file
+    return cleaned
+
+def iter_clean_records(
+    records: Iterable[Dict[str, Any]],
+    strip_empty: bool = True,
+    plan: Optional[CleanPlan] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily clean records, dropping those that end up empty.
+    """
+    plan = load_clean_plan() if plan is None else plan
+    for record in records:
+        cleaned = clean_record(record, strip_empty=strip_empty, plan=plan)
+        if cleaned:
+            yield cleaned
+
+def clean_records(
+    records: Iterable[Dict[str, Any]],
+    strip_empty: bool = True,
+    plan: Optional[CleanPlan] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Clean a whole batch of records, dropping those that end up empty.
+    """
+    return list(iter_clean_records(records, strip_empty=strip_empty, plan=plan))
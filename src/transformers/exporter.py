@@ -0,0 +1,403 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from extractors.utils import get_logger
+from transformers.data_cleanser import DEFAULT_SCHEMA_PATH
+
+try:  # pyarrow is optional; without it exports fall back to CSV
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = None  # type: ignore[assignment]
+    pq = None  # type: ignore[assignment]
+
+logger = get_logger("exporter")
+
+COLUMNAR_SUFFIXES = (".parquet", ".arrow", ".feather")
+
+# Rows per Parquet row group / Arrow record batch / CSV write
+ROW_GROUP_SIZE = 50_000
+
+# Column kinds are int64, float64, bool, string and json, which holds values
+# of mixed or nested types as JSON text. Every value of a json column is
+# encoded, strings too, so the string "5" ("\"5\"") stays apart from 5.
+_SCHEMA_KINDS = {"integer": "int64", "number": "float64", "boolean": "bool", "string": "string"}
+
+# Child table rows point back at their listing with these columns
+PARENT_COLUMNS = ("zpid", "position")
+
+_INVALID = object()
+
+def columnar_export_available() -> bool:
+    return pa is not None
+
+def schema_columns(schema: Mapping[str, Any]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Column kinds by dotted name for the scalar properties of a JSON schema,
+    nested objects included, plus the names of its array properties, which
+    are exported as child tables.
+    """
+    columns: Dict[str, str] = {}
+    lists: List[str] = []
+
+    def walk(properties: Mapping[str, Any], prefix: str) -> None:
+        for key, spec in properties.items():
+            name = prefix + key
+            types = spec.get("type")
+            types = set(types) if isinstance(types, list) else {types}
+            types.discard("null")
+            if "object" in types:
+                walk(spec.get("properties") or {}, name + ".")
+            elif "array" in types:
+                lists.append(name)
+            elif len(types) == 1 and next(iter(types)) in _SCHEMA_KINDS:
+                columns[name] = _SCHEMA_KINDS[next(iter(types))]
+            elif types == {"integer", "number"}:
+                columns[name] = "float64"
+            elif types:
+                columns[name] = "json"
+
+    walk(schema.get("properties") or {}, "")
+    return columns, lists
+
+def load_schema_columns(path: str = DEFAULT_SCHEMA_PATH) -> Tuple[Dict[str, str], List[str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return schema_columns(json.load(f))
+
+def flatten_record(record: Mapping[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """
+    Split a cleaned record into a flat row keyed by dotted names
+    (``price.value``, ``address.zipcode``) and its list values by name.
+    """
+    row: Dict[str, Any] = {}
+    lists: Dict[str, List[Any]] = {}
+
+    def walk(value: Mapping[str, Any], prefix: str) -> None:
+        for key, item in value.items():
+            name = prefix + key
+            if isinstance(item, dict):
+                walk(item, name + ".")
+            elif isinstance(item, list):
+                lists[name] = item
+            else:
+                row[name] = item
+
+    walk(record, "")
+    return row, lists
+
+def _flatten_item(item: Any) -> Dict[str, Any]:
+    if not isinstance(item, dict):
+        return {"value": item}
+    row, lists = flatten_record(item)
+    # Lists inside list items stay JSON text rather than becoming grandchildren
+    row.update(lists)
+    return row
+
+def infer_kind(values: Iterable[Any]) -> str:
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        kind = type(value)
+        if kind is bool:
+            kinds.add("bool")
+        elif kind is int:
+            kinds.add("int64")
+        elif kind is float:
+            kinds.add("float64")
+        elif kind is str:
+            kinds.add("string")
+        else:
+            return "json"
+    if not kinds:
+        return "string"
+    if len(kinds) == 1:
+        return kinds.pop()
+    return "float64" if kinds == {"int64", "float64"} else "json"
+
+def _coerce(value: Any, kind: str) -> Any:
+    if value is None:
+        return None
+    value_type = type(value)
+    if kind == "int64":
+        if value_type is int:
+            return value
+        if value_type is float and value.is_integer():
+            return int(value)
+    elif kind == "float64":
+        if value_type is float or value_type is int:
+            return float(value)
+    elif kind == "bool":
+        if value_type is bool:
+            return value
+    elif kind == "string":
+        if value_type is str:
+            return value
+        if value_type is int or value_type is float:
+            return str(value)
+    else:
+        return json.dumps(value)
+    return _INVALID
+
+def _widen(kind: str, value: Any) -> str:
+    """
+    The narrowest column kind holding both ``kind`` values and ``value``.
+    """
+    value_kind = infer_kind([value])
+    if value_kind == kind:
+        return kind
+    if {kind, value_kind} == {"int64", "float64"}:
+        return "float64"
+    return "json"
+
+class _Table(ABC):
+    """
+    One output table. Rows are spilled to a temporary file batch by batch
+    while the columns are settled: columns first seen in a later batch
+    are added, and a column holding a value its kind cannot represent is
+    widened (int64 to float64, anything else to json), so no value is lost.
+    close() writes the spilled batches, one row group each.
+    """
+
+    def __init__(self, path: str, columns: Mapping[str, str]) -> None:
+        self.path = path
+        self.columns: Dict[str, str] = dict(columns)
+        self.rows = 0
+        self._tmp_path = f"{path}.tmp"
+        self._spill_path = f"{path}.rows.tmp"
+        self._spill: Any = open(self._spill_path, "w", encoding="utf-8")
+        self._writer: Any = None
+        self._file: Any = None
+
+    def write_rows(self, rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        columns = self.columns
+        for row in rows:
+            for name, value in row.items():
+                kind = columns.get(name)
+                if value is None:
+                    # Keep the column's place; its kind waits for a value
+                    columns.setdefault(name, "")
+                elif not kind:
+                    columns[name] = infer_kind([value])
+                elif _coerce(value, kind) is _INVALID:
+                    columns[name] = _widen(kind, value)
+        self._spill.write(json.dumps(rows, separators=(",", ":")))
+        self._spill.write("\n")
+        self.rows += len(rows)
+
+    def _spilled(self) -> Iterator[List[Dict[str, Any]]]:
+        self._spill.close()
+        with open(self._spill_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def close(self) -> None:
+        for name, kind in self.columns.items():
+            if not kind:
+                self.columns[name] = "string"
+        self._open()
+        for rows in self._spilled():
+            columns: Dict[str, List[Any]] = {
+                name: [_coerce(row.get(name), kind) for row in rows] for name, kind in self.columns.items()
+            }
+            self._write_columns(columns, len(rows))
+        self._finish()
+        os.replace(self._tmp_path, self.path)
+        os.remove(self._spill_path)
+
+    def abort(self) -> None:
+        try:
+            self._finish()
+        except Exception:  # noqa: BLE001
+            pass
+        self._spill.close()
+        for path in (self._tmp_path, self._spill_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @abstractmethod
+    def _open(self) -> None:
+        """Create the temporary output file with the settled columns."""
+
+    @abstractmethod
+    def _write_columns(self, columns: Dict[str, List[Any]], count: int) -> None:
+        """Append ``count`` rows given as one value list per column."""
+
+    @abstractmethod
+    def _finish(self) -> None:
+        """Complete and close the temporary output file."""
+
+class _CsvTable(_Table):
+    def _open(self) -> None:
+        self._file = open(self._tmp_path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(list(self.columns))
+
+    def _write_columns(self, columns: Dict[str, List[Any]], count: int) -> None:
+        values = [
+            ["true" if v is True else "false" if v is False else v for v in column] if self.columns[name] == "bool" else column
+            for name, column in columns.items()
+        ]
+        self._writer.writerows(zip(*values))
+
+    def _finish(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class _ArrowTable(_Table):
+    def _arrow_schema(self) -> Any:
+        types = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(), "string": pa.string(), "json": pa.string()}
+        return pa.schema([(name, types[kind]) for name, kind in self.columns.items()])
+
+    def _open(self) -> None:
+        self._schema = self._arrow_schema()
+        if self.path.endswith(".parquet"):
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema)
+        else:
+            self._file = pa.OSFile(self._tmp_path, "wb")
+            self._writer = pa.ipc.new_file(self._file, self._schema)
+
+    def _write_columns(self, columns: Dict[str, List[Any]], count: int) -> None:
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns.values(), self._schema)]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+        if self.path.endswith(".parquet"):
+            # One row group per batch
+            self._writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._writer.write_batch(batch)
+
+    def _finish(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def export_path(path: str) -> str:
+    """
+    The path an export to ``path`` is written to: Parquet and Arrow
+    exports become CSV when pyarrow is not installed.
+    """
+    base, ext = os.path.splitext(path)
+    if ext in COLUMNAR_SUFFIXES and pa is None:
+        return f"{base}.csv"
+    return path
+
+class ColumnarExporter:
+    """
+    Writes cleaned records as typed columnar tables: Parquet (.parquet),
+    Arrow IPC (.arrow/.feather) or CSV (.csv, and the fallback for the
+    others without pyarrow).
+
+    Nested objects are flattened into dotted columns (``price.value``,
+    ``taxAssessment.taxAssessedValue``) typed from data/schema.json, with
+    the types of columns the schema does not describe inferred from their
+    values; a column whose values do not fit its type is widened rather
+    than nulled (see _Table). Lists such as schools and priceHistory become child
+    tables next to the main one (``listings.schools.parquet``) whose rows
+    carry the listing's zpid and their position in the list.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schema_path: Optional[str] = DEFAULT_SCHEMA_PATH,
+        row_group_size: int = ROW_GROUP_SIZE,
+    ) -> None:
+        self.path = export_path(path)
+        if self.path != path:
+            logger.warning("pyarrow is not installed; exporting to %s instead", self.path)
+        self.row_group_size = max(1, row_group_size)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.columns, self.list_columns = load_schema_columns(schema_path) if schema_path else ({}, [])
+        self.count = 0
+        self._table_type = _CsvTable if self.path.endswith(".csv") else _ArrowTable
+        self._main = self._table_type(self.path, self.columns)
+        self._children: Dict[str, _Table] = {}
+        self._rows: List[Dict[str, Any]] = []
+        self._child_rows: Dict[str, List[Dict[str, Any]]] = {}
+
+    @property
+    def paths(self) -> List[str]:
+        return [self._main.path] + [table.path for table in self._children.values()]
+
+    def child_path(self, name: str) -> str:
+        base, ext = os.path.splitext(self.path)
+        return f"{base}.{name}{ext}"
+
+    def write(self, record: Mapping[str, Any]) -> None:
+        row, lists = flatten_record(record)
+        self._rows.append(row)
+        for name, items in lists.items():
+            parent = (row.get("zpid"),)
+            rows = self._child_rows.setdefault(name, [])
+            for position, item in enumerate(items):
+                child = dict(zip(PARENT_COLUMNS, parent + (position,)))
+                child.update(_flatten_item(item))
+                rows.append(child)
+        self.count += 1
+        if len(self._rows) >= self.row_group_size:
+            self.flush()
+
+    def write_many(self, records: Iterable[Mapping[str, Any]]) -> int:
+        before = self.count
+        for record in records:
+            self.write(record)
+        return self.count - before
+
+    def observe(self, records: Iterable[Mapping[str, Any]]) -> Iterator[Mapping[str, Any]]:
+        """
+        Pass records through unchanged while exporting each one, so the
+        export rides along another writer.
+        """
+        for record in records:
+            self.write(record)
+            yield record
+
+    def _child(self, name: str) -> _Table:
+        table = self._children.get(name)
+        if table is None:
+            columns = {column: "int64" for column in PARENT_COLUMNS}
+            table = self._children[name] = self._table_type(self.child_path(name), columns)
+        return table
+
+    def flush(self) -> None:
+        self._main.write_rows(self._rows)
+        self._rows = []
+        for name, rows in self._child_rows.items():
+            self._child(name).write_rows(rows)
+        self._child_rows = {}
+
+    def close(self) -> None:
+        self.flush()
+        # The schema's lists always get a table, if only an empty one
+        for name in self.list_columns:
+            self._child(name)
+        for table in [self._main, *self._children.values()]:
+            table.close()
+        logger.info("Exported %d listings to %s", self.count, ", ".join(self.paths))
+
+    def abort(self) -> None:
+        for table in [self._main, *self._children.values()]:
+            table.abort()
+
+    def __enter__(self) -> "ColumnarExporter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
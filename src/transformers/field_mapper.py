@@ -1,49 +1,200 @@
-thonfrom __future__ import annotations
+from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, Mapping, Optional
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
 from extractors.utils import get_logger
 
 logger = get_logger("field_mapper")
 
-def _copy_included_fields(
-    record: Dict[str, Any],
-    include_fields: Optional[List[str]],
-) -> Dict[str, Any]:
-    if not include_fields:
-        # Copy everything
-        return dict(record)
-
-    result: Dict[str, Any] = {}
-    for field in include_fields:
-        if field in record:
-            result[field] = record[field]
-        else:
-            # Support simple dotted-path extraction for nested objects
-            parts = field.split(".")
-            current: Any = record
-            for part in parts:
-                if not isinstance(current, dict):
-                    current = None
-                    break
-                current = current.get(part)
-            if current is not None:
-                # Rebuild the nested structure under the same dotted path
-                target = result
-                for part in parts[:-1]:
-                    target = target.setdefault(part, {})
-                target[parts[-1]] = current
-    return result
-
-def _apply_field_mapping(
-    record: Dict[str, Any],
-    field_mapping: Mapping[str, str],
-) -> Dict[str, Any]:
-    # Only map top-level keys for simplicity; nested renames can be handled via dotted paths in include_fields.
-    for old, new in field_mapping.items():
-        if old in record:
-            record[new] = record.pop(old)
-    return record
+_MISSING = object()
+
+Path = Tuple[str, ...]
+
+class _Include:
+    """Copy one include_fields entry from the source record."""
+
+    __slots__ = ("field", "out", "path", "fetch")
+
+    def __init__(self, field: str) -> None:
+        self.field = field
+        self.out = field
+        self.path: Path = tuple(field.split("."))
+        self.fetch = _compile_fetch(self.path)
+
+def _compile_fetch(src: Path) -> Callable[[Dict[str, Any]], Any]:
+    if len(src) == 1:
+        key = src[0]
+        return lambda record: record.get(key, _MISSING)
+
+    def fetch(record: Dict[str, Any]) -> Any:
+        current: Any = record
+        for part in src:
+            if not isinstance(current, Mapping) or part not in current:
+                return _MISSING
+            current = current[part]
+        # Dotted include_fields only copy values that are set
+        return _MISSING if current is None else current
+
+    return fetch
+
+def _take(result: Dict[str, Any], old: str, path: Path) -> Any:
+    """
+    Remove ``old`` (a key, else a dotted path) from ``result`` and return its
+    value, or _MISSING. Nested dicts may be shared with the input record, so
+    the path is copied before anything is removed from it.
+    """
+    if old in result:
+        return result.pop(old)
+    if len(path) == 1:
+        return _MISSING
+    node: Any = result
+    for part in path[:-1]:
+        node = node.get(part)
+        if not isinstance(node, dict):
+            return _MISSING
+    if path[-1] not in node:
+        return _MISSING
+
+    parents = [result]
+    for part in path[:-1]:
+        child = dict(parents[-1][part])
+        parents[-1][part] = child
+        parents.append(child)
+    value = parents[-1].pop(path[-1])
+    # Drop the parents the move left empty
+    for depth in range(len(path) - 1, 0, -1):
+        if parents[depth]:
+            break
+        del parents[depth - 1][path[depth - 1]]
+    return value
+
+def _put(result: Dict[str, Any], new: str, path: Path, value: Any, index: int) -> Dict[str, Any]:
+    """
+    Set ``new`` (a key, else a dotted path) to ``value``. An existing key is
+    overwritten in place; a new top-level key is inserted at ``index``.
+    """
+    if new in result or len(path) == 1 and index >= len(result):
+        result[new] = value
+        return result
+    if path[0] in result:
+        target = result
+        for part in path[:-1]:
+            child = target.get(part)
+            child = dict(child) if isinstance(child, dict) else {}
+            target[part] = child
+            target = child
+        target[path[-1]] = value
+        return result
+
+    for part in reversed(path[1:]):
+        value = {part: value}
+    items = list(result.items())
+    items.insert(index, (path[0], value))
+    return dict(items)
+
+class ProjectionPlan:
+    """
+    include_fields and field_mapping compiled once for many records.
+
+    The include step copies each field, rebuilding dotted paths, unless the
+    record has the dotted name as a key of its own. Renames then run in
+    mapping order on the result, so a renamed value overwrites an existing
+    target key and chains such as a -> b, b -> c move the value twice.
+    Either side of a rename may be a dotted path (``price.value`` ->
+    ``priceUsd``); a renamed key keeps the position of its source.
+    """
+
+    def __init__(
+        self,
+        include_fields: Optional[List[str]] = None,
+        field_mapping: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self._includes = [_Include(field) for field in include_fields or []]
+        paths = [include.path for include in self._includes]
+        # Whether one include nests inside another, whose value may be a
+        # dict shared with the input record
+        self._overlapping = any(a != b and b[: len(a)] == a for a in paths for b in paths)
+        self._renames: List[Tuple[str, Path, str, Path]] = [
+            (old, tuple(old.split(".")), new, tuple(new.split("."))) for old, new in (field_mapping or {}).items()
+        ]
+
+        # A plain rename of an included field that nothing else reads or
+        # writes cannot collide; copy that field under its new name directly
+        fields = {include.field for include in self._includes}
+        tops = {path[0] for path in paths}
+        names = Counter(name for old, _, new, _ in self._renames for name in (old, new))
+        direct = {
+            old: new
+            for old, old_path, new, new_path in self._renames
+            if len(old_path) == len(new_path) == 1
+            and old in fields
+            and new not in tops
+            and names[old] == names[new] == 1
+        }
+        for include in self._includes:
+            include.out = direct.get(include.field, include.field)
+        self._renames = [rename for rename in self._renames if rename[0] not in direct]
+
+    def _include(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        if not self._includes:
+            return dict(record)
+        result: Dict[str, Any] = {}
+        for include in self._includes:
+            field = include.field
+            if field in record:
+                result[include.out] = record[field]
+                continue
+            value = include.fetch(record)
+            if value is _MISSING:
+                continue
+            path = include.path
+            target = result
+            for part in path[:-1]:
+                child = target.get(part)
+                if not isinstance(child, dict):
+                    child = {}
+                    target[part] = child
+                elif self._overlapping:
+                    # Never write into a dict copied from the input record
+                    child = dict(child)
+                    target[part] = child
+                target = child
+            target[path[-1]] = value
+        return result
+
+    def apply(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        result = self._include(record)
+        for old, old_path, new, new_path in self._renames:
+            anchor = old if old in result else old_path[0]
+            if anchor not in result:
+                continue
+            index = list(result).index(anchor)
+            value = _take(result, old, old_path)
+            if value is _MISSING:
+                continue
+            # Insert a new key where its source was, or right after the
+            # source's parent when that is still there
+            result = _put(result, new, new_path, value, index + (anchor in result))
+        return result
+
+def compile_projection(
+    include_fields: Optional[List[str]] = None,
+    field_mapping: Optional[Mapping[str, str]] = None,
+) -> ProjectionPlan:
+    return ProjectionPlan(include_fields, field_mapping)
+
+def iter_mapped_fields(
+    records: Iterable[Dict[str, Any]],
+    field_mapping: Optional[Mapping[str, str]] = None,
+    include_fields: Optional[List[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily apply include/exclude logic and optional renaming to records.
+    """
+    plan = compile_projection(include_fields, field_mapping)
+    for record in records:
+        yield plan.apply(record)
 
 def map_fields(
     records: Iterable[Dict[str, Any]],
@@ -53,12 +204,7 @@ def map_fields(
     """
     Apply include/exclude logic and optional renaming to a list of records.
     """
-    mapped_records: List[Dict[str, Any]] = []
-    for record in records:
-        base = _copy_included_fields(record, include_fields)
-        if field_mapping:
-            base = _apply_field_mapping(base, field_mapping)
-        mapped_records.append(base)
+    mapped_records = list(iter_mapped_fields(records, field_mapping, include_fields))
 
     logger.info(
         "Mapped %d records (include_fields=%s, field_mapping_keys=%s)",
@@ -66,4 +212,4 @@ def map_fields(
         include_fields or "all",
         list(field_mapping.keys()) if field_mapping else [],
     )
-    return mapped_records
\ No newline at end of file
+    return mapped_records
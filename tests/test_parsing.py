@@ -1,5 +1,10 @@
-thonimport json
+import collections
+import csv
+import gzip
+import json
+import logging
 import os
+import pickle
 import sys
 from typing import Any, Dict, List
 
@@ -9,11 +14,24 @@ import pytest
 TEST_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_ROOT = os.path.dirname(TEST_DIR)
 SRC_DIR = os.path.join(PROJECT_ROOT, "src")
-if SRC_DIR not in sys.path:
-    sys.path.insert(0, SRC_DIR)
+BENCH_DIR = os.path.join(PROJECT_ROOT, "benchmarks")
+for path in (SRC_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
 
-from extractors.property_parser import parse_property_listings  # type: ignore  # noqa: E402
-from extractors.utils import load_json_file  # type: ignore  # noqa: E402
+from extractors.dead_letter import DeadLetterWriter  # type: ignore  # noqa: E402
+from extractors.dedupe import BloomFilter, ZpidSet, dedupe_listings  # type: ignore  # noqa: E402
+from extractors.property_parser import ShapeCache, parse_property_listings, projection_for  # type: ignore  # noqa: E402
+from extractors.sources import expand_inputs, iter_input_records, load_inputs  # type: ignore  # noqa: E402
+from extractors.utils import (  # type: ignore  # noqa: E402
+    iter_json_records,
+    load_json_file,
+    save_json_file,
+    write_json_records,
+)
+from extractors.writers import RecordWriter, write_records  # type: ignore  # noqa: E402
+from transformers.exporter import ColumnarExporter  # type: ignore  # noqa: E402
+from synthetic import generate_listings  # type: ignore  # noqa: E402
 
 def _load_sample_input() -> List[Dict[str, Any]]:
     data_path = os.path.join(PROJECT_ROOT, "data", "inputs.sample.json")
@@ -65,4 +83,280 @@ def test_address_fields_present(index: int) -> None:
     assert addr["streetAddress"]
     assert addr["city"]
     assert addr["state"]
-    assert addr["zipcode"]
\ No newline at end of file
+    assert addr["zipcode"]
+
+def test_synthetic_listings_parse_except_malformed() -> None:
+    clean = list(generate_listings(300, seed=7, malformed_rate=0.0))
+    assert clean == list(generate_listings(300, seed=7, malformed_rate=0.0))
+    parsed = parse_property_listings(clean)
+    assert len(parsed) == len(clean)
+    assert all(r["address"]["city"] and r["bedrooms"] is not None for r in parsed)
+
+    mixed = list(generate_listings(300, seed=7, malformed_rate=0.2))
+    assert len(parse_property_listings(mixed)) < len(mixed)
+
+def test_malformed_listings_go_to_dead_letter_with_one_summary(tmp_path: Any, caplog: Any) -> None:
+    raw = _load_sample_input()[:2] + [None, "listing", {"price": 100000, "beds": 3}]
+    path = str(tmp_path / "rejects.ndjson")
+
+    with caplog.at_level(logging.WARNING), DeadLetterWriter(path) as dead_letter:
+        parsed = parse_property_listings(raw, dead_letter=dead_letter)
+
+    assert len(parsed) == 2
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [(e["reason"], e["index"]) for e in entries] == [("non_dict", 2), ("non_dict", 3), ("missing_zpid", 4)]
+    assert entries[2]["record"] == raw[4]
+    warnings = [r.getMessage() for r in caplog.records if r.levelno >= logging.WARNING]
+    assert warnings == ["Skipped 3 malformed listings (missing_zpid=1, non_dict=2)"]
+
+def test_zpid_set_and_bloom_filter_track_membership() -> None:
+    values = [10_000_000 + i * 37 for i in range(20000)] + [-5, 2**70]
+    exact, bloom = ZpidSet(16), BloomFilter(len(values), 0.01)
+    assert all(exact.add(v) for v in values)
+    assert not any(exact.add(v) for v in values)
+    assert len(exact) == len(values) and all(v in exact for v in values)
+    assert 10_000_001 not in exact
+
+    for v in values:
+        bloom.add(v)
+    assert all(v in bloom for v in values)
+    false_positives = sum(v in bloom for v in range(1, 20001))
+    assert false_positives < 20000 * 0.03
+
+@pytest.mark.parametrize("membership", ["exact", "bloom"])
+def test_dedupe_merges_duplicate_zpids_keeping_the_freshest(membership: str) -> None:
+    old = {"zpid": 1, "price": 300000, "priceHistory": [{"date": "2020-01-01", "event": "Sold", "price": 250000}]}
+    new = {"id": 1, "price": 320000, "priceHistory": [{"date": "2024-05-01", "event": "Listed for sale", "price": 320000}]}
+    raw = [old, {"zpid": 2, "price": 1}, new, {"zpid": 3, "price": 2}, dict(old)]
+    listings = parse_property_listings(raw, compact=True)
+
+    deduped = dedupe_listings(listings, membership=membership, error_rate=0.5)
+
+    assert [r["zpid"] for r in deduped] == [1, 2, 3]
+    assert deduped[0]["price"] == {"value": 320000}
+    assert [e["date"] for e in deduped[0]["priceHistory"]] == ["2024-05-01", "2020-01-01"]
+    assert deduped[1] is listings[1]
+
+@pytest.mark.parametrize("fields", [None, projection_for(["price.value", "address.city", "taxAssessment"])])
+def test_shape_specialized_normalizers_match_the_generic_path(fields: Any) -> None:
+    raw = [r for r in generate_listings(400, seed=21, malformed_rate=0.05) if isinstance(r, dict)]
+    # Falsy and mistyped values exercise every fallback of the alias chains
+    odd = [None, 0, "", [], {}, "12", 2.5, {"value": 5}, {"street": "", "zip": "9"}]
+    raw += [{**record, key: odd[i % len(odd)]} for i, record in enumerate(raw[:200]) for key in list(record)[i % 3 :: 5]]
+    raw = raw * 2
+
+    cache = ShapeCache(max_shapes=10_000)
+    generic = parse_property_listings(raw, fields=fields, specialize=False)
+    specialized = []
+    for record in raw:
+        try:
+            specialized.append(cache.normalize(record, fields))
+        except Exception:  # noqa: BLE001
+            continue
+    specialized = [norm for norm in specialized if norm["zpid"] is not None]
+    assert json.dumps(specialized) == json.dumps(generic)
+    stats = cache.stats()
+    assert stats["misses"] == stats["shapes"] and stats["hits"] >= len(raw) // 2
+    assert parse_property_listings(raw, fields=fields) == generic
+
+def test_projection_skips_unrequested_sections() -> None:
+    raw = _load_sample_input()
+    fields = projection_for(["price.value", "address.zipcode", "schools[*].rating"])
+    full = parse_property_listings(raw)
+    projected = parse_property_listings(raw, fields=fields)
+
+    assert set(projected[0]) == {"zpid", "price", "address", "schools"}
+    for full_record, projected_record in zip(full, projected):
+        for key, value in projected_record.items():
+            assert full_record[key] == value
+
+@pytest.mark.parametrize("specialize", [True, False])
+def test_projection_skips_the_same_malformed_records(specialize: bool) -> None:
+    raw = [
+        {"zpid": 1, "price": 100, "address": "12 Main St"},
+        {"zpid": 2, "price": 5, "taxAssessment": "n/a"},
+        {"zpid": 3, "price": 7, "bedrooms": float("inf"), "address": {"city": "X"}},
+        {"price": 9},
+        "not a listing",
+    ]
+    counts = {}
+    kept = {}
+    for fields in (None, projection_for(["zpid", "price.value"]), projection_for(["bedrooms"])):
+        skipped: Any = collections.Counter()
+        kept[fields] = [r["zpid"] for r in parse_property_listings(raw, fields=fields, skipped=skipped, specialize=specialize)]
+        counts[fields] = skipped
+
+    assert set(map(tuple, kept.values())) == {(3,)}
+    assert all(c == {"normalize_error": 2, "missing_zpid": 1, "non_dict": 1} for c in counts.values())
+
+def test_compact_listings_expand_to_normalized_dicts() -> None:
+    raw = _load_sample_input()
+    full = parse_property_listings(raw)
+    compact = parse_property_listings(raw, compact=True)
+
+    assert [listing.to_dict() for listing in compact] == full
+    assert pickle.loads(pickle.dumps(compact)) == full
+    assert compact[0]["address"]["city"] == full[0]["address"]["city"]
+    assert compact[0].get("missing") is None
+    with pytest.raises(AttributeError):
+        compact[0].zpid = 1  # type: ignore[misc]
+
+@pytest.mark.parametrize("chunk_size", [7, 1 << 16])
+def test_iter_json_records_reads_arrays_and_ndjson(tmp_path: Any, chunk_size: int) -> None:
+    raw = _load_sample_input()
+    array_path = tmp_path / "input.json"
+    array_path.write_text(json.dumps(raw, indent=2), encoding="utf-8")
+    ndjson_path = tmp_path / "input.ndjson"
+    ndjson_path.write_text("\n".join(json.dumps(r) for r in raw) + "\n", encoding="utf-8")
+
+    assert list(iter_json_records(str(array_path), chunk_size=chunk_size)) == raw
+    assert list(iter_json_records(str(ndjson_path), chunk_size=chunk_size)) == raw
+
+    # No more lenient than json.load about commas
+    for text, items in (("[]", []), (" [ ] ", []), ("[1 , 2]", [1, 2]), ("[[1,2],{}]", [[1, 2], {}])):
+        array_path.write_text(text, encoding="utf-8")
+        assert list(iter_json_records(str(array_path), chunk_size=chunk_size)) == items == json.loads(text)
+    for text in ("[1,,2]", "[,1]", "[1,]", "[,]", "[1 2]", "[1"):
+        array_path.write_text(text, encoding="utf-8")
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_records(str(array_path), chunk_size=chunk_size))
+
+def test_records_spanning_many_chunks_are_not_decoded_per_chunk(tmp_path: Any, monkeypatch: Any) -> None:
+    heavy = {"zpid": 1, "photos": [{"url": f"https://photos.example/{i}.jpg"} for i in range(20000)]}
+    path = tmp_path / "heavy.json"
+    path.write_text(json.dumps([heavy, {"zpid": 2}, heavy]), encoding="utf-8")
+
+    attempts = []
+    raw_decode = json.JSONDecoder.raw_decode
+    monkeypatch.setattr(json.JSONDecoder, "raw_decode", lambda self, s, idx=0: attempts.append(idx) or raw_decode(self, s, idx))
+    assert list(iter_json_records(str(path), chunk_size=64)) == [heavy, {"zpid": 2}, heavy]
+    # ~12k chunks of 64 characters, but only a logarithmic number of retries
+    assert len(attempts) < 60
+
+@pytest.mark.parametrize("mmap_threshold", [0, 1])
+def test_inputs_expand_from_directories_and_globs_in_order(tmp_path: Any, mmap_threshold: int) -> None:
+    raw = _load_sample_input()
+    nested = tmp_path / "scrapes" / "b"
+    nested.mkdir(parents=True)
+    (tmp_path / "scrapes" / "a.json").write_text(json.dumps(raw[:2], indent=2), encoding="utf-8")
+    with gzip.open(nested / "c.ndjson.gz", "wt", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps(r) for r in raw[2:]) + "\n")
+    (nested / "notes.txt").write_text("not listings", encoding="utf-8")
+
+    from_dir = expand_inputs([str(tmp_path / "scrapes")])
+    assert [os.path.basename(p) for p in from_dir] == ["a.json", "c.ndjson.gz"]
+    assert expand_inputs([str(tmp_path / "scrapes" / "**" / "*.*json*"), *from_dir]) == from_dir
+    with pytest.raises(FileNotFoundError):
+        expand_inputs([str(tmp_path / "missing-*.json")])
+
+    # A threshold of 1 byte memory-maps every uncompressed file
+    for workers in (1, 2):
+        assert load_inputs(from_dir, workers=workers, mmap_threshold=mmap_threshold) == raw
+    assert list(iter_input_records(from_dir, chunk_size=7)) == raw
+
+def test_write_json_records_matches_save_json_file(tmp_path: Any) -> None:
+    parsed = parse_property_listings(_load_sample_input())
+    for pretty in (True, False):
+        expected = tmp_path / "expected.json"
+        streamed = tmp_path / "streamed.json"
+        save_json_file(str(expected), parsed, pretty=pretty)
+        count = write_json_records(str(streamed), iter(parsed), pretty=pretty)
+        assert count == len(parsed)
+        assert streamed.read_bytes() == expected.read_bytes()
+
+def test_partitioned_writers_split_output_by_field(tmp_path: Any) -> None:
+    parsed = parse_property_listings(list(generate_listings(500, seed=3, malformed_rate=0.0)))
+    for record in parsed[::7]:
+        record["address"]["state"] = None
+    expected = tmp_path / "expected.json"
+    save_json_file(str(expected), parsed, pretty=True)
+    assert write_records(str(tmp_path / "all.json"), parsed) == len(parsed)
+    assert (tmp_path / "all.json").read_bytes() == expected.read_bytes()
+
+    count = write_records(str(tmp_path / "out.ndjson.gz"), iter(parsed), partition_by="address.state", writer_threads=3)
+    assert count == len(parsed)
+    states = {r["address"]["state"] or "unknown" for r in parsed}
+    assert sorted(os.listdir(tmp_path / "out")) == sorted(f"{state}.ndjson.gz" for state in states)
+    for state in states:
+        with gzip.open(tmp_path / "out" / f"{state}.ndjson.gz", "rt", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        assert rows == [r for r in parsed if (r["address"]["state"] or "unknown") == state]
+
+    # A rerun replaces the partitions of the earlier run, and values that
+    # sanitize to the same name, or to the missing-value name, stay apart
+    stale = [{"zpid": 1, "address": {"state": state}} for state in ("N/Y", "N Y", "unknown", None, "NY")]
+    assert write_records(str(tmp_path / "out.ndjson.gz"), stale, partition_by="address.state") == len(stale)
+    names = sorted(os.listdir(tmp_path / "out"))
+    assert len(names) == len(stale) and "NY.ndjson.gz" in names and "unknown.ndjson.gz" in names
+    assert sum(name.startswith("N_Y-") for name in names) == 2 and any(name.startswith("unknown-") for name in names)
+
+    # A failed write leaves neither the file nor its temporary behind
+    with pytest.raises(TypeError):
+        with RecordWriter(str(tmp_path / "failed.json")) as writer:
+            writer.write_many([parsed[0], object()])
+    assert not any(name.startswith("failed") for name in os.listdir(tmp_path))
+
+@pytest.mark.parametrize("suffix", [".json", ".ndjson.gz"])
+def test_partitions_beyond_the_open_file_limit_are_reopened(tmp_path: Any, monkeypatch: Any, suffix: str) -> None:
+    resource = pytest.importorskip("resource")
+    # Small batches so every partition is written to, evicted and reopened
+    monkeypatch.setattr("extractors.writers.PARTITION_BATCH", 4)
+    records = [{"zpid": i, "address": {"zipcode": f"{i % 300:05d}"}} for i in range(3000)]
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    # Far fewer descriptors than partitions, with room for what pytest holds
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(128, hard), hard))
+    try:
+        count = write_records(
+            str(tmp_path / f"out{suffix}"),
+            iter(records),
+            partition_by="address.zipcode",
+            writer_threads=3,
+            max_open_files=16,
+        )
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    assert count == len(records)
+
+    names = sorted(os.listdir(tmp_path / "out"))
+    assert names == sorted(f"{i:05d}{suffix}" for i in range(300))
+    for name in names:
+        path = str(tmp_path / "out" / name)
+        rows = list(iter_input_records([path]))
+        assert rows == [r for r in records if r["address"]["zipcode"] == name[:5]]
+
+def _read_table(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as f:
+            return list(csv.DictReader(f))
+    pq = pytest.importorskip("pyarrow.parquet")
+    return pq.read_table(path).to_pylist()
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_columnar_export_flattens_listings_into_typed_tables(tmp_path: Any, suffix: str) -> None:
+    if suffix == ".parquet":
+        pytest.importorskip("pyarrow")
+    records = load_json_file(os.path.join(PROJECT_ROOT, "data", "example_output.json"))
+    late = {"note": "late column", "bedrooms": 2.5, "taxAssessment": {"taxAssessedValue": "173826"}}
+    records = [*records, {**records[0], "zpid": 1, "address": {"zipcode": 13203}, **late}]
+
+    with ColumnarExporter(str(tmp_path / f"listings{suffix}"), row_group_size=2) as exporter:
+        assert list(exporter.observe(iter(records))) == records
+
+    rows = _read_table(str(tmp_path / f"listings{suffix}"))
+    assert len(rows) == 3
+    assert list(rows[0])[:3] == ["zpid", "price.value", "address.streetAddress"]
+    # The schema types address.zipcode as a string, even when the value is a number
+    assert [str(r["address.zipcode"]) for r in rows] == ["13203", "12207", "13203"]
+    # Columns first seen in the last row group are kept, earlier rows empty
+    assert [r["note"] or None for r in rows] == [None, None, "late column"]
+    # Values their column type cannot hold widen the column instead of becoming null
+    assert [float(r["bedrooms"]) for r in rows] == [float(r["bedrooms"]) for r in records]
+    # A widened json column encodes every value, so "5" and 5 stay apart
+    assessed = [r["taxAssessment"]["taxAssessedValue"] for r in records]
+    assert [json.loads(r["taxAssessment.taxAssessedValue"]) for r in rows] == assessed
+
+    schools = _read_table(str(tmp_path / f"listings.schools{suffix}"))
+    expected = [(r["zpid"], i, school["name"]) for r in records for i, school in enumerate(r["schools"])]
+    assert [(int(s["zpid"]), int(s["position"]), s["name"]) for s in schools] == expected
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
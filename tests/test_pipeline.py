@@ -0,0 +1,519 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import Request, urlopen
+
+import pytest
+
+# Ensure src directory is on sys.path
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(TEST_DIR)
+SRC_DIR = os.path.join(PROJECT_ROOT, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from extractors.dead_letter import RejectBuffer  # type: ignore  # noqa: E402
+from extractors.fetcher import iter_fetched_listings  # type: ignore  # noqa: E402
+from extractors.filters import apply_filters  # type: ignore  # noqa: E402
+from extractors.lazy_sections import LAZY_SECTIONS, SourceSpan, iter_spans, materialize_sections  # type: ignore  # noqa: E402
+from extractors.listing import as_dict  # type: ignore  # noqa: E402
+from extractors.property_parser import iter_property_listings, parse_property_listings  # type: ignore  # noqa: E402
+from extractors.utils import write_json_records  # type: ignore  # noqa: E402
+from pipeline.checkpoint import CheckpointError, run_checkpointed_pipeline  # type: ignore  # noqa: E402
+from pipeline.incremental import IncrementalState, run_incremental_pipeline  # type: ignore  # noqa: E402
+from pipeline.metrics import RunMetrics  # type: ignore  # noqa: E402
+from pipeline.parallel import run_sharded_pipeline  # type: ignore  # noqa: E402
+from pipeline.profiles import Profile, load_profiles, profile_output_path, run_profiles  # type: ignore  # noqa: E402
+from pipeline.server import QueryError, QueryService, make_server, normalize_query  # type: ignore  # noqa: E402
+from transformers.aggregator import Aggregator, QuantileSketch  # type: ignore  # noqa: E402
+from transformers.data_cleanser import clean_record  # type: ignore  # noqa: E402
+from transformers.field_mapper import map_fields  # type: ignore  # noqa: E402
+
+FILTER_OPTIONS: Dict[str, Any] = {
+    "min_price": 150000,
+    "max_price": 900000,
+    "min_bedrooms": 2,
+    "sort_by": "price.value",
+    "order": "asc",
+    "limit": 25,
+}
+
+TRANSFORM_OPTIONS: Dict[str, Any] = {
+    "field_mapping": {"livingArea": "livingAreaSqFt"},
+    "include_fields": ["zpid", "price", "bedrooms", "livingArea"],
+    "strip_empty": True,
+}
+
+def _raw_listings(count: int) -> List[Any]:
+    raw: List[Any] = []
+    for i in range(count):
+        # Few distinct prices so the merge has plenty of ties to preserve
+        raw.append(
+            {
+                "id": 1000 + i,
+                "price": 100000 + (i * 7919 % 9) * 100000,
+                "beds": i % 5,
+                "area": 1000 + i,
+            }
+        )
+    raw.extend(["not-a-dict", {"price": 300000}])
+    return raw
+
+def _sequential(raw: List[Any], filter_options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    filtered = apply_filters(parse_property_listings(raw), **filter_options)
+    mapped = map_fields(
+        filtered,
+        field_mapping=TRANSFORM_OPTIONS["field_mapping"],
+        include_fields=TRANSFORM_OPTIONS["include_fields"],
+    )
+    return [r for r in (clean_record(m) for m in mapped) if r]
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("limit", [25, None])
+def test_sharded_pipeline_matches_sequential(order: str, limit: Any) -> None:
+    raw = _raw_listings(200)
+    filter_options = dict(FILTER_OPTIONS, order=order, limit=limit)
+
+    expected = _sequential(raw, filter_options)
+    result = run_sharded_pipeline(raw, filter_options, TRANSFORM_OPTIONS, workers=2)
+
+    assert result == expected
+
+def _interrupted(raw: List[Any], after: int) -> Iterator[Any]:
+    for i, record in enumerate(raw):
+        if i == after:
+            raise KeyboardInterrupt
+        yield record
+
+@pytest.mark.parametrize("sort_by,limit", [("price.value", 25), ("price.value", None), ("", 25), ("", None)])
+def test_checkpointed_run_resumes_to_identical_output(tmp_path: Any, sort_by: str, limit: Any) -> None:
+    raw = _raw_listings(200)
+    filter_options = dict(FILTER_OPTIONS, sort_by=sort_by, order="desc", limit=limit)
+    expected_path = str(tmp_path / "expected.json")
+    write_json_records(expected_path, _sequential(raw, filter_options))
+    expected_rejects = RejectBuffer()
+    expected_aggregate = Aggregator()
+    expected_aggregate.update(parse_property_listings(raw, dead_letter=expected_rejects))
+
+    output_path = str(tmp_path / "output.json")
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    dead_letter, aggregator = RejectBuffer(), Aggregator()
+
+    def run(listings: Any, source: Any = "input-v1") -> int:
+        return run_checkpointed_pipeline(
+            listings,
+            filter_options,
+            TRANSFORM_OPTIONS,
+            output_path,
+            checkpoint_dir,
+            source=source,
+            resume=True,
+            chunk_size=30,
+            dead_letter=dead_letter,
+            aggregator=aggregator,
+        )
+
+    for after in (75, 130):
+        # Records read after the last commit are read again on resume
+        with pytest.raises(KeyboardInterrupt):
+            run(_interrupted(raw, after))
+    with pytest.raises(CheckpointError):
+        run(raw, source="input-v2")
+    count = run(raw)
+
+    with open(output_path, "rb") as result, open(expected_path, "rb") as expected:
+        assert result.read() == expected.read()
+    assert count == len(_sequential(raw, filter_options))
+    assert dead_letter.entries == expected_rejects.entries
+    assert aggregator.report() == expected_aggregate.report()
+    assert not os.path.exists(checkpoint_dir)
+
+def test_incremental_pipeline_reports_delta_and_matches_full_run(tmp_path: Any) -> None:
+    state_path = str(tmp_path / "state.db")
+    first = _raw_listings(50)
+    with IncrementalState(state_path) as state:
+        result, delta = run_incremental_pipeline(first, FILTER_OPTIONS, TRANSFORM_OPTIONS, state)
+    assert result == _sequential(first, FILTER_OPTIONS)
+    assert len(delta["added"]) == 50
+
+    second = [dict(r) for r in first[:40] if isinstance(r, dict)]
+    second[0]["price"] = 450000
+    second.append({"id": 5000, "price": 300000, "beds": 3})
+    with IncrementalState(state_path) as state:
+        result, delta = run_incremental_pipeline(second, FILTER_OPTIONS, TRANSFORM_OPTIONS, state)
+    assert result == _sequential(second, FILTER_OPTIONS)
+    assert delta == {"added": [5000], "changed": [1000], "removed": list(range(1040, 1050))}
+
+def test_unchanged_incremental_rerun_hashes_source_bytes_and_normalizes_only_eager_sections(tmp_path: Any) -> None:
+    state_path = str(tmp_path / "state.db")
+    path = tmp_path / "input.json"
+    raw = _raw_listings(50)
+    path.write_text(json.dumps(raw, indent=2), encoding="utf-8")
+    eager = frozenset({"zpid", "price", "bedrooms"})
+
+    def run(transform_options: Dict[str, Any]) -> Any:
+        dead_letter = RejectBuffer()
+        with IncrementalState(state_path) as state:
+            records, digests = state.read([str(path)])
+            result, delta = run_incremental_pipeline(
+                records, FILTER_OPTIONS, transform_options, state, dead_letter=dead_letter, digests=digests, eager=eager
+            )
+        expected = map_fields(
+            apply_filters(parse_property_listings(raw), **FILTER_OPTIONS),
+            field_mapping=transform_options["field_mapping"],
+            include_fields=transform_options["include_fields"],
+        )
+        assert result == [clean_record(record) for record in expected]
+        assert len(dead_letter.entries) == 2
+        return delta
+
+    assert len(run(TRANSFORM_OPTIONS)["added"]) == 50
+    # Cached outputs are reused; a new transform completes unchanged survivors
+    assert run(TRANSFORM_OPTIONS) == {"added": [], "changed": [], "removed": []}
+    assert run({**TRANSFORM_OPTIONS, "include_fields": []}) == {"added": [], "changed": [], "removed": []}
+
+    # Reformatting the file changes every record's source bytes
+    path.write_text(json.dumps(raw), encoding="utf-8")
+    assert len(run(TRANSFORM_OPTIONS)["changed"]) == 50
+
+def test_unchanged_listings_that_no_longer_parse_fall_back_to_full_normalization(
+    tmp_path: Any, monkeypatch: Any, caplog: Any
+) -> None:
+    state_path = str(tmp_path / "state.db")
+    raw = _raw_listings(50)
+    eager = frozenset({"zpid", "price", "bedrooms"})
+    with IncrementalState(state_path) as state:
+        run_incremental_pipeline(raw, FILTER_OPTIONS, TRANSFORM_OPTIONS, state, eager=eager)
+
+    # A parser that now rejects one of the unchanged listings
+    parse = parse_property_listings
+    monkeypatch.setattr("pipeline.incremental.parse_property_listings", lambda *args, **kwargs: parse(*args, **kwargs)[1:])
+    with caplog.at_level("WARNING"), IncrementalState(state_path) as state:
+        result, delta = run_incremental_pipeline(raw, FILTER_OPTIONS, TRANSFORM_OPTIONS, state, eager=eager)
+    assert result == _sequential(raw, FILTER_OPTIONS)
+    assert delta == {"added": [], "changed": [], "removed": []}
+    assert "no longer parse" in caplog.text
+
+@pytest.mark.parametrize("suffix", [".json", ".ndjson"])
+def test_deferred_sections_are_only_read_back_for_survivors(tmp_path: Any, suffix: str) -> None:
+    raw = _raw_listings(60)
+    for i, record in enumerate(raw[:60]):
+        record["photos"] = [{"url": f"https://photos.example/{i}/{n}.jpg", "caption": "Façade"} for n in range(i % 4)]
+        record["priceHistory"] = [{"date": "2024-01-0%d" % (1 + i % 9), "price": record["price"]}]
+    path = tmp_path / f"input{suffix}"
+    if suffix == ".json":
+        path.write_text(json.dumps(raw, indent=2, ensure_ascii=False), encoding="utf-8")
+    else:
+        path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in raw) + "\n", encoding="utf-8")
+
+    options = {**FILTER_OPTIONS, "limit": 10}
+    eager = apply_filters(parse_property_listings(raw, compact=True), **options)
+    deferred = frozenset(LAZY_SECTIONS)
+    lazy = apply_filters(parse_property_listings(iter_spans([str(path)], chunk_size=64), compact=True, deferred=deferred), **options)
+    assert all(type(listing["photos"]) is SourceSpan for listing in lazy)
+
+    materialized = materialize_sections(lazy)
+    assert [list(record) for record in materialized] == [list(as_dict(listing)) for listing in eager]
+    assert materialized == [as_dict(listing) for listing in eager]
+
+def test_run_metrics_time_stages_and_count_skips(tmp_path: Any) -> None:
+    metrics = RunMetrics()
+    raw = _raw_listings(100)
+    with metrics.stage("read", len(raw)) as stage:
+        stage.records_out = len(raw)
+
+    parsed = metrics.track("parse", iter_property_listings(raw, skipped=metrics.counters))
+    filtered = metrics.track("filter", (r for r in parsed if r["bedrooms"]))
+    with metrics.stage("write") as stage:
+        stage.records_out = sum(1 for _ in filtered)
+    metrics.finish_tracked(len(raw), consumer="write")
+
+    stages = metrics.to_dict()["stages"]
+    assert [(stages[s]["records_in"], stages[s]["records_out"]) for s in ("read", "parse", "filter", "write")] == [
+        (102, 102),
+        (102, 100),
+        (100, 80),
+        (80, 80),
+    ]
+    assert all(stage["wall_seconds"] >= 0 for stage in stages.values())
+    assert metrics.counters == {"non_dict": 1, "missing_zpid": 1}
+
+    prom_path = tmp_path / "metrics.prom"
+    metrics.write_prometheus(str(prom_path))
+    text = prom_path.read_text()
+    assert '# TYPE zillow_explorer_stage_wall_seconds gauge' in text
+    assert 'zillow_explorer_stage_records_out{stage="filter"} 80' in text
+    assert 'zillow_explorer_events_total{event="missing_zpid"} 1' in text
+
+def test_stage_memory_separates_the_stage_peak_from_the_process_peak() -> None:
+    metrics = RunMetrics()
+    tracemalloc.start()
+    try:
+        with metrics.stage("large"):
+            block = bytearray(32 << 20)
+            del block
+        with metrics.stage("small"):
+            block = bytearray(1 << 20)
+            del block
+    finally:
+        tracemalloc.stop()
+
+    stages = metrics.to_dict()["stages"]
+    assert stages["small"]["peak_traced_bytes"] < (8 << 20) < stages["large"]["peak_traced_bytes"]
+    if stages["large"]["process_peak_rss_bytes"] is not None:
+        assert stages["small"]["process_peak_rss_bytes"] >= stages["large"]["process_peak_rss_bytes"]
+
+def test_quantile_sketch_is_accurate_and_mergeable() -> None:
+    values = [float((i * 7919) % 100003 + 1) for i in range(5000)]
+    whole, left, right = QuantileSketch(0.01), QuantileSketch(0.01), QuantileSketch(0.01)
+    for i, value in enumerate(values):
+        whole.add(value)
+        (left if i % 2 else right).add(value)
+    left.merge(right)
+
+    ordered = sorted(values)
+    for q in (0.1, 0.5, 0.9, 0.99):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert abs(whole.quantile(q) - exact) <= 0.01 * exact
+    assert left.to_dict() == whole.to_dict()
+    assert QuantileSketch.from_dict(whole.to_dict()).quantile(0.5) == whole.quantile(0.5)
+
+def test_aggregator_merges_shards_into_the_single_pass_report() -> None:
+    listings = parse_property_listings(
+        [
+            {"id": 1, "price": 200000, "beds": 3, "area": 1000, "address": {"city": "Austin", "state": "TX", "zipcode": "78701"}},
+            {"id": 2, "price": 400000, "beds": 3, "area": 2000, "address": {"city": "Austin", "state": "TX", "zipcode": "78702"}},
+            {"id": 3, "price": 300000, "beds": 2, "address": {"city": "Austin", "state": "MN", "zipcode": "55912"}},
+        ]
+    )
+    single = Aggregator()
+    single.update(listings)
+    first, second = Aggregator(), Aggregator()
+    first.update(listings[:1])
+    second.update(listings[1:])
+    merged = Aggregator.from_state(first.to_state()).merge(second)
+
+    report = single.report()
+    assert merged.report() == report
+    assert report["total"]["count"] == 3
+    assert set(report["groups"]["address.city"]) == {"Austin, MN", "Austin, TX"}
+    austin = report["groups"]["address.city"]["Austin, TX"]
+    assert austin["count"] == 2
+    assert austin["price"]["mean"] == 300000
+    assert austin["price_per_sqft"]["mean"] == 200
+
+def test_aggregator_ignores_values_that_are_not_finite() -> None:
+    listings = [
+        {"zpid": 1, "price": {"value": float("inf")}, "livingArea": 1000, "walkScore": {"walkscore": float("-inf")}},
+        {"zpid": 2, "price": {"value": 1e308}, "livingArea": 1e-10, "taxAssessment": {"taxAssessedValue": 10**400}},
+        {"zpid": 3, "price": {"value": 200000}, "livingArea": 1000, "schools": [{"rating": float("nan")}, {"rating": 7}]},
+    ]
+    aggregator = Aggregator()
+    aggregator.update(listings)
+
+    total = aggregator.report()["total"]
+    assert total["count"] == 3
+    assert total["price"]["mean"] == (1e308 + 200000) / 2
+    assert total["price_per_sqft"]["mean"] == 200
+    assert total["school_rating"]["mean"] == 7
+    assert total["tax_to_list_ratio"]["count"] == total["walkscore"]["count"] == 0
+
+def test_profiles_share_one_parse_and_match_separate_runs() -> None:
+    raw = _raw_listings(200)
+    variants = {
+        "base": FILTER_OPTIONS,
+        "same": dict(FILTER_OPTIONS),
+        "desc": dict(FILTER_OPTIONS, order="desc"),
+        "narrow": dict(FILTER_OPTIONS, max_price=400000, limit=None),
+        "columnar": dict(FILTER_OPTIONS, columnar=True),
+    }
+    profiles = [
+        Profile(name, dict({"where": [], "sort_buffer_size": None}, **options), TRANSFORM_OPTIONS, f"{name}.json")
+        for name, options in variants.items()
+    ]
+
+    results = run_profiles(parse_property_listings(raw), profiles)
+
+    for name, options in variants.items():
+        assert results[name] == _sequential(raw, options), name
+    assert results["same"] is results["base"]
+
+def test_profiles_name_their_output_file_apart_from_the_output_section(tmp_path: Any) -> None:
+    base = {"filters": FILTER_OPTIONS, "output": {"partition_by": None, "writer_threads": 4}}
+    path = tmp_path / "profiles.json"
+    path.write_text(json.dumps({"cheap": {"filters": {"max_price": 300000}, "output_file": "cheap/all.json"}, "all": {}}))
+    profiles = load_profiles(str(path), base)
+    assert profiles["cheap"]["output"] == base["output"]
+    assert profiles["cheap"]["filters"] == dict(FILTER_OPTIONS, max_price=300000)
+    assert profile_output_path("out", "cheap", profiles["cheap"]) == os.path.join("out", "cheap", "all.json")
+    assert profile_output_path("out", "all", profiles["all"]) == os.path.join("out", "all.json")
+
+    path.write_text(json.dumps({"cheap": {"output": "cheap.json"}}))
+    with pytest.raises(ValueError, match="output_file"):
+        load_profiles(str(path), base)
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"include_fields": "price"},
+        {"include_fields": ["zpid", 3]},
+        {"field_mapping": [["livingArea", "area"]]},
+        {"field_mapping": {"livingArea": None}},
+        {"sort_by": ["price.value"]},
+        {"limit": "10"},
+        {"limit": 2.5},
+    ],
+)
+def test_queries_with_mistyped_options_are_rejected(query: Dict[str, Any]) -> None:
+    with pytest.raises(QueryError):
+        normalize_query(query, FILTER_OPTIONS, TRANSFORM_OPTIONS)
+
+@pytest.mark.parametrize("columnar", [True, False])
+def test_query_server_caches_and_reloads_warm_dataset(tmp_path: Any, columnar: bool) -> None:
+    input_path = tmp_path / "listings.json"
+    raw = _raw_listings(120)
+    input_path.write_text(json.dumps(raw))
+    service = QueryService(str(input_path), FILTER_OPTIONS, TRANSFORM_OPTIONS, cache_size=4, columnar=columnar)
+    server = make_server("127.0.0.1:0", service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/query"
+
+    def query(request: Dict[str, Any]) -> Any:
+        with urlopen(Request(url, data=json.dumps(request).encode("utf-8"))) as response:
+            return json.loads(response.read()), response.headers["X-Cache"]
+
+    try:
+        assert query({"order": "desc"}) == (_sequential(raw, dict(FILTER_OPTIONS, order="desc")), "miss")
+        # Spelled differently, same normalized query
+        assert query({"order": "DESC", "limit": FILTER_OPTIONS["limit"]})[1] == "hit"
+        for bad in ({"limt": 5}, {"include_fields": "price"}):
+            with pytest.raises(HTTPError) as excinfo:
+                query(bad)
+            assert excinfo.value.code == 400
+
+        changed = raw + [{"id": 9000, "price": 899000, "beds": 4}]
+        input_path.write_text(json.dumps(changed))
+        assert service.reload()
+        assert query({"order": "desc"}) == (_sequential(changed, dict(FILTER_OPTIONS, order="desc")), "miss")
+        assert service.stats()["generation"] == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+class _StubListingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    listings: List[Dict[str, Any]] = []
+    hits: Dict[str, int] = {}
+    ports: set = set()
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        self.ports.add(self.client_address[1])
+        url = urlsplit(self.path)
+        if url.path == "/search" and self.hits[self.path] == 1:
+            # Every first search attempt fails, so each search needs a retry
+            self._reply(503, {"error": "busy"})
+        elif url.path == "/search":
+            zipcode = parse_qs(url.query).get("zipcode", [None])[0]
+            if zipcode == "13200":
+                # Answer the first search last
+                time.sleep(0.2)
+            self._reply(200, {"results": [r for r in self.listings if r["zipcode"] == zipcode]})
+        elif url.path.startswith("/property/"):
+            zpid = int(url.path.rsplit("/", 1)[1])
+            matches = [r for r in self.listings if r["zpid"] == zpid]
+            self._reply(200 if matches else 404, matches[0] if matches else {})
+        elif url.path == "/unframed":
+            # Keep-alive reply without Content-Length or chunked encoding
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"[]")
+        else:
+            self._reply(404, {})
+
+    def _reply(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+@pytest.fixture
+def stub_server() -> Iterator[str]:
+    _StubListingHandler.listings = [
+        {"zpid": 1000 + i, "price": 200000 + i, "beds": 3, "zipcode": "1320" + str(i % 3)} for i in range(30)
+    ]
+    _StubListingHandler.hits = {}
+    _StubListingHandler.ports = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubListingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_fetched_listings_retry_pool_and_cache(stub_server: str, tmp_path: Any) -> None:
+    searches = [("zip", "13200"), ("zip", "13201"), ("zpid", 1002), ("zpid", 99)]
+    options = {
+        "base_url": stub_server,
+        "per_host": 2,
+        "rate": 1000,
+        "backoff": 0.01,
+        "cache_dir": str(tmp_path / "cache"),
+    }
+
+    fetched = list(iter_fetched_listings(searches, **options))
+    expected = [r for r in _StubListingHandler.listings if r["zipcode"] == "13200"]
+    expected += [r for r in _StubListingHandler.listings if r["zipcode"] == "13201"]
+    expected.append(_StubListingHandler.listings[2])
+    # Request order, although the first search is answered last
+    assert [r["zpid"] for r in fetched] == [r["zpid"] for r in expected]
+    assert len(parse_property_listings(fetched)) == len(expected)
+    assert _StubListingHandler.hits["/search?zipcode=13200"] == 2
+    # Keep-alive: far fewer connections than requests
+    assert len(_StubListingHandler.ports) <= 2 < sum(_StubListingHandler.hits.values())
+
+    hits = dict(_StubListingHandler.hits)
+    again = list(iter_fetched_listings(searches, **options))
+    assert again == fetched
+    # Only the failed zpid:99 lookup goes back to the server
+    assert {path: n - hits.get(path, 0) for path, n in _StubListingHandler.hits.items() if n != hits.get(path)} == {
+        "/property/99": 1
+    }
+
+def test_fetched_listings_handoff_is_bounded(stub_server: str, monkeypatch: Any) -> None:
+    monkeypatch.setattr("extractors.fetcher.HANDOFF_SIZE", 2)
+    searches = [("zip", "13200"), ("zip", "13201"), ("zip", "13202")]
+    options = {"base_url": stub_server, "rate": 1000, "backoff": 0.01}
+
+    fetched = list(iter_fetched_listings(searches, **options))
+    expected = sorted(_StubListingHandler.listings, key=lambda r: (r["zipcode"], r["zpid"]))
+    assert fetched == expected
+
+    # A consumer that stops early does not leave the fetch thread blocked
+    listings = iter_fetched_listings(searches, **options)
+    assert next(listings)["zipcode"] == "13200"
+    listings.close()
+    deadline = time.monotonic() + 5
+    while any(t.name == "listing-fetcher" for t in threading.enumerate()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not any(t.name == "listing-fetcher" for t in threading.enumerate())
+
+def test_keep_alive_response_without_length_fails_instead_of_hanging(stub_server: str) -> None:
+    options = {"base_url": stub_server, "endpoints": {"zip": "/unframed?zipcode={value}"}, "timeout": 10}
+
+    started = time.monotonic()
+    assert list(iter_fetched_listings([("zip", "13200")], **options)) == []
+    assert time.monotonic() - started < 5
+    assert _StubListingHandler.hits == {"/unframed?zipcode=13200": 1}
@@ -1,4 +1,4 @@
-thonimport os
+import os
 import sys
 from typing import Any, Dict, List
 
@@ -9,8 +9,12 @@ SRC_DIR = os.path.join(PROJECT_ROOT, "src")
 if SRC_DIR not in sys.path:
     sys.path.insert(0, SRC_DIR)
 
+import pytest
+
 from extractors.filters import apply_filters  # type: ignore  # noqa: E402
-from transformers.data_cleanser import clean_record  # type: ignore  # noqa: E402
+from extractors.sorting import external_sort, make_sort_key, select_top_k  # type: ignore  # noqa: E402
+from extractors.store import ListingStore  # type: ignore  # noqa: E402
+from transformers.data_cleanser import clean_record, clean_records  # type: ignore  # noqa: E402
 from transformers.field_mapper import map_fields  # type: ignore  # noqa: E402
 
 def _sample_records() -> List[Dict[str, Any]]:
@@ -53,6 +57,77 @@ def test_clean_record_strips_empty_values() -> None:
     assert "d" not in cleaned
     assert cleaned["e"] == {"y": 1}
 
+def _is_empty(value: Any) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str) and value.strip() == "":
+        return True
+    return isinstance(value, (list, tuple, set, dict)) and len(value) == 0
+
+def _reference_clean(value: Any) -> Any:
+    """
+    The original recursive strip_empty cleanser, kept independent of the
+    schema-planned, copy-on-write implementation it checks.
+    """
+    if isinstance(value, dict):
+        value = {key: _reference_clean(item) for key, item in value.items()}
+        value = {key: item for key, item in value.items() if not _is_empty(item)}
+    elif isinstance(value, list):
+        value = [item for item in (_reference_clean(item) for item in value) if not _is_empty(item)]
+    return None if _is_empty(value) else value
+
+def test_clean_records_matches_generic_clean_and_reuses_clean_subtrees() -> None:
+    history = [{"date": "2020-01-01", "price": 1}]
+    records = [
+        {
+            "zpid": 1,
+            "price": {"value": None},
+            "address": {"streetAddress": " ", "city": "X", "state": None, "zipcode": {"bad": ""}},
+            "bedrooms": "",
+            "priceHistory": history,
+            "schools": [{"name": "", "rating": None}, [], (), ("t",), False, 0],
+        },
+        {"zpid": None, "address": {"city": "  "}},
+    ]
+    reference = [r for r in (_reference_clean(r) for r in records) if r]
+
+    cleaned = clean_records(records)
+    assert [r for r in (clean_record(r, plan={}) for r in records) if r] == reference
+    assert cleaned == reference == [
+        {
+            "zpid": 1,
+            "address": {"city": "X"},
+            "priceHistory": history,
+            "schools": [("t",), False, 0],
+        }
+    ]
+    assert cleaned[0]["priceHistory"] is history
+    assert records[0]["price"] == {"value": None}
+
+def test_schema_planned_clean_drops_nested_empty_sections() -> None:
+    record = {
+        "zpid": 7,
+        "price": {"value": 425000},
+        "address": {"streetAddress": "", "city": " ", "state": None, "zipcode": ""},
+        "bedrooms": 3,
+        "bathrooms": None,
+        "taxAssessment": {"taxAssessedValue": None, "taxAssessmentYear": {"year": ""}},
+        "walkScore": {"walkscore": 71, "description": ""},
+        "schools": [{"name": " ", "rating": None, "distance": {}}, {"name": "Lincoln", "rating": None}],
+        "priceHistory": [{"date": None, "price": None}],
+        "photos": [[], {}],
+    }
+    expected = {
+        "zpid": 7,
+        "price": {"value": 425000},
+        "bedrooms": 3,
+        "walkScore": {"walkscore": 71},
+        "schools": [{"name": "Lincoln"}],
+    }
+    assert _reference_clean(record) == expected
+    assert clean_record(record) == expected
+    assert clean_records([record, {"zpid": None, "address": {"city": ""}, "schools": [{}]}]) == [expected]
+
 def test_apply_filters_by_price_and_bedrooms() -> None:
     records = _sample_records()
     filtered = apply_filters(
@@ -80,4 +155,105 @@ def test_map_fields_includes_and_renames() -> None:
     first = mapped[0]
     assert "zpid" in first
     assert "priceUsd" in first
-    assert "price" not in first
\ No newline at end of file
+    assert "price" not in first
+
+def test_map_fields_nested_renames_keep_include_order() -> None:
+    records = _sample_records()
+    mapped = map_fields(
+        records,
+        field_mapping={"price.value": "priceUsd", "address.zipcode": "zip"},
+        include_fields=["zpid", "address", "price.value", "bedrooms"],
+    )
+
+    assert list(mapped[0]) == ["zpid", "address", "zip", "priceUsd", "bedrooms"]
+    assert mapped[0]["address"] == {"streetAddress": "A", "city": "X", "state": "NY"}
+    assert mapped[0]["priceUsd"] == 300000
+    assert "zipcode" in records[0]["address"]
+
+def test_map_fields_renames_overwrite_colliding_keys_in_mapping_order() -> None:
+    record = {"a": 1, "b": 2, "c": 3}
+
+    assert map_fields([record], {"a": "b"}, ["a", "b"]) == [{"b": 1}]
+    assert map_fields([record], {"a": "b"}) == [{"b": 1, "c": 3}]
+    assert map_fields([record], {"a": "b", "b": "c"}) == [{"c": 1}]
+    assert record == {"a": 1, "b": 2, "c": 3}
+    # A dotted name that is a key of its own is kept as one key
+    assert map_fields([{"a.x": 1, "a": {"x": 2}}], {"a.x": "y"}, ["a.x"]) == [{"y": 1}]
+    assert map_fields([{"a.x": 1, "a": {"x": 2}}], None, ["a.x"]) == [{"a.x": 1}]
+
+def test_apply_filters_where_clauses() -> None:
+    records = _sample_records()
+    records[0]["schools"] = [{"rating": 2}, {"rating": 8}]
+    records[1]["schools"] = [{"rating": 3}]
+    filtered = apply_filters(
+        records,
+        where=[
+            {"field": "address.zipcode", "in": ["12345", "67890", "00000"]},
+            {"field": "price.value", "gte": 250000, "lt": 700000},
+            {"field": "schools[*].rating", "gte": 5},
+        ],
+        sort_by="price.value",
+    )
+    assert [r["zpid"] for r in filtered] == [1]
+
+def test_apply_filters_rejects_unknown_operator() -> None:
+    with pytest.raises(ValueError):
+        apply_filters(_sample_records(), where=[{"field": "bedrooms", "between": [1, 2]}])
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_columnar_filters_match_row_filters(order: str) -> None:
+    pytest.importorskip("numpy")
+    records = _tied_records(300)
+    for record in records:
+        record["bedrooms"] = None if record["zpid"] % 7 == 0 else record["zpid"] % 5
+        record["address"] = {"zipcode": ["12345", "67890", None][record["zpid"] % 3]}
+    options: Dict[str, Any] = {
+        "min_price": 2000,
+        "min_bedrooms": 1,
+        "where": [{"field": "address.zipcode", "ne": "67890"}],
+        "sort_by": "price.value",
+        "order": order,
+    }
+    for limit in (None, 10):
+        expected = apply_filters(records, limit=limit, **options)
+        assert apply_filters(records, limit=limit, columnar=True, **options) == expected
+
+def test_listing_store_query_matches_apply_filters(tmp_path: Any) -> None:
+    records = _tied_records(120)
+    for record in records:
+        record["bedrooms"] = record["zpid"] % 6
+        record["address"] = {"zipcode": ["12345", "67890"][record["zpid"] % 2]}
+
+    with ListingStore(str(tmp_path / "listings.db")) as store:
+        assert store.load(records) == len(records)
+        for options in (
+            {"min_price": 3000, "min_bedrooms": 2, "sort_by": "price.value", "order": "desc", "limit": 15},
+            {"where": [{"field": "address.zipcode", "eq": "67890"}], "sort_by": "zpid", "limit": None},
+        ):
+            assert store.query(**options) == apply_filters(records, **options)
+
+def _tied_records(count: int) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    for i in range(count):
+        price = None if i % 11 == 0 else (i * 37) % 13 * 1000
+        records.append({"zpid": i, "price": {"value": price}})
+    return records
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_select_top_k_matches_sorted_slice(reverse: bool) -> None:
+    records = _tied_records(200)
+    key = make_sort_key("price.value")
+    expected = sorted(records, key=key, reverse=reverse)[:17]
+    assert select_top_k(records, key, 17, reverse=reverse) == expected
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_external_sort_matches_sorted(reverse: bool) -> None:
+    records = _tied_records(200)
+    key = make_sort_key("price.value")
+    expected = sorted(records, key=key, reverse=reverse)
+    assert list(external_sort(iter(records), key, buffer_size=16, reverse=reverse)) == expected
+
+def test_external_sort_keeps_input_order_for_incomparable_keys() -> None:
+    records = [{"zpid": i, "price": {"value": "x" if i % 2 else i}} for i in range(40)]
+    key = make_sort_key("price.value")
+    assert list(external_sort(iter(records), key, buffer_size=8)) == records